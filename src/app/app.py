@@ -1,11 +1,17 @@
 # src/app/app.py
-# App Streamlit: histórico + previsão da PRÓXIMA hora (t+1h)
+# App Streamlit: histórico + previsão das próximas horas (t+1h, 6h, 12h, 24h)
 # - Seleção de cidade ou coordenadas
-# - Hora local do lugar + último registro local + Δh
-# - Limpeza SOMENTE dos dados brutos (raw.weather_hourly): por cidade ou geral
+# - Hora local do lugar + último registro local + Δh (fuso vem do banco/cache, sem rede por rerun)
+# - Limpeza SOMENTE dos dados brutos (raw.weather_hourly): por cidade ou geral (via API)
+# - Leitura do DuckDB em modo read_only (a escrita fica com a API)
+# - Só a cidade selecionada e só a janela exibida (filtro por location_id no DuckDB), com
+#   cache (st.cache_data) invalidado pelo último ts gravado da cidade
+# - Último ts e nº de linhas da cidade via raw.coverage_daily (storage/coverage.py)
+# - Previsão via inference/service.py: só a janela final do local, com cache por
+#   (local, último ts, versão do modelo) entre reruns + serving.predictions
 # - Coleta via API (collect/backfill)
 # - Gráfico no fuso da cidade
-# - Alinha features com as do treino (feature_cols.json) antes de prever
+# - Features alinhadas com as do treino (feature_cols da versão ativa do registro)
 
 # --- garantir que a raiz do projeto esteja no sys.path (para importar src/*) ---
 import sys
@@ -15,105 +21,117 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 # -----------------------------------------------------------------------------
 
-import json
-import requests
 import duckdb
-import joblib
+import requests
 import pandas as pd
 import streamlit as st
 import matplotlib.pyplot as plt
 
-from src.processing.prepare_data import make_features  # MESMAS features do treino
+from src.inference.model_registry import get_location_models, get_registry
+from src.inference.prediction_cache import get_prediction_cache
+from src.inference.service import predict_locations  # MESMAS features do treino
+from src.storage.db import get_db
+from src.storage.locations import location_id
+from src.storage.timezones import timezone_for
 
 # ---------------------------
 # Caminhos e configs
 # ---------------------------
 DB_PATH = ROOT / "data" / "rt_weather.duckdb"
-MODEL_PATH = ROOT / "models" / "model_rf_temp_next_hour.pkl"
-FEATURES_PATH = ROOT / "models" / "feature_cols.json"
+MODELS_DIR = ROOT / "models"
 API_BASE = "http://127.0.0.1:8000"
 
+# horas carregadas por cidade (= máximo do slider da tabela)
+WINDOW_HOURS = 1000
+CACHE_TTL_S = 300
+
 st.set_page_config(page_title="RT Weather – Next Hour Temp", layout="centered")
-st.title("🌦️ Previsão de Temperatura (Próxima Hora)")
+st.title("🌦️ Previsão de Temperatura (Próximas Horas)")
 
 # ---------------------------
 # Utilitários
 # ---------------------------
-def get_timezone_for(lat: float, lon: float) -> str:
-    """
-    Descobre o fuso da localidade consultando diretamente a Open-Meteo
-    (não insere nada no DB).
-    """
-    try:
-        url = (
-            "https://api.open-meteo.com/v1/forecast"
-            f"?latitude={lat}&longitude={lon}&current_weather=true&timezone=auto"
-        )
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        return r.json().get("timezone", "UTC")
-    except Exception:
-        return "UTC"
-
-def get_last_ts_utc() -> pd.Timestamp | None:
-    """Lê o MAX(ts) da tabela raw.weather_hourly (UTC / naive)."""
+def get_location_id(lat: float, lon: float) -> int | None:
+    """location_id da cidade em raw.locations (None se ainda não há dados dela)."""
     if not DB_PATH.exists():
         return None
-    con = duckdb.connect(DB_PATH.as_posix())
     try:
         # tabela pode não existir ainda
-        return con.execute("SELECT MAX(ts) FROM raw.weather_hourly").fetchone()[0]
+        with get_db(DB_PATH, read_only=True).cursor() as cur:
+            return location_id(cur, lat, lon)
     except Exception:
         return None
-    finally:
-        con.close()
+
+def _coverage_or_raw(coverage_sql: str, raw_sql: str, loc_id: int):
+    """Consulta raw.coverage_daily (poucas linhas por cidade); banco sem a tabela -> raw."""
+    db = get_db(DB_PATH, read_only=True)
+    try:
+        return db.fetchone(coverage_sql, [loc_id])[0]
+    except duckdb.CatalogException:
+        return db.fetchone(raw_sql, [loc_id])[0]
+
+def get_last_ts_utc(loc_id: int | None) -> pd.Timestamp | None:
+    """Última hora gravada da cidade (UTC / naive), pela cobertura diária mantida na ingestão."""
+    if loc_id is None:
+        return None
+    return _coverage_or_raw(
+        "SELECT MAX(last_ts) FROM raw.coverage_daily WHERE location_id = ?",
+        "SELECT MAX(ts) FROM raw.weather_hourly WHERE location_id = ?",
+        loc_id,
+    )
+
+@st.cache_data(ttl=CACHE_TTL_S, show_spinner=False)
+def load_window(loc_id: int, lat: float, lon: float, last_ts: pd.Timestamp, hours: int) -> pd.DataFrame:
+    """
+    Últimas 'hours' horas da cidade (filtro e janela aplicados no DuckDB).
+    'last_ts' entra na chave do cache: chegou hora nova da cidade => nova consulta.
+    """
+    df = get_db(DB_PATH, read_only=True).df(
+        """
+        SELECT ts, temperature_2m, relative_humidity_2m, precipitation, wind_speed_10m
+        FROM raw.weather_hourly
+        WHERE location_id = ? AND ts > ?::TIMESTAMP - to_hours(?)
+        ORDER BY ts
+        """,
+        [loc_id, last_ts, hours],
+    )
+    df.insert(1, "latitude", lat)
+    df.insert(2, "longitude", lon)
+    return df
+
+@st.cache_data(ttl=CACHE_TTL_S, show_spinner=False)
+def count_rows(loc_id: int, last_ts: pd.Timestamp) -> int:
+    return int(_coverage_or_raw(
+        "SELECT COALESCE(SUM(hours), 0) FROM raw.coverage_daily WHERE location_id = ?",
+        "SELECT COUNT(*) FROM raw.weather_hourly WHERE location_id = ?",
+        loc_id,
+    ))
 
 def delete_raw_city(lat: float, lon: float) -> int:
     """
     Remove SOMENTE as linhas da cidade atual (lat/lon) da tabela raw.weather_hourly.
-    Usa arredondamento a 4 casas para evitar problemas de float.
-    Retorna o nº de linhas removidas.
+    A remoção é feita pela API (único escritor do banco). Retorna o nº de linhas removidas.
     """
-    if not DB_PATH.exists():
-        return 0
-    con = duckdb.connect(DB_PATH.as_posix())
     try:
-        n = con.execute(
-            """
-            SELECT COUNT(*) FROM raw.weather_hourly
-            WHERE round(latitude,4)=round(?,4) AND round(longitude,4)=round(?,4)
-            """,
-            [lat, lon],
-        ).fetchone()[0]
-        con.execute(
-            """
-            DELETE FROM raw.weather_hourly
-            WHERE round(latitude,4)=round(?,4) AND round(longitude,4)=round(?,4)
-            """,
-            [lat, lon],
+        r = requests.delete(
+            f"{API_BASE}/raw", params={"latitude": lat, "longitude": lon}, timeout=30
         )
-        return int(n)
+        r.raise_for_status()
+        return int(r.json()["deleted_rows"])
     except Exception:
         return 0
-    finally:
-        con.close()
 
 def delete_raw_all() -> int:
     """
-    Remove TODAS as linhas da tabela raw.weather_hourly (não mexe em refined/modelos).
+    Remove TODAS as linhas da tabela raw.weather_hourly (não mexe em refined/modelos), via API.
     Retorna o nº de linhas removidas.
     """
-    if not DB_PATH.exists():
-        return 0
-    con = duckdb.connect(DB_PATH.as_posix())
     try:
-        n = con.execute("SELECT COUNT(*) FROM raw.weather_hourly").fetchone()[0]
-        con.execute("DELETE FROM raw.weather_hourly")
-        return int(n)
+        r = requests.delete(f"{API_BASE}/raw", params={"all_locations": True}, timeout=30)
+        r.raise_for_status()
+        return int(r.json()["deleted_rows"])
     except Exception:
         return 0
-    finally:
-        con.close()
 
 # ---------------------------
 # Seleção do local
@@ -160,12 +178,27 @@ with st.sidebar:
         try:
             r = requests.get(
                 f"{API_BASE}/collect",
-                params={"latitude": lat, "longitude": lon, "past_hours": 6},
+                # sync: o painel relê o banco logo em seguida, não espera o flush do buffer
+                params={"latitude": lat, "longitude": lon, "past_hours": 6, "sync": True},
                 timeout=20,
             )
             st.success(r.json())
         except Exception as e:
             st.error(str(e))
+    if st.button("🌍 Coletar todas as cidades (lote, 6h)"):
+        try:
+            r = requests.post(
+                f"{API_BASE}/collect/batch",
+                json={
+                    "locations": [{"latitude": a, "longitude": b} for a, b in CITIES.values()],
+                    "past_hours": 6,
+                    "sync": True,
+                },
+                timeout=60,
+            )
+            st.success(r.json())
+        except Exception as e:
+            st.error(str(e))
     if st.button("📦 Backfill (últimos 30 dias)"):
         try:
             r = requests.post(
@@ -179,9 +212,15 @@ with st.sidebar:
 
     st.divider()
     st.subheader("🕒 Hora local & status")
-    tz = get_timezone_for(lat, lon)
+    # memória -> raw.locations -> estimativa offline -> Open-Meteo (ver storage/timezones.py)
+    tz, tz_source = timezone_for(lat, lon, DB_PATH)
+    if tz_source == "offline":
+        st.caption("Fuso estimado offline (cidade de referência mais próxima); confirmado na 1ª coleta.")
+    elif tz_source == "fallback":
+        st.warning("Não foi possível descobrir o fuso (sem dados locais e sem rede): usando UTC.")
     now_local = pd.Timestamp.now(tz).floor("H")
-    last_utc = get_last_ts_utc()
+    loc_id = get_location_id(lat, lon)
+    last_utc = get_last_ts_utc(loc_id)
     if last_utc is not None:
         last_local = pd.Timestamp(last_utc, tz="UTC").tz_convert(tz)
         delta_h = (now_local - last_local) / pd.Timedelta(hours=1)
@@ -216,14 +255,12 @@ if not DB_PATH.exists():
     st.warning("Banco DuckDB não encontrado. Rode a API /backfill ou /collect primeiro.")
     st.stop()
 
-con = duckdb.connect(DB_PATH.as_posix())
-df = con.execute("SELECT * FROM raw.weather_hourly ORDER BY ts").df()
-con.close()
-
-if df.empty:
-    st.warning("Sem dados ainda. Use os botões na barra lateral para coletar.")
+if last_utc is None:
+    st.warning("Sem dados ainda para esta cidade. Use os botões na barra lateral para coletar.")
     st.stop()
 
+df = load_window(loc_id, lat, lon, last_utc, WINDOW_HOURS)
+
 df_local = df.copy()
 df_local["ts_local"] = (
     pd.to_datetime(df_local["ts"]).dt.tz_localize("UTC").dt.tz_convert(tz)
@@ -233,51 +270,48 @@ st.line_chart(df_local.set_index("ts_local")["temperature_2m"].tail(48))
 
 
 # ---------------------------
-# Carregar modelo e lista de features do treino
+# Previsão da próxima hora (mesma rotina do /predict da API)
 # ---------------------------
-if not MODEL_PATH.exists() or not FEATURES_PATH.exists():
+# registro do processo: carregado uma vez e trocado sozinho quando há versão nova
+bundle = get_registry(MODELS_DIR).get()
+if bundle is None:
     st.error(
         "Modelo/feature_cols não encontrados. Rode o treino primeiro "
         "(prepare_data.py e training/train.py)."
     )
     st.stop()
 
-model = joblib.load(MODEL_PATH)
-with open(FEATURES_PATH, "r", encoding="utf-8") as f:
-    feature_cols = json.load(f)
-
-# ---------------------------
-# Gerar features atuais e ALINHAR ao conjunto do treino
-# ---------------------------
-feat = make_features(df)
-if len(feat) == 0:
+# cache (local, último ts, versão): reruns sem hora nova não montam features nem rodam o modelo;
+# serving.predictions traz o que a API já previu. Features só da janela final do local.
+(item,) = predict_locations(
+    [(lat, lon)], db_path=DB_PATH, read_only=True, models_dir=MODELS_DIR,
+    cache=get_prediction_cache(), persist=True, location_models=get_location_models(MODELS_DIR),
+)
+if "error" in item:
     st.warning("Ainda não há features suficientes (rode mais coletas ou o backfill).")
     st.stop()
+horizons = item["horizons"]
+
+st.subheader("🔮 Previsão (próximas horas)")
+# um único predict devolve todos os horizontes do modelo (t+1h, 6h, 12h, 24h)
+for col, h in zip(st.columns(len(horizons)), horizons):
+    col.metric(f"+{h['horizon_h']}h", f"{h['temp_pred']:.2f} °C")
+st.caption(
+    f"Modelo: {item['model_version']}"
+    + (" (modelo da cidade)" if item["model_scope"] == "location" else "")
+    + (" (cache)" if item["cached"] else "")
+)
 
-X = feat.drop(columns=["temp_t_plus_1h", "ts"], errors="ignore")
-
-# adiciona colunas faltantes com zero
-for c in feature_cols:
-    if c not in X.columns:
-        X[c] = 0
-# mantém exatamente as colunas do treino e na mesma ordem (remove extras)
-X = X[feature_cols]
-
-# ---------------------------
-# Previsão da próxima hora
-# ---------------------------
-x_last = X.iloc[[-1]]
-y_hat = model.predict(x_last)[0]
-
-st.subheader("🔮 Previsão (próxima hora)")
-st.metric("Temperatura prevista", f"{y_hat:.2f} °C")
-
-# gráfico com ponto previsto (+1h) em hora local
+# gráfico com os pontos previstos (+h) em hora local
 fig, ax = plt.subplots()
 hist = df_local.set_index("ts_local")["temperature_2m"].tail(24)
 hist.plot(ax=ax)
-ax.scatter([hist.index[-1] + pd.Timedelta(hours=1)], [y_hat], marker="x")
-ax.set_title("Últimas 24h (local) + ponto previsto (+1h)")
+ax.plot(
+    [hist.index[-1] + pd.Timedelta(hours=h["horizon_h"]) for h in horizons],
+    [h["temp_pred"] for h in horizons],
+    marker="x", linestyle="--",
+)
+ax.set_title("Últimas 24h (local) + pontos previstos (+h)")
 st.pyplot(fig)
 
 with st.expander("🔎 Ver dados (tabela)"):
@@ -315,7 +349,7 @@ with st.expander("🔎 Ver dados (tabela)"):
         # }
     )
 
-    st.write("Total de linhas no banco:", len(df))
+    st.write("Total de linhas desta cidade no banco:", count_rows(loc_id, last_utc))
 
     # download do recorte mostrado (inclui lat/lon e N horas)
     csv = df_view.to_csv(index=False).encode("utf-8")
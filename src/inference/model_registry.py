@@ -0,0 +1,315 @@
+# src/inference/model_registry.py
+# Registro de modelos versionados + carga única por processo com hot-reload.
+# - Cada treino grava models/registry/<versão>/ com:
+#     model.joblib (SEM compressão: o joblib.load lê os arrays direto do arquivo, sem descomprimir),
+#     feature_cols.json e meta.json (motor, métricas, intervalo de dados, alvos/horizontes, sha256)
+# - models/registry/LATEST aponta a versão ativa (troca atômica com os.replace)
+# - ModelRegistry.get(): carrega uma vez (joblib mmap_mode="r") e só olha o disco a cada
+#   CHECK_INTERVAL_S (stat do LATEST); versão nova => troca o modelo sem reiniciar o processo
+# - mmap_mode NÃO deixa a floresta no disco: o Tree do sklearn copia nós/valores para buffers
+#   próprios no unpickle, então o modelo inteiro vai para a RAM a cada carga (RandomForest
+#   de 243 MB: +244 MB de RSS). O ganho é só na carga: uma cópia a menos (~250 ms x ~500 ms,
+#   pico +244 MB x +324 MB sem mmap). Ficam mapeados só arrays numpy puros (ex.: nós do hgb)
+# - Sem registro ainda: usa os arquivos antigos (model_rf_temp_next_hour.pkl + feature_cols.json)
+# - Modelos por local (training/train_locations.py): models/locations/<lat>_<lon>/registry/,
+#   mesmo formato; LocationModels mantém só os locais mais usados carregados (LRU) e quem
+#   não tem modelo próprio usa o global
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import joblib
+
+from src.processing.features import TARGET, target_horizons
+from src.storage.locations import norm_latlon
+
+MODELS_DIR = Path("models")
+REGISTRY_SUBDIR = "registry"
+LOCATIONS_SUBDIR = "locations"
+MAX_LOCATION_MODELS = 32
+LEGACY_MODEL = "model_rf_temp_next_hour.pkl"
+LEGACY_FEATURES = "feature_cols.json"
+CHECK_INTERVAL_S = 5.0
+
+
+class ModelBundle:
+    """
+    Modelo carregado + colunas do treino (na ordem do fit) + metadados da versão.
+    targets/horizons: saídas do modelo, na ordem das colunas do predict (versões sem
+    'targets' no meta.json só preveem t+1h). engine: motor do treino (rf nas versões antigas).
+    location: (lat, lon) do modelo por local; None no modelo global.
+    """
+
+    def __init__(self, version: str, model, feature_cols: list, meta: dict, path: Path):
+        self.version = version
+        self.model = model
+        self.feature_cols = feature_cols
+        self.meta = meta
+        self.path = path
+        self.targets = meta.get("targets") or [TARGET]
+        self.horizons = target_horizons(self.targets)
+        self.engine = meta.get("engine") or "rf"
+        self.location = tuple(meta["location"]) if meta.get("location") else None
+
+    def __repr__(self) -> str:
+        return f"ModelBundle(version={self.version!r}, engine={self.engine!r}, features={len(self.feature_cols)})"
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_json(path: Path, obj) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2, default=str)
+
+
+def location_key(lat: float, lon: float) -> str:
+    """Nome do diretório do local (lat/lon normalizados, 4 casas): '-23.5500_-46.6300'."""
+    lat, lon = norm_latlon(lat, lon)
+    return f"{lat:.4f}_{lon:.4f}"
+
+
+def location_dir(lat: float, lon: float, models_dir: Path = MODELS_DIR) -> Path:
+    """models_dir dos modelos de um local (tem o seu próprio registry/ e LATEST)."""
+    return Path(models_dir) / LOCATIONS_SUBDIR / location_key(lat, lon)
+
+
+def save_model(
+    model,
+    feature_cols: list,
+    metrics: dict,
+    data_range: dict,
+    params: Optional[dict] = None,
+    models_dir: Path = MODELS_DIR,
+    targets: Optional[list] = None,
+    engine: Optional[str] = None,
+    location: Optional[tuple] = None,
+) -> str:
+    """
+    Grava uma nova versão e a marca como ativa (LATEST). Devolve o nome da versão.
+    location: modelo por local (models_dir = location_dir(lat, lon)); a versão leva
+    '@<lat>_<lon>' no nome para não colidir com a do global no cache de previsões.
+    """
+    registry = Path(models_dir) / REGISTRY_SUBDIR
+    stamp = datetime.now(timezone.utc).strftime("v%Y%m%d-%H%M%S")
+    suffix = f"@{location_key(*location)}" if location else ""
+    vdir = registry / f"{stamp}{suffix}"
+    n = 1
+    while vdir.exists():  # dois treinos no mesmo segundo
+        vdir = registry / f"{stamp}-{n}{suffix}"
+        n += 1
+    version = vdir.name
+    tmp = registry / f".{version}.tmp"
+    tmp.mkdir(parents=True)
+
+    joblib.dump(model, tmp / "model.joblib")
+    _write_json(tmp / "feature_cols.json", list(feature_cols))
+    _write_json(
+        tmp / "meta.json",
+        {
+            "version": version,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "engine": engine,
+            "location": list(norm_latlon(*location)) if location else None,
+            "model_class": type(model).__name__,
+            "params": params or {},
+            "targets": list(targets or [TARGET]),
+            "metrics": metrics,
+            "data_range": data_range,
+            "model_sha256": _sha256(tmp / "model.joblib"),
+        },
+    )
+    # diretório completo antes de aparecer com o nome final; depois troca o ponteiro
+    os.replace(tmp, vdir)
+    pointer = registry / "LATEST.tmp"
+    pointer.write_text(version, encoding="utf-8")
+    os.replace(pointer, registry / "LATEST")
+    return version
+
+
+def list_versions(models_dir: Path = MODELS_DIR) -> list:
+    registry = Path(models_dir) / REGISTRY_SUBDIR
+    if not registry.exists():
+        return []
+    return sorted(p.name for p in registry.iterdir() if p.is_dir() and not p.name.startswith("."))
+
+
+def latest_version(models_dir: Path = MODELS_DIR) -> Optional[str]:
+    pointer = Path(models_dir) / REGISTRY_SUBDIR / "LATEST"
+    if not pointer.exists():
+        return None
+    return pointer.read_text(encoding="utf-8").strip() or None
+
+
+def load_version(version: str, models_dir: Path = MODELS_DIR, mmap: bool = True) -> ModelBundle:
+    """Carrega uma versão do registro (mmap: carga sem a cópia intermediária dos arrays)."""
+    vdir = Path(models_dir) / REGISTRY_SUBDIR / version
+    with open(vdir / "feature_cols.json", "r", encoding="utf-8") as f:
+        feature_cols = json.load(f)
+    with open(vdir / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    model = joblib.load(vdir / "model.joblib", mmap_mode="r" if mmap else None)
+    return ModelBundle(version, model, feature_cols, meta, vdir)
+
+
+def load_legacy(models_dir: Path = MODELS_DIR) -> Optional[ModelBundle]:
+    """Modelo salvo antes do registro (models/model_rf_temp_next_hour.pkl)."""
+    model_path = Path(models_dir) / LEGACY_MODEL
+    features_path = Path(models_dir) / LEGACY_FEATURES
+    if not model_path.exists() or not features_path.exists():
+        return None
+    with open(features_path, "r", encoding="utf-8") as f:
+        feature_cols = json.load(f)
+    return ModelBundle("legacy", joblib.load(model_path), feature_cols, {}, model_path)
+
+
+class ModelRegistry:
+    """Modelo ativo do processo: carga única + hot-reload quando o LATEST muda."""
+
+    def __init__(self, models_dir: Path = MODELS_DIR, check_interval_s: float = CHECK_INTERVAL_S):
+        self.models_dir = Path(models_dir)
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._bundle: Optional[ModelBundle] = None
+        self._stamp = None
+        self._next_check = 0.0
+
+    def _disk_stamp(self):
+        """(versão, mtime) do ponteiro LATEST, ou do modelo antigo se não há registro."""
+        pointer = self.models_dir / REGISTRY_SUBDIR / "LATEST"
+        if pointer.exists():
+            return latest_version(self.models_dir), pointer.stat().st_mtime_ns
+        legacy = self.models_dir / LEGACY_MODEL
+        if legacy.exists():
+            return "legacy", legacy.stat().st_mtime_ns
+        return None
+
+    def get(self) -> Optional[ModelBundle]:
+        """Modelo ativo (None se ainda não houve treino)."""
+        now = time.monotonic()
+        if self._bundle is not None and now < self._next_check:
+            return self._bundle
+        with self._lock:
+            if self._bundle is not None and now < self._next_check:
+                return self._bundle
+            self._next_check = now + self.check_interval_s
+            stamp = self._disk_stamp()
+            if stamp is None or stamp == self._stamp:
+                return self._bundle
+            version = stamp[0]
+            # carrega a nova versão por completo antes de trocar: quem já pegou o bundle
+            # anterior termina a predição com ele
+            if version == "legacy":
+                self._bundle = load_legacy(self.models_dir)
+            else:
+                self._bundle = load_version(version, self.models_dir)
+            self._stamp = stamp
+            return self._bundle
+
+    def reload(self) -> Optional[ModelBundle]:
+        """Força a checagem do disco agora."""
+        self._next_check = 0.0
+        return self.get()
+
+
+_registries: dict = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(models_dir: Optional[Path] = None) -> ModelRegistry:
+    """Registro do processo para 'models_dir' (padrão: models/)."""
+    key = Path(models_dir or MODELS_DIR).resolve()
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = ModelRegistry(key)
+        return _registries[key]
+
+
+class LocationModels:
+    """
+    Modelos por local carregados sob demanda, no máximo 'max_models' em memória (LRU).
+    get(lat, lon) -> ModelBundle do local, ou None (sem modelo próprio: use o global).
+    Cada local carregado é um ModelRegistry (hot-reload); ausência também fica
+    em cache por check_interval_s (um stat por local a cada intervalo, não por chamada).
+    """
+
+    def __init__(self, models_dir: Path = MODELS_DIR, max_models: int = MAX_LOCATION_MODELS,
+                 check_interval_s: float = CHECK_INTERVAL_S):
+        self.models_dir = Path(models_dir)
+        self.max_models = max_models
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, ModelRegistry]" = OrderedDict()
+        self._absent: dict = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.fallbacks = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, lat: float, lon: float) -> Optional[ModelBundle]:
+        key = location_key(lat, lon)
+        with self._lock:
+            registry = self._items.get(key)
+            if registry is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+            else:
+                now = time.monotonic()
+                pointer = self.models_dir / LOCATIONS_SUBDIR / key / REGISTRY_SUBDIR / "LATEST"
+                if self._absent.get(key, 0.0) > now:
+                    self.fallbacks += 1
+                    return None
+                if not pointer.exists():
+                    self._absent[key] = now + self.check_interval_s
+                    self.fallbacks += 1
+                    return None
+                self._absent.pop(key, None)
+                registry = ModelRegistry(pointer.parent.parent, self.check_interval_s)
+                self._items[key] = registry
+                self.loads += 1
+                while len(self._items) > self.max_models:
+                    self._items.popitem(last=False)
+                    self.evictions += 1
+        # carga (ou hot-reload) fora do lock do LRU: um local lento não trava os outros
+        return registry.get()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._absent.clear()
+
+    def stats(self) -> dict:
+        return {
+            "loaded": len(self._items),
+            "max_models": self.max_models,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "fallbacks": self.fallbacks,
+        }
+
+
+_location_models: dict = {}
+
+
+def get_location_models(models_dir: Optional[Path] = None) -> LocationModels:
+    """LRU de modelos por local do processo para 'models_dir' (padrão: models/)."""
+    key = Path(models_dir or MODELS_DIR).resolve()
+    with _registries_lock:
+        if key not in _location_models:
+            _location_models[key] = LocationModels(key)
+        return _location_models[key]
@@ -0,0 +1,153 @@
+# src/inference/online_features.py
+# Estado de features ONLINE por local, para inferência t+1h em tempo constante.
+# - Ring buffer por local com as últimas HISTORY+1 horas (temperatura + exógenas), indexado
+#   pela hora absoluta (slot = hora % tamanho; a hora gravada no slot valida o conteúdo)
+# - Somas correntes para temp_ma_{w}h: avançar uma hora soma a nova e tira a que saiu;
+#   lacunas, horas fora de ordem ou sobrescritas recalculam a janela (w <= 6 valores)
+# - Atualizado pela API com as linhas efetivamente gravadas (append_duckdb / flush do buffer)
+#   e reconstruído do DuckDB na subida (últimas horas de cada local)
+# - vector() devolve as features da última hora na ordem de feature_cols, sem ler histórico
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.processing.features import EXOG_COLS, LAGS, MA_WINDOWS, history_hours
+
+HISTORY = history_hours()
+SIZE = HISTORY + 1
+
+# últimas SIZE horas de TODOS os locais (reconstrução na subida)
+REBUILD_SQL = f"""
+    SELECT w.ts, l.latitude, l.longitude, w.temperature_2m,
+           {", ".join(f"w.{c}" for c in EXOG_COLS)}
+    FROM raw.weather_hourly AS w
+    JOIN raw.locations AS l USING (location_id)
+    QUALIFY w.ts > MAX(w.ts) OVER (PARTITION BY w.location_id) - INTERVAL {SIZE} HOUR
+    ORDER BY w.location_id, w.ts
+"""
+
+
+class _LocationState:
+    """Ring buffer de um local + somas correntes das médias móveis na última hora."""
+
+    __slots__ = ("hours", "temp", "exog", "last_hour", "sums", "counts")
+
+    def __init__(self):
+        self.hours = np.full(SIZE, -1, dtype=np.int64)
+        self.temp = np.full(SIZE, np.nan)
+        self.exog = np.full((SIZE, len(EXOG_COLS)), np.nan)
+        self.last_hour = -1
+        self.sums = {w: 0.0 for w in MA_WINDOWS}
+        self.counts = {w: 0 for w in MA_WINDOWS}
+
+    def temp_at(self, hour: int) -> float:
+        s = hour % SIZE
+        return self.temp[s] if self.hours[s] == hour else np.nan
+
+    def _recompute(self) -> None:
+        for w in MA_WINDOWS:
+            vals = [self.temp_at(self.last_hour - j) for j in range(w)]
+            present = [v for v in vals if not np.isnan(v)]
+            self.sums[w], self.counts[w] = float(np.sum(present)), len(present)
+
+    def put(self, hour: int, temp: float, exog) -> None:
+        if hour <= self.last_hour - SIZE:
+            return  # velha demais para qualquer feature da última hora
+        s = hour % SIZE
+        overwrite = self.hours[s] == hour
+        self.hours[s], self.temp[s], self.exog[s] = hour, temp, exog
+        if hour == self.last_hour + 1 and not overwrite:
+            # caso comum (coleta horária): O(1) por janela
+            self.last_hour = hour
+            for w in MA_WINDOWS:
+                old = self.temp_at(hour - w)
+                self.sums[w] += temp - (0.0 if np.isnan(old) else old)
+                self.counts[w] += 1 - (0 if np.isnan(old) else 1)
+            return
+        self.last_hour = max(self.last_hour, hour)
+        self._recompute()
+
+    def features(self) -> dict:
+        h = self.last_hour
+        feats = {f"temp_lag_{k}h": self.temp_at(h - k) for k in LAGS}
+        for w in MA_WINDOWS:
+            feats[f"temp_ma_{w}h"] = self.sums[w] / w if self.counts[w] == w else np.nan
+        s = h % SIZE
+        feats.update(zip(EXOG_COLS, self.exog[s]))
+        hod = h % 24
+        feats["hour_sin"] = np.sin(2 * np.pi * hod / 24)
+        feats["hour_cos"] = np.cos(2 * np.pi * hod / 24)
+        return feats
+
+
+class OnlineFeatureState:
+    """Estado de todos os locais, chaveado por (lat, lon) normalizados."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locs: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._locs)
+
+    def update(self, df: pd.DataFrame) -> None:
+        """Aplica linhas gravadas (ts, latitude, longitude, temperature_2m, exógenas)."""
+        if df.empty:
+            return
+        df = df.sort_values("ts", kind="stable")
+        hours = pd.to_datetime(df["ts"]).to_numpy(dtype="datetime64[h]").astype(np.int64)
+        temps = df["temperature_2m"].to_numpy(dtype=np.float64)
+        exog = df[EXOG_COLS].to_numpy(dtype=np.float64)
+        keys = zip(df["latitude"].to_numpy(), df["longitude"].to_numpy())
+        with self._lock:
+            for i, key in enumerate(keys):
+                st = self._locs.get(key)
+                if st is None:
+                    st = self._locs[key] = _LocationState()
+                st.put(int(hours[i]), temps[i], exog[i])
+
+    def rebuild(self, con) -> int:
+        """Recria o estado com as últimas horas de cada local no DuckDB. Devolve nº de locais."""
+        df = con.execute(REBUILD_SQL).df()
+        with self._lock:
+            self._locs = {}
+        self.update(df)
+        return len(self._locs)
+
+    def drop(self, lat: Optional[float] = None, lon: Optional[float] = None) -> None:
+        """Esquece um local (ou todos, sem argumentos) — ex.: após DELETE /raw."""
+        with self._lock:
+            if lat is None:
+                self._locs = {}
+            else:
+                self._locs.pop((lat, lon), None)
+
+    def last_ts(self, lat: float, lon: float) -> Optional[pd.Timestamp]:
+        """Última hora gravada do local (None se não está no estado)."""
+        with self._lock:
+            st = self._locs.get((lat, lon))
+            last_hour = None if st is None else st.last_hour
+        return None if last_hour is None else pd.Timestamp(np.datetime64(last_hour, "h"))
+
+    def vector(self, lat: float, lon: float, feature_cols: list):
+        """
+        (ts da última hora, array na ordem de feature_cols) ou None se o local não está no
+        estado, se o modelo pede mais histórico que o buffer guarda ou se falta alguma entrada.
+        """
+        if history_hours(feature_cols) > HISTORY:
+            return None
+        with self._lock:
+            st = self._locs.get((lat, lon))
+            if st is None:
+                return None
+            feats = st.features()
+            last_hour = st.last_hour
+        try:
+            x = np.array([feats[c] for c in feature_cols], dtype=np.float64)
+        except KeyError:
+            return None  # feature desconhecida pelo estado online
+        if np.isnan(x).any():
+            return None
+        return pd.Timestamp(np.datetime64(last_hour, "h")), x
@@ -1,23 +1,43 @@
 from pathlib import Path
-import duckdb, joblib, pandas as pd
-from src.processing.prepare_data import make_features
+import argparse
+import sys
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.inference.model_registry import get_location_models
+from src.inference.service import predict_locations
 
 DB_PATH = Path("data") / "rt_weather.duckdb"
-MODEL_PATH = Path("models") / "model_rf_temp_next_hour.pkl"
 
-def main():
-    con = duckdb.connect(DB_PATH.as_posix())
-    df = con.execute("SELECT * FROM raw.weather_hourly ORDER BY ts").df()
-    con.close()
-    if df.empty or len(df) < 12:
+def main(lat: float, lon: float):
+    if not DB_PATH.exists():
         print("[WARN] dados insuficientes, rode a API /backfill e /collect.")
         return
-    feat = make_features(df)
-    # última linha contém features para prever a próxima hora do último ponto observado
-    x = feat.drop(columns=["temp_t_plus_1h","ts"]).iloc[[-1]]
-    model = joblib.load(MODEL_PATH)
-    pred = model.predict(x)[0]
-    print(f"Previsão para a PRÓXIMA hora: {pred:.2f} °C")
+    # mesma rotina do /predict da API: só a janela final do local + modelo ativo do registro;
+    # se a API já serviu este (local, último ts, versão), vem pronta de serving.predictions
+    try:
+        (item,) = predict_locations(
+            [(lat, lon)], db_path=DB_PATH, read_only=True, persist=True,
+            location_models=get_location_models(),
+        )
+    except FileNotFoundError:
+        print("[WARN] nenhum modelo treinado, rode src/training/train.py.")
+        return
+    if "error" in item:
+        print(f"[WARN] {item['error']} (rode a API /backfill e /collect).")
+        return
+    origem = (" [cache]" if item["cached"] else "") + (
+        " [modelo do local]" if item["model_scope"] == "location" else ""
+    )
+    print(f"Previsão para a PRÓXIMA hora ({item['target_ts_utc']} UTC): {item['temp_pred']:.2f} °C{origem}")
+    for h in item["horizons"][1:]:
+        print(f"  t+{h['horizon_h']}h ({h['target_ts_utc']} UTC): {h['temp_pred']:.2f} °C")
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lat", type=float, default=-23.55)
+    ap.add_argument("--lon", type=float, default=-46.63)
+    args = ap.parse_args()
+    main(args.lat, args.lon)
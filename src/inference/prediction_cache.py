@@ -0,0 +1,176 @@
+# src/inference/prediction_cache.py
+# Cache de previsões (vetor de horizontes) chaveado por (lat, lon, último ts observado, versão do modelo).
+# - As entradas só mudam quando chega hora nova (ou modelo novo): a chave já carrega isso
+# - LRU em memória com tamanho máximo; a ingestão invalida os locais que receberam linhas
+# - Opcional: serving.predictions no DuckDB (histórico das previsões servidas; também
+#   consultado antes de recalcular, p.ex. por outro processo ou após reinício)
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import duckdb
+import pandas as pd
+
+MAX_ENTRIES = 10_000
+
+SERVING_DDL = """
+    CREATE SCHEMA IF NOT EXISTS serving;
+    CREATE TABLE IF NOT EXISTS serving.predictions (
+        location_id INTEGER,
+        last_ts TIMESTAMP,          -- última hora observada usada nas features
+        model_version VARCHAR,
+        horizon_h INTEGER,          -- horas à frente de last_ts
+        target_ts TIMESTAMP,        -- hora prevista (last_ts + horizon_h)
+        temp_pred DOUBLE,
+        created_at TIMESTAMP DEFAULT now(),
+        PRIMARY KEY (location_id, last_ts, model_version, horizon_h)
+    );
+"""
+
+# pred_tmp: latitude, longitude, last_ts, model_version [, horizon_h, temp_pred]
+LOOKUP_SQL = """
+    SELECT l.latitude, l.longitude, p.last_ts, p.model_version, p.horizon_h, p.temp_pred
+    FROM serving.predictions AS p
+    JOIN raw.locations AS l USING (location_id)
+    SEMI JOIN pred_tmp AS k
+      ON k.latitude = l.latitude AND k.longitude = l.longitude
+     AND k.last_ts = p.last_ts AND k.model_version = p.model_version
+"""
+
+INSERT_SQL = """
+    INSERT INTO serving.predictions
+        (location_id, last_ts, model_version, horizon_h, target_ts, temp_pred)
+    SELECT l.location_id, k.last_ts, k.model_version, k.horizon_h,
+           k.last_ts + to_hours(k.horizon_h), k.temp_pred
+    FROM pred_tmp AS k
+    JOIN raw.locations AS l USING (latitude, longitude)
+    ON CONFLICT DO NOTHING
+"""
+
+
+def ensure_serving(con: duckdb.DuckDBPyConnection) -> None:
+    cols = {
+        r[0]
+        for r in con.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = 'serving' AND table_name = 'predictions'"
+        ).fetchall()
+    }
+    if cols and "horizon_h" not in cols:
+        # tabela da versão só t+1h: é cache, recria vazia
+        con.execute("DROP TABLE serving.predictions;")
+    con.execute(SERVING_DDL)
+
+
+def lookup_persisted(con: duckdb.DuckDBPyConnection, keys: list, horizons: list) -> dict:
+    """
+    Previsões já gravadas para as chaves (lat, lon, last_ts, versão) -> tupla na ordem de
+    'horizons' (só chaves com todos os horizontes gravados).
+    """
+    df = pd.DataFrame(keys, columns=["latitude", "longitude", "last_ts", "model_version"])
+    con.register("pred_tmp", df)
+    try:
+        rows = con.execute(LOOKUP_SQL).fetchall()
+    except duckdb.CatalogException:
+        return {}  # serving.predictions ainda não existe (banco sem a API)
+    finally:
+        con.unregister("pred_tmp")
+    found: dict = {}
+    for lat, lon, ts, v, h, y in rows:
+        found.setdefault((lat, lon, pd.Timestamp(ts), v), {})[h] = float(y)
+    return {
+        k: tuple(ys[h] for h in horizons) for k, ys in found.items() if all(h in ys for h in horizons)
+    }
+
+
+def persist(con: duckdb.DuckDBPyConnection, items: dict, horizons: list) -> None:
+    """Grava {(lat, lon, last_ts, versão): tupla por horizonte} em serving.predictions."""
+    ensure_serving(con)
+    df = pd.DataFrame(
+        [(*k, h, y) for k, ys in items.items() for h, y in zip(horizons, ys)],
+        columns=["latitude", "longitude", "last_ts", "model_version", "horizon_h", "temp_pred"],
+    )
+    con.register("pred_tmp", df)
+    try:
+        con.execute(INSERT_SQL)
+    finally:
+        con.unregister("pred_tmp")
+
+
+class PredictionCache:
+    """LRU (lat, lon, last_ts, versão) -> previsões por horizonte, com invalidação por local."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._by_loc: dict = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        with self._lock:
+            y = self._items.get(key)
+            if y is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return y
+
+    def put(self, key: tuple, y: tuple) -> None:
+        with self._lock:
+            self._items[key] = y
+            self._items.move_to_end(key)
+            self._by_loc.setdefault(key[:2], set()).add(key)
+            while len(self._items) > self.max_entries:
+                old, _ = self._items.popitem(last=False)
+                self._forget(old)
+
+    def _forget(self, key: tuple) -> None:
+        keys = self._by_loc.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_loc[key[:2]]
+
+    def invalidate(self, locations: Optional[Iterable[tuple]] = None) -> int:
+        """Remove as entradas dos locais (lat, lon) informados (ou tudo). Devolve quantas."""
+        with self._lock:
+            if locations is None:
+                n = len(self._items)
+                self._items.clear()
+                self._by_loc.clear()
+                return n
+            n = 0
+            for loc in locations:
+                for key in self._by_loc.pop(tuple(loc), ()):
+                    self._items.pop(key, None)
+                    n += 1
+            return n
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+_cache: Optional[PredictionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache() -> PredictionCache:
+    """Cache do processo (API, app Streamlit)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PredictionCache()
+        return _cache
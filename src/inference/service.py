@@ -0,0 +1,250 @@
+# src/inference/service.py
+# Previsão das próximas horas (t+1h e demais horizontes do modelo) para um ou vários locais
+# (usado por /predict e /predict/batch).
+# - Lê do DuckDB só a janela final de cada local: as horas que as feature_cols do modelo
+#   ativo precisam (maior lag/média), a partir do último ts gravado do local
+# - Monta as features de todos os locais numa única chamada e faz UM model.predict
+#   sobre a matriz empilhada; modelo multi-saída devolve todos os horizontes de uma vez
+# - Modelo vem do registro do processo (carga única + hot-reload, ver model_registry.py);
+#   com location_models, locais com modelo próprio usam ele (LRU de modelos por local)
+# - Na API, os locais já presentes no estado online (online_features.py) nem vão ao DuckDB
+# - Com cache (prediction_cache.py): chave (local, último ts, versão do modelo); acerto não
+#   monta features nem roda a floresta, só o último ts de cada local é consultado
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.inference import prediction_cache
+from src.inference.model_registry import LocationModels, get_registry
+from src.inference.online_features import OnlineFeatureState
+from src.inference.prediction_cache import PredictionCache
+from src.processing.features import compute_features, history_hours
+from src.storage.db import get_db
+from src.storage.locations import norm_latlon
+
+DB_PATH = Path("data") / "rt_weather.duckdb"
+
+# janela final de cada local pedido (req_tmp: latitude, longitude já normalizados)
+RECENT_SQL = """
+    WITH loc AS (
+        SELECT l.location_id, l.latitude, l.longitude
+        FROM raw.locations AS l
+        SEMI JOIN req_tmp AS r USING (latitude, longitude)
+    ),
+    last AS (
+        SELECT w.location_id, MAX(w.ts) AS last_ts
+        FROM raw.weather_hourly AS w
+        SEMI JOIN loc USING (location_id)
+        GROUP BY 1
+    )
+    SELECT w.ts, loc.latitude, loc.longitude, w.temperature_2m, w.relative_humidity_2m,
+           w.precipitation, w.wind_speed_10m
+    FROM raw.weather_hourly AS w
+    JOIN last USING (location_id)
+    JOIN loc USING (location_id)
+    WHERE w.ts >= last.last_ts - to_hours(?)
+    ORDER BY w.location_id, w.ts
+"""
+
+# último ts de cada local pedido (chave do cache quando não há estado online)
+LAST_TS_SQL = """
+    SELECT l.latitude, l.longitude, MAX(w.ts) AS last_ts
+    FROM raw.weather_hourly AS w
+    JOIN raw.locations AS l USING (location_id)
+    SEMI JOIN req_tmp AS r USING (latitude, longitude)
+    GROUP BY 1, 2
+"""
+
+
+def load_last_ts(coords: list, db_path: Path = DB_PATH, read_only: bool = False) -> dict:
+    """{(lat, lon): último ts gravado} dos locais pedidos que têm dados."""
+    req = pd.DataFrame(coords, columns=["latitude", "longitude"])
+    with get_db(db_path, read_only=read_only).cursor() as cur:
+        cur.register("req_tmp", req)
+        try:
+            rows = cur.execute(LAST_TS_SQL).fetchall()
+        finally:
+            cur.unregister("req_tmp")
+    return {(lat, lon): pd.Timestamp(ts) for lat, lon, ts in rows}
+
+
+def load_recent(coords: list, hours: int, db_path: Path = DB_PATH, read_only: bool = False) -> pd.DataFrame:
+    """Últimas 'hours' horas (+ a hora atual) de cada (lat, lon) normalizado, numa consulta."""
+    req = pd.DataFrame(coords, columns=["latitude", "longitude"])
+    with get_db(db_path, read_only=read_only).cursor() as cur:
+        cur.register("req_tmp", req)
+        try:
+            return cur.execute(RECENT_SQL, [hours]).df()
+        finally:
+            cur.unregister("req_tmp")
+
+
+def _features_from_db(coords: list, feature_cols: list, db_path: Path, read_only: bool):
+    """
+    Caminho sem estado online: janela final dos locais no DuckDB + compute_features.
+    Devolve ({(lat, lon): (ts, vetor)}, {(lat, lon): último ts}).
+    """
+    raw = load_recent(coords, history_hours(feature_cols), db_path, read_only)
+    last = raw.groupby(["latitude", "longitude"])["ts"].max()
+    if raw.empty:
+        return {}, last
+    feat = compute_features(raw, require_target=False)
+    # só a última hora observada de cada local
+    feat = feat.merge(last.rename("last_ts").reset_index(), on=["latitude", "longitude"])
+    feat = feat[feat["ts"] == feat["last_ts"]].reset_index(drop=True)
+    X = feat[feature_cols].to_numpy(dtype=np.float64)
+    rows = {(r.latitude, r.longitude): (r.ts, X[i]) for i, r in enumerate(feat.itertuples())}
+    return rows, last
+
+
+def _cached(coords: list, last: dict, bundles: dict, cache, persist: bool, db_path: Path, read_only: bool) -> dict:
+    """{(lat, lon): (ts, previsões por horizonte)} já calculados: LRU, depois serving.predictions."""
+    hits, pending = {}, {}
+    for c in coords:
+        if c not in last:
+            continue
+        bundle = bundles[c]
+        key = (*c, last[c], bundle.version)
+        y = cache.get(key) if cache is not None else None
+        if y is None:
+            pending.setdefault(bundle.version, (bundle, []))[1].append(key)
+        else:
+            hits[c] = (last[c], y)
+    if persist and pending:
+        with get_db(db_path, read_only=read_only).cursor() as cur:
+            found = {}
+            for bundle, keys in pending.values():
+                found.update(prediction_cache.lookup_persisted(cur, keys, bundle.horizons))
+        for key, y in found.items():
+            hits[key[:2]] = (key[2], y)
+            if cache is not None:
+                cache.put(key, y)
+    return hits
+
+
+def _persist_groups(con, groups: list) -> None:
+    for items, horizons in groups:
+        prediction_cache.persist(con, items, horizons)
+
+
+def predict_locations(
+    coords: list,
+    db_path: Path = DB_PATH,
+    read_only: bool = False,
+    models_dir: Optional[Path] = None,
+    state: Optional[OnlineFeatureState] = None,
+    cache: Optional[PredictionCache] = None,
+    persist: bool = False,
+    location_models: Optional[LocationModels] = None,
+) -> list:
+    """
+    Previsão para cada (lat, lon), na mesma ordem de 'coords': temp_pred (t+1h, ou o 1º
+    horizonte do modelo) + 'horizons' com todos os horizontes do modelo usado.
+    Com 'state' (API), as features saem do estado online em O(1); só os locais que não estão
+    nele vão ao DuckDB. Local sem dados, ou com lacuna na última hora, volta com 'error'.
+    Com 'cache' e/ou persist=True, previsões já feitas para o mesmo (local, último ts, versão)
+    são reaproveitadas ('cached': true); persist grava as novas em serving.predictions
+    (só fora do modo read_only).
+    Com 'location_models', local que tem modelo próprio usa ele ('model_scope': 'location');
+    os demais, o modelo global. Um predict por modelo distinto no lote.
+    """
+    default = get_registry(models_dir).get()
+    coords = [norm_latlon(lat, lon) for lat, lon in coords]
+    unique = list(dict.fromkeys(coords))
+    bundles = {
+        c: (location_models.get(*c) if location_models is not None else None) or default
+        for c in unique
+    }
+    if any(b is None for b in bundles.values()):
+        raise FileNotFoundError("nenhum modelo treinado: rode src/training/train.py")
+
+    hits = {}
+    last = {}
+    if cache is not None or persist:
+        if state is not None:
+            for c in unique:
+                ts = state.last_ts(*c)
+                if ts is not None:
+                    last[c] = ts
+        missing = [c for c in unique if c not in last]
+        if missing:
+            last.update(load_last_ts(missing, db_path, read_only))
+        hits = _cached(unique, last, bundles, cache, persist, db_path, read_only)
+
+    rows = {}
+    todo = [c for c in unique if c not in hits]
+    if state is not None:
+        for c in todo:
+            v = state.vector(*c, bundles[c].feature_cols)
+            if v is not None:
+                rows[c] = v
+    # sem estado online: uma consulta por conjunto de colunas (normalmente um só)
+    by_cols: dict = {}
+    for c in todo:
+        if c not in rows:
+            by_cols.setdefault(tuple(bundles[c].feature_cols), []).append(c)
+    for cols, missing in by_cols.items():
+        db_rows, db_last = _features_from_db(missing, list(cols), db_path, read_only)
+        rows.update(db_rows)
+        last.update(db_last.to_dict())
+
+    preds = {}
+    by_model: dict = {}
+    for c in rows:
+        by_model.setdefault(bundles[c].version, []).append(c)
+    groups = []
+    for keys in by_model.values():
+        bundle = bundles[keys[0]]
+        X = np.vstack([rows[k][1] for k in keys])
+        if hasattr(bundle.model, "feature_names_in_"):
+            # modelos treinados com DataFrame (antes do training/dataset.py) checam os nomes
+            X = pd.DataFrame(X, columns=bundle.feature_cols)
+        # (n,) no modelo de um horizonte, (n, n_horizontes) no multi-saída
+        Y = np.asarray(bundle.model.predict(X), dtype=np.float64).reshape(len(keys), -1)
+        group = {k: (rows[k][0], tuple(map(float, Y[i]))) for i, k in enumerate(keys)}
+        preds.update(group)
+        new = {(*k, ts, bundle.version): ys for k, (ts, ys) in group.items()}
+        if cache is not None:
+            for key, y in new.items():
+                cache.put(key, y)
+        groups.append((new, bundle.horizons))
+    if groups and persist and not read_only:
+        get_db(db_path).write(_persist_groups, groups)
+
+    out = []
+    for lat, lon in coords:
+        bundle = bundles[(lat, lon)]
+        item = {
+            "lat": lat,
+            "lon": lon,
+            "model_version": bundle.version,
+            "model_scope": "location" if bundle.location else "global",
+        }
+        if (lat, lon) in preds or (lat, lon) in hits:
+            ts, ys = preds.get((lat, lon)) or hits[(lat, lon)]
+            horizons = [
+                {
+                    "horizon_h": h,
+                    "target_ts_utc": (ts + pd.Timedelta(hours=h)).isoformat(),
+                    "temp_pred": round(y, 3),
+                }
+                for h, y in zip(bundle.horizons, ys)
+            ]
+            item.update(
+                last_ts_utc=ts.isoformat(),
+                target_ts_utc=horizons[0]["target_ts_utc"],
+                temp_pred=horizons[0]["temp_pred"],
+                horizons=horizons,
+                cached=(lat, lon) in hits,
+            )
+        elif (lat, lon) in last:
+            item.update(
+                last_ts_utc=last[(lat, lon)].isoformat(),
+                error="features incompletas na última hora (lacuna no histórico recente)",
+            )
+        else:
+            item["error"] = "sem dados para este local"
+        out.append(item)
+    return out
@@ -2,18 +2,57 @@
 # API para coletar clima horário (Open-Meteo) e gravar em DuckDB.
 # - /collect: últimas horas (forecast) -> filtra FUTURO, salva ts em UTC
 # - /backfill: histórico por intervalo (start_date/end_date) ou por 'days'
-# - Dedup por (ts, latitude, longitude)
-# - Lat/Lon normalizados (4 casas) para consistência
+# - /backfill/jobs: backfill longo (anos) em blocos mensais, paralelo e retomável (backfill_jobs.py)
+# - DELETE /raw: limpeza dos dados brutos (por cidade ou tudo) pela fila de escrita da API
+# - /collect e /collect/batch respondem logo após o fetch: as linhas vão para um buffer
+#   write-behind (ingest_buffer.py) descarregado em micro-lotes; sync=true grava na hora
+# - JSON da Open-Meteo -> tabela Arrow tipada direto (hourly_parser.py), sem pandas até o DuckDB
+# - /collect/batch: várias coordenadas por requisição à Open-Meteo, uma transação no DuckDB
+# - /predict e /predict/batch: temperatura das próximas horas (t+1h, 6h, 12h, 24h) com o
+#   modelo ativo (inference/service.py);
+#   features da última hora vêm do estado online em memória, atualizado a cada gravação;
+#   previsões ficam em cache (local, último ts, versão) e em serving.predictions;
+#   local com modelo próprio (train_locations.py) usa ele, os demais o global
+# - /coverage: cobertura horária e lacunas por local, de tabelas mantidas na ingestão
+#   (storage/coverage.py), sem varrer raw.weather_hourly
+# - Dedup por (location_id, ts); lat/lon normalizados (4 casas) ficam em raw.locations
+# - Chamadas à Open-Meteo são assíncronas (pool compartilhado, retry; ver http_client.py),
+#   com cache em disco das respostas (response_cache.py) e só do que falta no banco:
+#   /collect pede as horas depois da última gravada do local (estado online; em dia => não
+#   chama), backfill sem upsert pede só os dias com horas faltando (storage/coverage.py)
 
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 from datetime import date, timedelta
-from typing import Optional
+from typing import List, Optional
 
 import duckdb
 import pandas as pd
-import requests
+import pyarrow as pa
 from fastapi import FastAPI, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+from src.inference.model_registry import get_location_models
+from src.inference.online_features import OnlineFeatureState
+from src.inference.prediction_cache import ensure_serving, get_prediction_cache
+from src.inference.service import predict_locations
+from src.ingestion import backfill_jobs
+from src.ingestion.hourly_parser import RAW_ARROW_SCHEMA, to_arrow_hourly, ts_range
+from src.ingestion.http_client import close_client, get_client
+from src.ingestion.ingest_buffer import IngestBuffer
+from src.storage import coverage
+from src.storage.db import get_db
+from src.storage.locations import (
+    GEO_VIEW_SQL,
+    ensure_locations,
+    location_id,
+    norm_latlon,
+    register_locations,
+)
 
 # ---------------------------------------------------------------------
 # Config
@@ -27,175 +66,562 @@ HOURLY_VARS = [
     "precipitation",
     "wind_speed_10m",        # alternativamente pode vir 'windspeed_10m'
 ]
+# coordenadas por requisição multi-local (latitude=a,b,c&longitude=x,y,z)
+BATCH_LOCATIONS = 50
+# grava/consulta as previsões servidas em serving.predictions (além do cache em memória)
+PERSIST_PREDICTIONS = os.getenv("PERSIST_PREDICTIONS", "1") != "0"
 
 # ---------------------------------------------------------------------
-# DuckDB: criar tabela se não existir
+# DuckDB: criar tabelas se não existirem / migrar a tabela antiga (lat/lon por linha)
 # ---------------------------------------------------------------------
-def ensure_table() -> None:
-    con = duckdb.connect(DB_PATH.as_posix())
-    con.execute("CREATE SCHEMA IF NOT EXISTS raw;")
-    con.execute(
+# lat/lon ficam em raw.locations (src/storage/locations.py); aqui só o location_id
+WEATHER_HOURLY_DDL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        location_id INTEGER,
+        ts TIMESTAMP,
+        temperature_2m DOUBLE,
+        relative_humidity_2m DOUBLE,
+        precipitation DOUBLE,
+        wind_speed_10m DOUBLE,
+        PRIMARY KEY (location_id, ts)
+    );
+"""
+
+def has_location_id(con: duckdb.DuckDBPyConnection) -> bool:
+    return con.execute(
         """
-        CREATE TABLE IF NOT EXISTS raw.weather_hourly (
-            ts TIMESTAMP,
-            latitude DOUBLE,
-            longitude DOUBLE,
-            temperature_2m DOUBLE,
-            relative_humidity_2m DOUBLE,
-            precipitation DOUBLE,
-            wind_speed_10m DOUBLE
-        );
+        SELECT COUNT(*) FROM duckdb_columns()
+        WHERE schema_name = 'raw' AND table_name = 'weather_hourly' AND column_name = 'location_id'
         """
-    )
-    con.close()
+    ).fetchone()[0] > 0
+
+def migrate_weather_hourly(con: duckdb.DuckDBPyConnection) -> int:
+    """
+    Bancos antigos (lat/lon em cada linha, com ou sem PK): cadastra os locais em raw.locations e
+    reescreve raw.weather_hourly com location_id, ORDENADA por (location_id, ts), mantendo UMA
+    linha por chave (preferindo a que tem temperatura). Devolve as duplicatas removidas.
+    """
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        n_old = con.execute("SELECT COUNT(*) FROM raw.weather_hourly").fetchone()[0]
+        register_locations(con, "raw.weather_hourly")
+        con.execute("DROP TABLE IF EXISTS raw.weather_hourly_new;")
+        con.execute(WEATHER_HOURLY_DDL.format(name="raw.weather_hourly_new"))
+        con.execute(
+            """
+            INSERT INTO raw.weather_hourly_new
+            SELECT l.location_id, r.ts, r.temperature_2m, r.relative_humidity_2m,
+                   r.precipitation, r.wind_speed_10m
+            FROM raw.weather_hourly AS r
+            JOIN raw.locations AS l
+              ON l.latitude = round(r.latitude, 4) AND l.longitude = round(r.longitude, 4)
+            WHERE r.ts IS NOT NULL
+            QUALIFY row_number() OVER (
+                PARTITION BY l.location_id, r.ts ORDER BY r.temperature_2m IS NULL
+            ) = 1
+            ORDER BY l.location_id, r.ts;
+            """
+        )
+        n_new = con.execute("SELECT COUNT(*) FROM raw.weather_hourly_new").fetchone()[0]
+        con.execute("DROP TABLE raw.weather_hourly;")
+        con.execute("ALTER TABLE raw.weather_hourly_new RENAME TO weather_hourly;")
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        raise
+    return n_old - n_new
+
+def _ensure_table(con: duckdb.DuckDBPyConnection) -> None:
+    ensure_locations(con)
+    con.execute(WEATHER_HOURLY_DDL.format(name="raw.weather_hourly"))
+    if not has_location_id(con):
+        removed = migrate_weather_hourly(con)
+        print(f"[OK] raw.weather_hourly migrada para location_id (raw.locations); {removed} duplicatas removidas")
+    con.execute(GEO_VIEW_SQL)
+    ensure_serving(con)
+    coverage.ensure_coverage(con)
+
+def ensure_table() -> None:
+    get_db(DB_PATH).write(_ensure_table)
 
 ensure_table()
+backfill_jobs.ensure_job_tables()
 
 # ---------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------
-def norm_latlon(lat: float, lon: float, nd: int = 4):
-    """Arredonda lat/lon para nd casas (evita 'quase duplicatas')."""
-    return round(lat, nd), round(lon, nd)
+def append_duckdb_by_location(df, upsert: bool = False) -> pd.DataFrame:
+    """
+    Grava no DuckDB com dedupe pela PK (location_id, ts), numa única transação,
+    e devolve as linhas gravadas por local (colunas latitude, longitude, inserted).
+    df: DataFrame ou tabela Arrow (to_arrow_hourly). Locais novos entram em raw.locations
+    (com o fuso, se df tiver a coluna 'timezone').
+    - upsert=False: ON CONFLICT DO NOTHING (só linhas novas)
+    - upsert=True:  ON CONFLICT DO UPDATE (sobrescreve as variáveis das horas já gravadas)
+    """
+    if (df.num_rows if isinstance(df, pa.Table) else len(df)) == 0:
+        return pd.DataFrame(columns=["latitude", "longitude", "inserted"])
+    # a mesma chave duas vezes no lote violaria a PK dentro do próprio INSERT
+    # (tabelas Arrow dos payloads já vêm sem repetição: horas consecutivas, um payload por local)
+    if isinstance(df, pd.DataFrame):
+        df = df.drop_duplicates(subset=["ts", "latitude", "longitude"], keep="last")
+    # fila de escrita única do processo: handlers e jobs não disputam a mesma chave
+    written = get_db(DB_PATH).write(_write_rows, df, upsert)
+    return written.groupby(["latitude", "longitude"], as_index=False).size().rename(
+        columns={"size": "inserted"}
+    )
 
-def to_df_hourly(payload: dict, lat: float, lon: float) -> pd.DataFrame:
+def _upsert_rows(con: duckdb.DuckDBPyConnection, df, upsert: bool) -> pd.DataFrame:
+    """df: DataFrame ou tabela Arrow com ts, latitude, longitude, variáveis [e timezone]."""
+    if upsert:
+        action = (
+            "DO UPDATE SET temperature_2m = excluded.temperature_2m, "
+            "relative_humidity_2m = excluded.relative_humidity_2m, "
+            "precipitation = excluded.precipitation, "
+            "wind_speed_10m = excluded.wind_speed_10m"
+        )
+    else:
+        action = "DO NOTHING"
+    con.register("df_tmp", df)
+    try:
+        con.execute("BEGIN TRANSACTION;")
+        register_locations(con, "df_tmp", with_timezone="timezone" in con.table("df_tmp").columns)
+        locs = con.execute(
+            """
+            SELECT l.location_id, l.latitude, l.longitude
+            FROM raw.locations AS l
+            SEMI JOIN df_tmp AS d
+              ON l.latitude = round(d.latitude, 4) AND l.longitude = round(d.longitude, 4)
+            """
+        ).df()
+        # custo proporcional ao lote (lookup no índice da PK), não ao tamanho da tabela;
+        # lote ordenado por (location_id, ts) mantém a tabela agrupada por local
+        written = con.execute(
+            f"""
+            INSERT INTO raw.weather_hourly
+            SELECT l.location_id, d.ts, d.temperature_2m, d.relative_humidity_2m,
+                   d.precipitation, d.wind_speed_10m
+            FROM df_tmp AS d
+            JOIN raw.locations AS l
+              ON l.latitude = round(d.latitude, 4) AND l.longitude = round(d.longitude, 4)
+            ORDER BY l.location_id, d.ts
+            ON CONFLICT (location_id, ts) {action}
+            RETURNING location_id, ts, temperature_2m, relative_humidity_2m,
+                      precipitation, wind_speed_10m;
+            """
+        ).df()
+        # cobertura/lacunas dos dias do lote, na mesma transação
+        coverage.update(con, written)
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        raise
+    finally:
+        con.unregister("df_tmp")
+    return written.merge(locs, on="location_id").drop(columns="location_id")
+
+def _write_rows(con: duckdb.DuckDBPyConnection, df, upsert: bool) -> pd.DataFrame:
     """
-    Converte o JSON da Open-Meteo em DataFrame horário.
-    - 'time' vem no fuso indicado em 'timezone' (quando usamos timezone=auto)
-    - localiza no fuso, CORTA FUTURO e converte 'ts' para UTC (naive) antes de gravar
+    _upsert_rows + estado online com as linhas realmente gravadas. Roda no thread escritor:
+    o estado segue a mesma ordem das escritas no banco. Locais que receberam linhas saem do
+    cache de previsões (a chave nova, com o último ts novo, já não acertaria as antigas).
     """
-    hourly = payload.get("hourly", {})
-    tz_name = payload.get("timezone", "UTC")  # ex.: "America/Sao_Paulo"
+    written = _upsert_rows(con, df, upsert)
+    online.update(written)
+    if not written.empty:
+        predictions.invalidate(set(zip(written["latitude"], written["longitude"])))
+    return written
+
+def append_duckdb(df, upsert: bool = False) -> int:
+    """Grava no DuckDB apenas linhas novas (ou sobrescreve, com upsert=True)."""
+    return int(append_duckdb_by_location(df, upsert=upsert)["inserted"].sum())
+
+# ---------------------------------------------------------------------
+# Estado online de features (lags/médias da última hora de cada local, ver online_features.py)
+# ---------------------------------------------------------------------
+online = OnlineFeatureState()
+predictions = get_prediction_cache()
+# modelos por local (training/train_locations.py) carregados sob demanda; sem modelo do local -> global
+location_models = get_location_models() if os.getenv("LOCATION_MODELS", "1") != "0" else None
+
+def rebuild_online() -> int:
+    """Recarrega o estado a partir do DuckDB (subida da API)."""
+    return get_db(DB_PATH).write(lambda con: online.rebuild(con))
+
+# ---------------------------------------------------------------------
+# Buffer write-behind (micro-lotes Arrow -> um INSERT por flush)
+# ---------------------------------------------------------------------
+def _flush_raw(table: pa.Table) -> None:
+    get_db(DB_PATH).write(_write_rows, table, False)
+
+_buffer: Optional[IngestBuffer] = None
+
+def get_buffer() -> IngestBuffer:
+    global _buffer
+    if _buffer is None:
+        _buffer = IngestBuffer(_flush_raw, schema=RAW_ARROW_SCHEMA)
+    return _buffer
+
+def close_buffer() -> None:
+    """Flush final + para o thread do buffer (shutdown da API)."""
+    global _buffer
+    if _buffer is not None:
+        _buffer.close()
+        _buffer = None
+
+def store_payload(payload: dict, lat: float, lon: float, upsert: bool = False):
+    """Converte (Arrow, com o fuso do payload) + grava (bloqueante: roda no threadpool)."""
+    table = to_arrow_hourly(payload, lat, lon)
+    return table, append_duckdb(table, upsert=upsert)
 
-    # Normaliza chaves que mudam entre endpoints antigos/novos
-    rh = hourly.get("relative_humidity_2m", hourly.get("relativehumidity_2m", []))
-    ws = hourly.get("wind_speed_10m", hourly.get("windspeed_10m", []))
+def missing_dates(lat: float, lon: float, start_date: str, end_date: str) -> Optional[tuple]:
+    """
+    Sub-intervalo (datas locais, como o archive recebe) de [start_date, end_date] que ainda
+    tem horas sem dado no banco, pelas tabelas de cobertura; None se já está tudo gravado.
+    Fuso desconhecido: janela UTC alargada em 14h de cada lado (pede a mais, nunca a menos).
+    """
+    start, end = date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date))
+    with get_db(DB_PATH).cursor() as cur:
+        row = cur.execute(
+            "SELECT location_id, timezone FROM raw.locations WHERE latitude = ? AND longitude = ?",
+            list(norm_latlon(lat, lon)),
+        ).fetchone()
+        if row is None:
+            return start.isoformat(), end.isoformat()
+        loc_id, tz = row
+        first = pd.Timestamp(start)
+        after = pd.Timestamp(end) + pd.Timedelta(days=1)
+        if tz:
+            first = first.tz_localize(tz, ambiguous=False, nonexistent="shift_forward").tz_convert("UTC")
+            after = after.tz_localize(tz, ambiguous=False, nonexistent="shift_forward").tz_convert("UTC")
+            first, after = first.tz_localize(None), after.tz_localize(None)
+        else:
+            first, after = first - pd.Timedelta(hours=14), after + pd.Timedelta(hours=14)
+        # horas futuras não existem no archive
+        now = pd.Timestamp.now("UTC").tz_localize(None).floor("h")
+        span = coverage.missing_span(cur, loc_id, first, min(after - pd.Timedelta(hours=1), now))
+    if span is None:
+        return None
+    lo, hi = (
+        (t.tz_localize("UTC").tz_convert(tz).tz_localize(None) if tz else t).date() for t in span
+    )
+    return max(lo, start).isoformat(), min(hi, end).isoformat()
 
-    df = pd.DataFrame(
+async def fetch_archive(lat: float, lon: float, start_date: str, end_date: str, upsert: bool = False):
+    """
+    Baixa o intervalo [start_date, end_date] do archive e grava. Sem upsert, pede só o
+    trecho que ainda falta no banco (missing_dates). Devolve (payload, tabela Arrow, inseridas, trecho
+    pedido); tudo já gravado => (None, tabela vazia, 0, None), sem chamar a Open-Meteo.
+    """
+    if not upsert:
+        span = await run_in_threadpool(missing_dates, lat, lon, start_date, end_date)
+        if span is None:
+            return None, RAW_ARROW_SCHEMA.empty_table(), 0, None
+        start_date, end_date = span
+    payload = await get_client().archive(
         {
-            "ts": hourly.get("time", []),
             "latitude": lat,
             "longitude": lon,
-            "temperature_2m": hourly.get("temperature_2m", []),
-            "relative_humidity_2m": rh,
-            "precipitation": hourly.get("precipitation", []),
-            "wind_speed_10m": ws,
+            "hourly": ",".join(HOURLY_VARS),
+            "start_date": start_date,
+            "end_date": end_date,
+            "timezone": "auto",
         }
     )
-    if df.empty:
-        return df
-
-    # 1) timestamps no fuso local retornado pela API
-    df["ts"] = pd.to_datetime(df["ts"])
-    df["ts"] = df["ts"].dt.tz_localize(tz_name, ambiguous="infer")
+    table, n = await run_in_threadpool(store_payload, payload, lat, lon, upsert)
+    return payload, table, n, (start_date, end_date)
 
-    # 2) remove FUTURO (compara no mesmo fuso)
-    now_local = pd.Timestamp.now(tz_name).floor("H")
-    df = df[df["ts"] <= now_local]
+async def fetch_archive_chunk(lat: float, lon: float, start_date: str, end_date: str) -> int:
+    """Adaptador para os jobs de backfill: só o nº de linhas inseridas."""
+    return (await fetch_archive(lat, lon, start_date, end_date))[2]
 
-    # 3) converte para UTC e remove tz (naive) para armazenar
-    df["ts"] = df["ts"].dt.tz_convert("UTC").dt.tz_localize(None)
-
-    # remove linhas sem temperatura
-    df = df.dropna(subset=["temperature_2m"]).reset_index(drop=True)
-    return df
+def collect_hours(lat: float, lon: float, past_hours: int) -> int:
+    """
+    past_hours a pedir ao forecast: só as horas depois da última gravada do local (estado
+    online; linhas ainda no buffer não contam, no máximo repetem horas). 0 = já está em dia.
+    """
+    last = online.last_ts(lat, lon)
+    if last is None:
+        return past_hours
+    now = pd.Timestamp.now("UTC").tz_localize(None).floor("h")
+    return max(0, min(past_hours, int((now - last) / pd.Timedelta(hours=1))))
 
-def append_duckdb(df: pd.DataFrame) -> int:
-    """Insere no DuckDB apenas linhas novas (dedupe por ts, latitude, longitude)."""
-    if df.empty:
-        return 0
-    con = duckdb.connect(DB_PATH.as_posix())
-    con.register("df_tmp", df)
+def buffer_payload(payload: dict, lat: float, lon: float):
+    """Converte e entrega ao buffer write-behind (não espera o banco)."""
+    table = to_arrow_hourly(payload, lat, lon)
+    return table, get_buffer().add(table)
 
-    # Compatível com todas as versões: usa NOT EXISTS no lugar de ANTI JOIN
-    con.execute(
-        """
-        CREATE TEMP TABLE new_rows AS
-        SELECT t.*
-        FROM df_tmp AS t
-        WHERE NOT EXISTS (
-            SELECT 1
-            FROM raw.weather_hourly AS r
-            WHERE r.ts = t.ts
-              AND r.latitude = t.latitude
-              AND r.longitude = t.longitude
-        );
-        """
-    )
-    inserted = con.execute("SELECT COUNT(*) FROM new_rows").fetchone()[0]
-    con.execute("INSERT INTO raw.weather_hourly SELECT * FROM new_rows;")
-    con.execute("DROP TABLE new_rows;")
-    con.unregister("df_tmp")
-    con.close()
-    return inserted
+def store_payloads(payloads: list, coords: list, sync: bool = True) -> list:
+    """
+    Converte várias respostas (mesma ordem de 'coords') e grava TUDO numa única transação
+    (sync=True) ou entrega ao buffer write-behind (sync=False). Devolve o resumo por local.
+    """
+    tables = [to_arrow_hourly(p, lat, lon) for p, (lat, lon) in zip(payloads, coords)]
+    table_all = pa.concat_tables(tables)
+    if sync:
+        counts = append_duckdb_by_location(table_all)
+        inserted = {(r.latitude, r.longitude): int(r.inserted) for r in counts.itertuples()}
+    else:
+        get_buffer().add(table_all)
+        inserted = {}
+    return [
+        {
+            "lat": lat,
+            "lon": lon,
+            "timezone": p.get("timezone", "UTC"),
+            "inserted_rows": inserted.get((lat, lon), 0) if sync else None,
+            "queued_rows": 0 if sync else table.num_rows,
+            "rows_returned": table.num_rows,
+            "first_ts_utc": ts_range(table)[0],
+            "last_ts_utc": ts_range(table)[1],
+        }
+        for p, (lat, lon), table in zip(payloads, coords, tables)
+    ]
 
 # ---------------------------------------------------------------------
 # FastAPI
 # ---------------------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # estado online antes de aceitar coletas/previsões; depois retoma jobs de backfill
+    # interrompidos por queda/reinício do processo
+    n = await run_in_threadpool(rebuild_online)
+    print(f"[OK] estado online de features: {n} locais")
+    cache = get_client().cache
+    if cache is not None:
+        print(f"[OK] cache da Open-Meteo: {await run_in_threadpool(cache.prune)} respostas expiradas removidas")
+    backfill_jobs.resume_unfinished(fetch_archive_chunk)
+    yield
+    await close_client()
+    # grava o que ainda estiver no buffer antes de sair
+    await run_in_threadpool(close_buffer)
+
 app = FastAPI(
     title="Tech Challenge Fase 3 – Weather API",
-    description="Coleta de clima horário (Open-Meteo) + persistência em DuckDB",
-    version="1.2.0",
+    description="Coleta de clima horário (Open-Meteo) + persistência em DuckDB + previsão das próximas horas",
+    version="1.8.0",
+    lifespan=lifespan,
 )
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics/ingest")
+def ingest_metrics():
+    """
+    Profundidade do buffer write-behind, latência dos flushes, lotes descartados (dead-letter)
+    e cache de respostas da Open-Meteo.
+    """
+    out = get_buffer().metrics()
+    cache = get_client().cache
+    out["response_cache"] = cache.stats() if cache is not None else None
+    return out
+
+@app.post("/ingest/flush")
+async def ingest_flush():
+    """Força o flush do buffer (ex.: antes de rodar prepare_data.py)."""
+    return {"flushed_rows": await run_in_threadpool(get_buffer().flush)}
+
+@app.get("/metrics/predict")
+def predict_metrics():
+    """Tamanho e taxa de acerto do cache de previsões + LRU de modelos por local."""
+    out = predictions.stats()
+    if location_models is not None:
+        out["location_models"] = location_models.stats()
+    return out
+
 @app.get("/collect")
-def collect(
+async def collect(
     latitude: float = Query(-23.55, description="Latitude (padrão: São Paulo)"),
     longitude: float = Query(-46.63, description="Longitude (padrão: São Paulo)"),
     past_hours: int = Query(6, ge=1, le=48, description="Quantas horas anteriores trazer"),
+    sync: bool = Query(False, description="Grava na hora e devolve inserted_rows (sem buffer)"),
 ):
     """
     Coleta as ÚLTIMAS horas (passadas) a partir do forecast e grava no DuckDB.
     Mesmo usando forecast_hours=0, filtramos novamente no código para garantir que nada futuro entre.
+    Por padrão as linhas vão para o buffer write-behind (queued_rows; inserted_rows=null).
+    Só pede as horas depois da última gravada do local (hours_requested); em dia => não chama
+    a Open-Meteo (up_to_date=true).
     """
     try:
         latitude, longitude = norm_latlon(latitude, longitude)
-        hourly_list = ",".join(HOURLY_VARS)
-        url = (
-            "https://api.open-meteo.com/v1/forecast"
-            f"?latitude={latitude}&longitude={longitude}"
-            f"&hourly={hourly_list}"
-            f"&past_hours={past_hours}&forecast_hours=0"
-            "&timezone=auto"
+        hours = collect_hours(latitude, longitude, past_hours)
+        if hours == 0:
+            return {
+                "inserted_rows": 0 if sync else None,
+                "queued_rows": 0,
+                "rows_returned": 0,
+                "lat": latitude,
+                "lon": longitude,
+                "timezone": None,
+                "first_ts_utc": None,
+                "last_ts_utc": None,
+                "hours_requested": 0,
+                "up_to_date": True,
+            }
+        payload = await get_client().forecast(
+            {
+                "latitude": latitude,
+                "longitude": longitude,
+                "hourly": ",".join(HOURLY_VARS),
+                "past_hours": hours,
+                "forecast_hours": 0,
+                "timezone": "auto",
+            }
         )
-        r = requests.get(url, timeout=20)
-        r.raise_for_status()
-        payload = r.json()
-        df = to_df_hourly(payload, latitude, longitude)
-        n = append_duckdb(df)
+        if sync:
+            table, n = await run_in_threadpool(store_payload, payload, latitude, longitude)
+            queued = 0
+        else:
+            table, queued = await run_in_threadpool(buffer_payload, payload, latitude, longitude)
+            n = None
 
         tz_used = payload.get("timezone", "UTC")
-        first_ts = df["ts"].min().isoformat() if not df.empty else None
-        last_ts = df["ts"].max().isoformat() if not df.empty else None
+        first_ts, last_ts = ts_range(table)
 
         return {
-            "inserted_rows": int(n),
-            "rows_returned": int(len(df)),
+            "inserted_rows": int(n) if n is not None else None,
+            "queued_rows": int(queued),
+            "rows_returned": table.num_rows,
             "lat": latitude,
             "lon": longitude,
             "timezone": tz_used,
             "first_ts_utc": first_ts,
             "last_ts_utc": last_ts,
+            "hours_requested": hours,
+            "up_to_date": False,
+        }
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+class Location(BaseModel):
+    latitude: float
+    longitude: float
+
+class CollectBatchRequest(BaseModel):
+    locations: List[Location] = Field(..., min_length=1, max_length=1000)
+    past_hours: int = Field(6, ge=1, le=48, description="Quantas horas anteriores trazer")
+    sync: bool = Field(False, description="Grava na hora (sem buffer) e devolve inserted_rows")
+
+@app.post("/collect/batch")
+async def collect_batch(req: CollectBatchRequest):
+    """
+    Como /collect, para uma lista de coordenadas: agrupa em requisições multi-local da
+    Open-Meteo (BATCH_LOCATIONS por chamada, em paralelo). Com sync=true grava tudo numa
+    transação; senão entrega ao buffer write-behind. Locais já em dia ficam fora das chamadas
+    (up_to_date); os demais vão ordenados pelas horas que faltam, e cada chamada pede o
+    maior past_hours do seu bloco.
+    """
+    try:
+        coords = list(dict.fromkeys(norm_latlon(l.latitude, l.longitude) for l in req.locations))
+        need = {c: collect_hours(*c, req.past_hours) for c in coords}
+        todo = sorted((c for c in coords if need[c] > 0), key=need.get)
+        chunks = [todo[i:i + BATCH_LOCATIONS] for i in range(0, len(todo), BATCH_LOCATIONS)]
+        results = await asyncio.gather(
+            *(
+                get_client().forecast(
+                    {
+                        "latitude": ",".join(str(lat) for lat, _ in chunk),
+                        "longitude": ",".join(str(lon) for _, lon in chunk),
+                        "hourly": ",".join(HOURLY_VARS),
+                        "past_hours": max(need[c] for c in chunk),
+                        "forecast_hours": 0,
+                        "timezone": "auto",
+                    }
+                )
+                for chunk in chunks
+            )
+        )
+        # com uma só coordenada a Open-Meteo devolve objeto; com várias, lista na mesma ordem
+        payloads = [p for res in results for p in (res if isinstance(res, list) else [res])]
+        per_location = await run_in_threadpool(store_payloads, payloads, todo, req.sync) if todo else []
+        for item in per_location:
+            item["up_to_date"] = False
+        fetched = {(item["lat"], item["lon"]): item for item in per_location}
+        items = [
+            fetched.get(c) or {
+                "lat": c[0], "lon": c[1], "timezone": None,
+                "inserted_rows": 0 if req.sync else None, "queued_rows": 0, "rows_returned": 0,
+                "first_ts_utc": None, "last_ts_utc": None, "up_to_date": True,
+            }
+            for c in coords
+        ]
+        return {
+            "inserted_rows": sum(loc["inserted_rows"] for loc in per_location) if req.sync else None,
+            "queued_rows": sum(loc["queued_rows"] for loc in per_location),
+            "locations": items,
+            "requests": len(chunks),
+            "up_to_date": len(coords) - len(todo),
         }
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+class PredictBatchRequest(BaseModel):
+    locations: List[Location] = Field(..., min_length=1, max_length=1000)
+
+@app.get("/predict")
+async def predict(
+    latitude: float = Query(-23.55),
+    longitude: float = Query(-46.63),
+):
+    """
+    Previsão da temperatura da PRÓXIMA hora (depois do último ts gravado do local) e dos
+    demais horizontes do modelo ativo ('horizons'). Linhas ainda no buffer de ingestão não contam.
+    """
+    try:
+        (item,) = await run_in_threadpool(
+            predict_locations, [(latitude, longitude)],
+            state=online, cache=predictions, persist=PERSIST_PREDICTIONS,
+            location_models=location_models,
+        )
+    except FileNotFoundError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    if "error" in item:
+        return JSONResponse(status_code=404, content=item)
+    return item
+
+@app.post("/predict/batch")
+async def predict_batch(req: PredictBatchRequest):
+    """
+    Como /predict para vários locais: UMA consulta da janela final de todos os locais,
+    features montadas juntas e UM model.predict. Locais sem previsão vêm com 'error'.
+    """
+    try:
+        coords = [(l.latitude, l.longitude) for l in req.locations]
+        items = await run_in_threadpool(
+            predict_locations, coords, state=online, cache=predictions, persist=PERSIST_PREDICTIONS,
+            location_models=location_models,
+        )
+    except FileNotFoundError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    return {
+        "predictions": items,
+        "predicted": sum("error" not in i for i in items),
+        # com modelos por local cada item pode vir de uma versão: a de cada um fica no item
+        "model_versions": sorted({i["model_version"] for i in items if i.get("model_version")}),
+    }
+
 @app.post("/backfill")
-def backfill(
+async def backfill(
     latitude: float = Query(-23.55),
     longitude: float = Query(-46.63),
     days: int = Query(30, ge=1, le=180, description="Dias de histórico caso não informe intervalo"),
     start_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
     end_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    upsert: bool = Query(False, description="Sobrescreve horas já gravadas (ON CONFLICT DO UPDATE)"),
 ):
     """
     Baixa histórico horário (archive) e grava no DuckDB.
     - Se 'start_date' e 'end_date' forem passados, usa esse intervalo explicitamente (inclusivo).
     - Caso contrário, usa 'days' retroativos a partir de hoje.
+    - Sem upsert, só o trecho com horas faltando no banco vai à Open-Meteo (range_fetched;
+      null = nada faltava).
     """
     try:
         latitude, longitude = norm_latlon(latitude, longitude)
@@ -206,33 +632,161 @@ def backfill(
             e = date.today().isoformat()
             s = (date.today() - timedelta(days=days)).isoformat()
 
-        hourly_list = ",".join(HOURLY_VARS)
-        url = (
-            "https://archive-api.open-meteo.com/v1/archive"
-            f"?latitude={latitude}&longitude={longitude}"
-            f"&hourly={hourly_list}"
-            f"&start_date={s}&end_date={e}"
-            "&timezone=auto"
-        )
-        r = requests.get(url, timeout=60)
-        r.raise_for_status()
-        payload = r.json()
-        df = to_df_hourly(payload, latitude, longitude)
-        n = append_duckdb(df)
+        payload, table, n, fetched = await fetch_archive(latitude, longitude, s, e, upsert)
 
-        tz_used = payload.get("timezone", "UTC")
-        first_ts = df["ts"].min().isoformat() if not df.empty else None
-        last_ts = df["ts"].max().isoformat() if not df.empty else None
+        tz_used = payload.get("timezone", "UTC") if payload is not None else None
+        first_ts, last_ts = ts_range(table)
 
         return {
             "inserted_rows": int(n),
-            "rows_returned": int(len(df)),
+            "rows_returned": table.num_rows,
             "lat": latitude,
             "lon": longitude,
             "timezone": tz_used,
             "first_ts_utc": first_ts,
             "last_ts_utc": last_ts,
             "range_used": {"start_date": s, "end_date": e},
+            "range_fetched": {"start_date": fetched[0], "end_date": fetched[1]} if fetched else None,
+        }
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.post("/backfill/jobs")
+async def submit_backfill_job(
+    latitude: float = Query(-23.55),
+    longitude: float = Query(-46.63),
+    start_date: Optional[date] = Query(None, description="YYYY-MM-DD"),
+    end_date: Optional[date] = Query(None, description="YYYY-MM-DD (padrão: hoje)"),
+    years: int = Query(5, ge=1, le=80, description="Anos de histórico caso não informe start_date"),
+):
+    """
+    Cria um job de backfill longo: divide o intervalo em blocos mensais, baixa em paralelo
+    e registra o progresso por bloco. Acompanhe em GET /backfill/jobs/{job_id}.
+    """
+    try:
+        latitude, longitude = norm_latlon(latitude, longitude)
+        e = end_date or date.today()
+        s = start_date or (e - timedelta(days=365 * years))
+        if s > e:
+            return JSONResponse(status_code=400, content={"error": "start_date > end_date"})
+        job_id = await run_in_threadpool(backfill_jobs.create_job, latitude, longitude, s, e)
+        backfill_jobs.start_job(job_id, fetch_archive_chunk)
+        return {
+            "job_id": job_id,
+            "status": "pending",
+            "chunks_total": len(backfill_jobs.month_chunks(s, e)),
+            "range_used": {"start_date": s.isoformat(), "end_date": e.isoformat()},
         }
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.get("/backfill/jobs/{job_id}")
+async def get_backfill_job(job_id: str):
+    """Status e progresso (por bloco mensal) de um job de backfill."""
+    status = await run_in_threadpool(backfill_jobs.job_status, job_id)
+    if status is None:
+        return JSONResponse(status_code=404, content={"error": f"job {job_id} não encontrado"})
+    return status
+
+@app.post("/backfill/jobs/{job_id}/resume")
+async def resume_backfill_job(job_id: str):
+    """Reexecuta só os blocos que falharam ou não terminaram."""
+    status = await run_in_threadpool(backfill_jobs.job_status, job_id)
+    if status is None:
+        return JSONResponse(status_code=404, content={"error": f"job {job_id} não encontrado"})
+    backfill_jobs.start_job(job_id, fetch_archive_chunk)
+    return {"job_id": job_id, "status": "running"}
+
+class CoverageRequest(BaseModel):
+    locations: Optional[List[Location]] = Field(None, max_length=10000, description="None = todos os locais")
+    days: Optional[int] = Field(None, ge=1, description="Janela: últimos N dias até a última hora gravada")
+    max_gaps: int = Field(100, ge=0, le=10000, description="Lacunas mais recentes por local")
+
+def _coverage(coords: Optional[list], days: Optional[int], max_gaps: int, with_daily: bool = False) -> list:
+    with get_db(DB_PATH).cursor() as cur:
+        items = coverage.summary(cur, coords, days, max_gaps)
+        if with_daily:
+            for item in items:
+                by_day = coverage.daily(cur, location_id(cur, item["lat"], item["lon"]), item["window_start_utc"])
+                # day vem do .df() como Timestamp: serializa só a data (YYYY-MM-DD)
+                item["daily"] = [
+                    {"day": pd.Timestamp(d).date().isoformat(), "hours": int(h)}
+                    for d, h in by_day.itertuples(index=False)
+                ]
+    return items
+
+@app.get("/coverage")
+async def coverage_one(
+    latitude: float = Query(-23.55),
+    longitude: float = Query(-46.63),
+    days: int = Query(30, ge=1, description="Janela: últimos N dias até a última hora gravada"),
+    max_gaps: int = Query(100, ge=0, le=10000),
+):
+    """
+    Cobertura horária de um local na janela (horas esperadas/gravadas, %, lacunas) + horas
+    gravadas por dia. Lê só raw.coverage_daily/raw.coverage_gaps (mantidas na ingestão).
+    """
+    try:
+        items = await run_in_threadpool(_coverage, [norm_latlon(latitude, longitude)], days, max_gaps, True)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    if not items:
+        return JSONResponse(status_code=404, content={"error": "sem dados para este local"})
+    return items[0]
+
+@app.post("/coverage")
+async def coverage_batch(req: CoverageRequest):
+    """
+    Cobertura e lacunas de vários locais (ou de todos, sem 'locations') numa consulta:
+    base para re-backfill só das lacunas (audit_backfill.py --all --fix).
+    """
+    coords = None
+    if req.locations is not None:
+        coords = [norm_latlon(l.latitude, l.longitude) for l in req.locations]
+    try:
+        items = await run_in_threadpool(_coverage, coords, req.days, req.max_gaps)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    return {
+        "locations": items,
+        "with_gaps": sum(i["n_gaps"] > 0 for i in items),
+        "missing_hours": sum(i["missing_hours"] for i in items),
+    }
+
+def _delete_raw(con: duckdb.DuckDBPyConnection, lat: Optional[float], lon: Optional[float]) -> int:
+    # coverage.forget depois do DELETE: as horas que estão no arquivo Parquet continuam
+    # cobertas (o /backfill não baixa de novo o que archive.py já guardou)
+    if lat is None:
+        online.drop()
+        predictions.invalidate()
+        n = int(con.execute("DELETE FROM raw.weather_hourly").fetchone()[0])
+        coverage.forget(con)
+        return n
+    online.drop(*norm_latlon(lat, lon))
+    predictions.invalidate([norm_latlon(lat, lon)])
+    loc_id = location_id(con, lat, lon)
+    if loc_id is None:
+        return 0
+    # o local continua em raw.locations (fuso/nome valem para uma nova coleta)
+    n = int(con.execute("DELETE FROM raw.weather_hourly WHERE location_id = ?", [loc_id]).fetchone()[0])
+    coverage.forget(con, loc_id)
+    return n
+
+@app.delete("/raw")
+async def delete_raw(
+    latitude: Optional[float] = Query(None),
+    longitude: Optional[float] = Query(None),
+    all_locations: bool = Query(False, description="Apaga TODOS os locais (ignora lat/lon)"),
+):
+    """
+    Remove linhas de raw.weather_hourly (não mexe em refined/modelos): da cidade (lat/lon)
+    ou, com all_locations=true, de todos os locais. Passa pela fila de escrita única do processo.
+    """
+    if not all_locations and (latitude is None or longitude is None):
+        return JSONResponse(status_code=400, content={"error": "informe latitude/longitude ou all_locations=true"})
+    try:
+        lat = None if all_locations else latitude
+        n = await run_in_threadpool(get_db(DB_PATH).write, _delete_raw, lat, longitude)
+        return {"deleted_rows": n}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
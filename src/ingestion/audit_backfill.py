@@ -1,72 +1,151 @@
+# src/ingestion/audit_backfill.py
+# Auditoria da cobertura horária (horas esperadas x gravadas, lacunas) por local.
+# - Lê só raw.coverage_daily/raw.coverage_gaps (storage/coverage.py, mantidas na ingestão):
+#   sem varrer raw.weather_hourly nem montar a grade horária em pandas
+# - --all: todos os locais numa consulta
+# - --api URL: pergunta à API (POST /coverage), para rodar com ela no ar (dono do banco)
+# - --fix (com --api): abre um job de backfill (POST /backfill/jobs) para cada lacuna, com as
+#   datas LOCAIS que a contêm (o archive é chamado com timezone=auto); fuso desconhecido:
+#   um dia a mais de cada lado, como o missing_dates da API
+# Uso: python src/ingestion/audit_backfill.py [--lat -23.55 --lon -46.63 | --all] [--days 30]
+#      python src/ingestion/audit_backfill.py --all --api http://127.0.0.1:8000 --fix
 from pathlib import Path
 import argparse
+import sys
+
 import duckdb
 import pandas as pd
+import requests
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.storage import coverage
+from src.storage.locations import location_id, norm_latlon
 
 DB_PATH = Path("data/rt_weather.duckdb")
+SHOW_GAPS = 20
 
-def audit(lat: float, lon: float, days: int = 30):
-    con = duckdb.connect(DB_PATH.as_posix())
+
+def from_db(coords, days: int, max_gaps: int) -> tuple:
+    """(itens de coverage.summary, horas por dia do 1º local) direto do banco (API parada)."""
+    con = duckdb.connect(DB_PATH.as_posix(), read_only=True)
     try:
-        # pega tudo da cidade
-        df = con.execute(
-            """
-            SELECT ts
-            FROM raw.weather_hourly
-            WHERE round(latitude,4)=round(?,4) AND round(longitude,4)=round(?,4)
-            ORDER BY ts
-            """,
-            [lat, lon],
-        ).df()
+        items = coverage.summary(con, coords, days, max_gaps)
+        daily = None
+        if coords is not None and items:
+            daily = coverage.daily(con, location_id(con, *coords[0]), items[0]["window_start_utc"])
+        return items, daily
     finally:
         con.close()
 
-    if df.empty:
-        print("Nenhum dado para essa cidade. Faça backfill/coleta primeiro.")
-        return
 
-    # janela: últimos N dias até a última hora coletada
-    last_ts = pd.to_datetime(df["ts"].max())
-    start_ts = last_ts - pd.Timedelta(days=days)
+def from_api(api: str, coords, days: int, max_gaps: int) -> list:
+    body = {"days": days, "max_gaps": max_gaps}
+    if coords is not None:
+        body["locations"] = [{"latitude": lat, "longitude": lon} for lat, lon in coords]
+    r = requests.post(f"{api}/coverage", json=body, timeout=60)
+    r.raise_for_status()
+    return r.json()["locations"]
 
-    win = df[(pd.to_datetime(df["ts"]) >= start_ts) & (pd.to_datetime(df["ts"]) <= last_ts)].copy()
-    win["ts"] = pd.to_datetime(win["ts"])
 
-    # grade horária esperada
-    expected = pd.date_range(start=start_ts, end=last_ts, freq="H")
-    got = pd.Series(1, index=win["ts"])
-    # horas faltantes
-    missing = expected.difference(got.index)
+def gap_dates(gap: dict, tz: str = None) -> tuple:
+    """(start_date, end_date) locais do /backfill que cobrem a lacuna (horas em UTC naive)."""
+    start, end = pd.Timestamp(gap["start_utc"]), pd.Timestamp(gap["end_utc"])
+    if tz:
+        start = start.tz_localize("UTC").tz_convert(tz)
+        end = end.tz_localize("UTC").tz_convert(tz)
+    else:
+        # fuso de -12h a +14h: o dia local está no máximo um dia antes/depois do dia UTC
+        start, end = start - pd.Timedelta(days=1), end + pd.Timedelta(days=1)
+    return start.date().isoformat(), end.date().isoformat()
 
-    # resumo
-    hours_expected = len(expected)
-    hours_got = win.shape[0]
-    coverage = 100 * hours_got / hours_expected if hours_expected else 0
 
-    print("=== AUDITORIA BACKFILL ===")
-    print(f"Local: lat={lat}, lon={lon}")
-    print(f"Janela (UTC): {start_ts} -> {last_ts}  ({days} dias)")
-    print(f"Horas esperadas: {hours_expected}")
-    print(f"Horas gravadas:  {hours_got}")
-    print(f"Cobertura:       {coverage:.2f}%")
-    if len(missing) == 0:
+def fix_gaps(api: str, items: list) -> int:
+    """Um job de backfill por lacuna (datas locais que a contêm; só as horas faltantes são pedidas)."""
+    jobs = 0
+    for item in items:
+        for gap in item["gaps"]:
+            start_date, end_date = gap_dates(gap, item.get("timezone"))
+            r = requests.post(
+                f"{api}/backfill/jobs",
+                params={
+                    "latitude": item["lat"],
+                    "longitude": item["lon"],
+                    "start_date": start_date,
+                    "end_date": end_date,
+                },
+                timeout=30,
+            )
+            r.raise_for_status()
+            print(f"[OK] job {r.json()['job_id']}: ({item['lat']}, {item['lon']}) "
+                  f"{gap['start_utc']} -> {gap['end_utc']} UTC ({start_date} .. {end_date} local)")
+            jobs += 1
+    return jobs
+
+
+def report(item: dict, days: int, show_gaps: int = SHOW_GAPS) -> None:
+    print(f"Local: lat={item['lat']}, lon={item['lon']}")
+    print(f"Janela (UTC): {item['window_start_utc']} -> {item['last_ts_utc']}  ({days} dias)")
+    print(f"Horas esperadas: {item['hours_expected']}")
+    print(f"Horas gravadas:  {item['hours_observed']}")
+    print(f"Cobertura:       {item['coverage_pct']:.2f}%")
+    if item["missing_hours"] == 0:
         print("OK: nenhuma hora faltando na janela.")
+        return
+    print(f"Horas faltantes: {item['missing_hours']} em {item['n_gaps']} lacunas "
+          f"(mostrando até {show_gaps}, mais recentes)")
+    for gap in item["gaps"][-show_gaps:]:
+        print(f" - {gap['start_utc']} -> {gap['end_utc']} ({gap['hours']}h)")
+
+
+def audit(lat: float = None, lon: float = None, days: int = 30, api: str = None, fix: bool = False):
+    if fix and not api:
+        raise SystemExit("--fix precisa da API no ar (--api URL): ela é o único escritor do banco.")
+    coords = None if lat is None else [norm_latlon(lat, lon)]
+    # --fix precisa de todas as lacunas da janela, não só das exibidas
+    max_gaps = 10000 if fix else SHOW_GAPS
+    if api:
+        items, daily = from_api(api.rstrip("/"), coords, days, max_gaps), None
     else:
-        print(f"Horas faltantes: {len(missing)} (mostrando até 20)")
-        for t in list(missing[:20]):
-            print(" -", t)
+        try:
+            items, daily = from_db(coords, days, max_gaps)
+        except duckdb.CatalogException:
+            raise SystemExit("Banco sem tabelas de cobertura: suba a API uma vez (ela as monta).")
+
+    if not items:
+        print("Nenhum dado para essa cidade. Faça backfill/coleta primeiro.")
+        return
+
+    print("=== AUDITORIA BACKFILL ===")
+    for item in items:
+        report(item, days)
+        print()
+    if len(items) > 1:
+        with_gaps = sum(i["n_gaps"] > 0 for i in items)
+        print(f"[OK] {len(items)} locais, {with_gaps} com lacunas, "
+              f"{sum(i['missing_hours'] for i in items)} horas faltantes")
 
     # distribuição por dia (para diagnóstico)
-    daily = (win.assign(day=win["ts"].dt.floor("D"))
-                .groupby("day")["ts"].count()
-                .rename("hours"))
-    print("\nHoras por dia (últimos 10):")
-    print(daily.tail(10))
+    if daily is not None:
+        print("Horas por dia (últimos 10):")
+        print(daily.tail(10).to_string(index=False))
+
+    if fix:
+        print(f"[OK] {fix_gaps(api.rstrip('/'), items)} jobs de backfill abertos")
+
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--lat", type=float, default=-23.55)
     ap.add_argument("--lon", type=float, default=-46.63)
+    ap.add_argument("--all", action="store_true", help="audita todos os locais com dados")
     ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--api", help="URL da API (ex.: http://127.0.0.1:8000); sem ela, lê o banco direto")
+    ap.add_argument("--fix", action="store_true", help="abre jobs de backfill para as lacunas (requer --api)")
     args = ap.parse_args()
-    audit(args.lat, args.lon, args.days)
+    if args.all:
+        audit(days=args.days, api=args.api, fix=args.fix)
+    else:
+        audit(args.lat, args.lon, args.days, args.api, args.fix)
@@ -0,0 +1,217 @@
+# src/ingestion/backfill_jobs.py
+# Jobs de backfill histórico longos (anos), divididos em blocos MENSAIS.
+# - Blocos baixados em paralelo (limite por job) pelo cliente assíncrono compartilhado
+# - Progresso por bloco gravado no DuckDB (ops.backfill_jobs / ops.backfill_chunks):
+#   se o processo cair, o job retoma só os blocos que não terminaram
+# - A função que baixa+grava um bloco é injetada pela API (evita import circular)
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+import duckdb
+
+from src.storage.db import get_db
+
+DB_PATH = Path("data") / "rt_weather.duckdb"
+JOB_CONCURRENCY = 4
+
+# (lat, lon, start_date, end_date) -> nº de linhas inseridas
+FetchChunk = Callable[[float, float, str, str], Awaitable[int]]
+
+_tasks: dict = {}
+
+
+def _ensure_job_tables(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute("CREATE SCHEMA IF NOT EXISTS ops;")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ops.backfill_jobs (
+            job_id VARCHAR PRIMARY KEY,
+            latitude DOUBLE,
+            longitude DOUBLE,
+            start_date DATE,
+            end_date DATE,
+            status VARCHAR,          -- pending | running | done | failed
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP
+        );
+        """
+    )
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ops.backfill_chunks (
+            job_id VARCHAR,
+            chunk_start DATE,
+            chunk_end DATE,
+            status VARCHAR,          -- pending | done | failed
+            inserted_rows INTEGER,
+            attempts INTEGER,
+            error VARCHAR,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (job_id, chunk_start)
+        );
+        """
+    )
+
+
+def ensure_job_tables() -> None:
+    get_db(DB_PATH).write(_ensure_job_tables)
+
+
+def month_chunks(start: date, end: date) -> list:
+    """Divide [start, end] (inclusivo) em blocos por mês-calendário."""
+    chunks = []
+    s = start
+    while s <= end:
+        next_month = (s.replace(day=1) + timedelta(days=32)).replace(day=1)
+        e = min(end, next_month - timedelta(days=1))
+        chunks.append((s, e))
+        s = next_month
+    return chunks
+
+
+def create_job(lat: float, lon: float, start: date, end: date) -> str:
+    """Registra o job e seus blocos (todos 'pending'). Devolve o job_id."""
+    job_id = uuid.uuid4().hex[:12]
+    now = datetime.utcnow()
+    chunks = month_chunks(start, end)
+
+    def insert(con: duckdb.DuckDBPyConnection) -> None:
+        con.execute("BEGIN TRANSACTION;")
+        con.execute(
+            "INSERT INTO ops.backfill_jobs VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+            [job_id, lat, lon, start, end, now, now],
+        )
+        con.executemany(
+            "INSERT INTO ops.backfill_chunks VALUES (?, ?, ?, 'pending', 0, 0, NULL, ?)",
+            [[job_id, s, e, now] for s, e in chunks],
+        )
+        con.execute("COMMIT;")
+
+    get_db(DB_PATH).write(insert)
+    return job_id
+
+
+def _set_job_status(job_id: str, status: str) -> None:
+    get_db(DB_PATH).execute_write(
+        "UPDATE ops.backfill_jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+        [status, datetime.utcnow(), job_id],
+    )
+
+
+def _set_chunk(job_id: str, chunk_start: date, status: str, inserted: int, error: Optional[str]) -> None:
+    get_db(DB_PATH).execute_write(
+        """
+        UPDATE ops.backfill_chunks
+        SET status = ?, inserted_rows = ?, attempts = attempts + 1, error = ?, updated_at = ?
+        WHERE job_id = ? AND chunk_start = ?
+        """,
+        [status, inserted, error, datetime.utcnow(), job_id, chunk_start],
+    )
+
+
+async def run_job(job_id: str, fetch_chunk: FetchChunk, concurrency: int = JOB_CONCURRENCY) -> str:
+    """Executa (ou retoma) os blocos ainda não concluídos do job. Devolve o status final."""
+    db = get_db(DB_PATH)
+    job = db.fetchone("SELECT latitude, longitude FROM ops.backfill_jobs WHERE job_id = ?", [job_id])
+    pending = db.fetchall(
+        """
+        SELECT chunk_start, chunk_end FROM ops.backfill_chunks
+        WHERE job_id = ? AND status <> 'done'
+        ORDER BY chunk_start
+        """,
+        [job_id],
+    )
+    if job is None:
+        raise KeyError(job_id)
+    lat, lon = job
+
+    await asyncio.to_thread(_set_job_status, job_id, "running")
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(s: date, e: date) -> bool:
+        async with sem:
+            try:
+                n = await fetch_chunk(lat, lon, s.isoformat(), e.isoformat())
+            except Exception as exc:
+                await asyncio.to_thread(_set_chunk, job_id, s, "failed", 0, str(exc))
+                return False
+            await asyncio.to_thread(_set_chunk, job_id, s, "done", int(n), None)
+            return True
+
+    ok = await asyncio.gather(*(one(s, e) for s, e in pending))
+    status = "done" if all(ok) else "failed"
+    await asyncio.to_thread(_set_job_status, job_id, status)
+    return status
+
+
+def start_job(job_id: str, fetch_chunk: FetchChunk) -> None:
+    """Agenda o job em background no event loop atual (ignora se já está rodando)."""
+    task = _tasks.get(job_id)
+    if task is not None and not task.done():
+        return
+    _tasks[job_id] = asyncio.create_task(run_job(job_id, fetch_chunk))
+
+
+def resume_unfinished(fetch_chunk: FetchChunk) -> list:
+    """Na subida da API: retoma jobs que ficaram 'pending'/'running' (processo caiu/reiniciou)."""
+    ids = [
+        r[0]
+        for r in get_db(DB_PATH).fetchall(
+            "SELECT job_id FROM ops.backfill_jobs WHERE status IN ('pending', 'running')"
+        )
+    ]
+    for job_id in ids:
+        start_job(job_id, fetch_chunk)
+    return ids
+
+
+def job_status(job_id: str) -> Optional[dict]:
+    """Status do job + progresso por bloco (None se não existe)."""
+    db = get_db(DB_PATH)
+    job = db.df(
+        """
+        SELECT job_id, latitude, longitude, start_date, end_date, status, created_at, updated_at
+        FROM ops.backfill_jobs WHERE job_id = ?
+        """,
+        [job_id],
+    )
+    if job.empty:
+        return None
+    chunks = db.df(
+        """
+        SELECT chunk_start, chunk_end, status, inserted_rows, attempts, error
+        FROM ops.backfill_chunks WHERE job_id = ? ORDER BY chunk_start
+        """,
+        [job_id],
+    )
+    row = job.iloc[0]
+    day = lambda v: v.date().isoformat()  # DATE chega como Timestamp no DataFrame
+    done = int((chunks["status"] == "done").sum())
+    return {
+        "job_id": row["job_id"],
+        "lat": float(row["latitude"]),
+        "lon": float(row["longitude"]),
+        "start_date": day(row["start_date"]),
+        "end_date": day(row["end_date"]),
+        "status": row["status"],
+        "chunks_total": int(len(chunks)),
+        "chunks_done": done,
+        "chunks_failed": int((chunks["status"] == "failed").sum()),
+        "inserted_rows": int(chunks["inserted_rows"].sum()),
+        "created_at": row["created_at"].isoformat(),
+        "updated_at": row["updated_at"].isoformat(),
+        "chunks": [
+            {
+                "start_date": day(r.chunk_start),
+                "end_date": day(r.chunk_end),
+                "status": r.status,
+                "inserted_rows": int(r.inserted_rows),
+                "attempts": int(r.attempts),
+                "error": r.error if isinstance(r.error, str) else None,
+            }
+            for r in chunks.itertuples()
+        ],
+    }
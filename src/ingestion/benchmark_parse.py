@@ -0,0 +1,174 @@
+# src/ingestion/benchmark_parse.py
+# Micro-benchmark da conversão dos payloads da Open-Meteo (hourly_parser.py):
+# to_df_hourly (pandas, parse de cada string de 'time') x to_arrow_hourly (NumPy/Arrow, ts pela
+# grade horária) em payloads de archive grandes e sintéticos (sem rede, sem banco em disco).
+# - Payload como o archive devolve com timezone=auto: 'time' em hora local (horário de verão
+#   incluído), listas já decodificadas do JSON, algumas horas sem dado (null)
+# - Por fuso: tempo só da conversão e da conversão + entrega ao DuckDB (INSERT numa tabela
+#   em memória, como o _upsert_rows), p50 sobre --repeats execuções; confere se os dois
+#   caminhos gravam as mesmas linhas no DuckDB (EXCEPT ALL nos dois sentidos: NULL x NaN conta)
+# Uso: python src/ingestion/benchmark_parse.py [--years 5] [--repeats 7] [--tz Europe/Berlin]
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import argparse
+import json
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from src.ingestion.hourly_parser import to_arrow_hourly, to_df_hourly
+
+TIMEZONES = ["America/Sao_Paulo", "Europe/Berlin", "UTC"]
+YEARS = 5
+REPEATS = 7
+MISSING_FRAC = 0.001
+LAT, LON = -23.55, -46.63
+
+
+def make_payload(years: int, tz: str, seed: int = 0) -> dict:
+    """Payload de archive com 'years' anos terminando ontem, decodificado como o httpx entrega."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.now(tz).normalize().tz_convert("UTC")
+    utc = pd.date_range(end=end - pd.Timedelta(hours=1), periods=int(years * 365.25 * 24), freq="h")
+    n = len(utc)
+    temp = np.round(20 + 8 * np.sin(np.arange(n) * 2 * np.pi / 24) + rng.normal(0, 1, n), 1)
+
+    def values(a: np.ndarray) -> list:
+        out = a.tolist()
+        for i in rng.choice(n, int(n * MISSING_FRAC), replace=False):
+            out[i] = None
+        return out
+
+    payload = {
+        "latitude": LAT,
+        "longitude": LON,
+        "timezone": tz,
+        "hourly": {
+            "time": utc.tz_convert(tz).strftime("%Y-%m-%dT%H:%M").tolist(),
+            "temperature_2m": values(temp),
+            "relative_humidity_2m": values(rng.integers(30, 100, n).astype(float)),
+            "precipitation": values(np.round(rng.exponential(0.2, n), 1)),
+            "wind_speed_10m": values(np.round(rng.gamma(2, 4, n), 1)),
+        },
+    }
+    # ida e volta pelo JSON: tipos exatamente como na resposta decodificada
+    return json.loads(json.dumps(payload))
+
+
+def _p50_ms(fn, repeats: int) -> float:
+    fn()  # aquecimento
+    t = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        t.append(time.perf_counter() - t0)
+    return float(np.median(t) * 1000)
+
+
+BENCH_DDL = """
+    CREATE OR REPLACE TABLE {name} (
+        ts TIMESTAMP, latitude DOUBLE, longitude DOUBLE, temperature_2m DOUBLE,
+        relative_humidity_2m DOUBLE, precipitation DOUBLE, wind_speed_10m DOUBLE
+    )
+"""
+
+
+def _load(con: duckdb.DuckDBPyConnection, rows, table: str = "bench") -> int:
+    """Entrega ao DuckDB como o _upsert_rows: register + INSERT ... SELECT."""
+    con.register("df_tmp", rows)
+    try:
+        return con.execute(
+            f"""
+            INSERT INTO {table}
+            SELECT ts, latitude, longitude, temperature_2m, relative_humidity_2m,
+                   precipitation, wind_speed_10m
+            FROM df_tmp
+            """
+        ).fetchone()[0]
+    finally:
+        con.unregister("df_tmp")
+
+
+def bench_tz(tz: str, years: int, repeats: int) -> dict:
+    payload = make_payload(years, tz)
+    con = duckdb.connect()
+    for name in ("bench", "rows_pandas", "rows_arrow"):
+        con.execute(BENCH_DDL.format(name=name))
+
+    def old_path():
+        df = to_df_hourly(payload, LAT, LON).assign(timezone=payload["timezone"])
+        return _load(con, df)
+
+    def new_path():
+        return _load(con, to_arrow_hourly(payload, LAT, LON))
+
+    rows = _load(con, to_df_hourly(payload, LAT, LON), "rows_pandas")
+    _load(con, to_arrow_hourly(payload, LAT, LON), "rows_arrow")
+    diff = con.execute(
+        """
+        SELECT (SELECT COUNT(*) FROM (FROM rows_pandas EXCEPT ALL FROM rows_arrow))
+             + (SELECT COUNT(*) FROM (FROM rows_arrow EXCEPT ALL FROM rows_pandas))
+        """
+    ).fetchone()[0]
+    same = diff == 0
+    try:
+        return {
+            "tz": tz,
+            "hours": len(payload["hourly"]["time"]),
+            "rows": int(rows),
+            "same_rows": bool(same),
+            "parse_pandas_ms": round(_p50_ms(lambda: to_df_hourly(payload, LAT, LON), repeats), 2),
+            "parse_arrow_ms": round(_p50_ms(lambda: to_arrow_hourly(payload, LAT, LON), repeats), 2),
+            "load_pandas_ms": round(_p50_ms(old_path, repeats), 2),
+            "load_arrow_ms": round(_p50_ms(new_path, repeats), 2),
+        }
+    finally:
+        con.close()
+
+
+def print_table(results: list) -> None:
+    head = f"{'fuso':<20}{'horas':>8}{'iguais':>8}{'pandas ms':>11}{'arrow ms':>10}{'x':>7}" \
+           f"{'+duckdb pandas':>16}{'+duckdb arrow':>15}{'x':>7}"
+    print(head)
+    print("-" * len(head))
+    for r in results:
+        print(
+            f"{r['tz']:<20}{r['hours']:>8}{'sim' if r['same_rows'] else 'NÃO':>8}"
+            f"{r['parse_pandas_ms']:>11.1f}{r['parse_arrow_ms']:>10.1f}"
+            f"{r['parse_pandas_ms'] / r['parse_arrow_ms']:>7.1f}"
+            f"{r['load_pandas_ms']:>16.1f}{r['load_arrow_ms']:>15.1f}"
+            f"{r['load_pandas_ms'] / r['load_arrow_ms']:>7.1f}"
+        )
+
+
+def main(timezones=TIMEZONES, years: int = YEARS, repeats: int = REPEATS, json_path=None):
+    results = []
+    for tz in timezones:
+        results.append(bench_tz(tz, years, repeats))
+        print(f"[OK] {tz}: {results[-1]['hours']} horas")
+    print()
+    print_table(results)
+    if not all(r["same_rows"] for r in results):
+        print("[WARN] to_arrow_hourly gerou linhas diferentes do to_df_hourly em algum fuso")
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[OK] resultado salvo em {json_path}")
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark da conversão dos payloads da Open-Meteo")
+    ap.add_argument("--tz", action="append", help="fusos (repetível; padrão: " + ", ".join(TIMEZONES) + ")")
+    ap.add_argument("--years", type=float, default=YEARS, help="anos de histórico por payload")
+    ap.add_argument("--repeats", type=int, default=REPEATS, help="execuções por medida")
+    ap.add_argument("--json", dest="json_path", help="salva o resultado neste arquivo")
+    args = ap.parse_args()
+    main(args.tz or TIMEZONES, args.years, args.repeats, args.json_path)
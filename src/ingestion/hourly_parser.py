@@ -0,0 +1,164 @@
+# src/ingestion/hourly_parser.py
+# Conversão do JSON da Open-Meteo ('hourly') em linhas para o DuckDB.
+# - to_arrow_hourly(): caminho rápido da API. Cada lista de 'hourly' vira um array Arrow
+#   float64 (None -> NULL, como o pandas entregava ao DuckDB; NaN do NumPy chegaria como NaN)
+#   e a tabela vai direto para o DuckDB, sem pandas
+# - ts SEM parse de string por linha: as posições de 'time' são horas consecutivas, então
+#   ts = 1ª hora (localizada no fuso, em UTC) + i horas. Só a 1ª e a última string são
+#   lidas; se a última não bate com a grade (payload fora do padrão), cai no parse completo
+#   do pandas (mesma regra do to_df_hourly)
+# - to_df_hourly(): versão pandas original (referência de resultado e do benchmark_parse.py)
+# - Nas duas: corta horas FUTURAS (hora cheia corrente no fuso do local), ts em UTC naive
+#   e descarta horas sem temperatura
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+HOUR = np.timedelta64(1, "h")
+VAR_KEYS = {
+    "temperature_2m": ("temperature_2m",),
+    "relative_humidity_2m": ("relative_humidity_2m", "relativehumidity_2m"),  # nome antigo
+    "precipitation": ("precipitation",),
+    "wind_speed_10m": ("wind_speed_10m", "windspeed_10m"),                    # nome antigo
+}
+RAW_ARROW_SCHEMA = pa.schema(
+    [
+        ("ts", pa.timestamp("us")),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("temperature_2m", pa.float64()),
+        ("relative_humidity_2m", pa.float64()),
+        ("precipitation", pa.float64()),
+        ("wind_speed_10m", pa.float64()),
+        ("timezone", pa.string()),
+    ]
+)
+
+
+def _utc_candidates(wall: np.datetime64, tz: str) -> set:
+    """Instantes UTC possíveis de uma hora local (2 na hora repetida do fim do horário de verão)."""
+    out = set()
+    for dst in (True, False):
+        try:
+            ts = pd.Timestamp(wall).tz_localize(tz, ambiguous=dst, nonexistent="raise")
+        except (ValueError, pd.errors.OutOfBoundsDatetime):
+            continue  # hora que não existe no fuso
+        out.add(ts.tz_convert("UTC").tz_localize(None).to_datetime64().astype("datetime64[us]"))
+    return out
+
+
+def _ts_slow(times: list, tz: str) -> np.ndarray:
+    """Parse completo (pandas), para payloads que não seguem a grade horária."""
+    ts = pd.to_datetime(pd.Series(times)).dt.tz_localize(tz, ambiguous="infer")
+    return ts.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy(dtype="datetime64[us]")
+
+
+def hourly_ts(times: list, tz: str) -> np.ndarray:
+    """ts UTC (datetime64[us]) de cada posição de hourly.time ('YYYY-MM-DDTHH:MM' no fuso)."""
+    n = len(times)
+    if n == 0:
+        return np.empty(0, dtype="datetime64[us]")
+    if isinstance(times[0], (int, float)):  # timeformat=unixtime: segundos UTC
+        secs = np.asarray(times, dtype=np.int64)
+        return secs.astype("datetime64[s]").astype("datetime64[us]")
+    first, last = np.datetime64(times[0], "m"), np.datetime64(times[-1], "m")
+    starts = _utc_candidates(first, tz)
+    if len(starts) == 1:
+        (start,) = starts
+        grid = start + np.arange(n) * HOUR
+        # grade local regular (sem troca de horário no meio) ou última hora = 1ª + (n-1)h em UTC
+        if last - first == (n - 1) * HOUR or grid[-1] in _utc_candidates(last, tz):
+            return grid
+    return _ts_slow(times, tz)
+
+
+def _column(hourly: dict, name: str, n: int) -> pa.Array:
+    for key in VAR_KEYS[name]:
+        if key in hourly:
+            return pa.array(hourly[key], pa.float64())
+    return pa.nulls(n, pa.float64())
+
+
+def to_arrow_hourly(payload: dict, lat: float, lon: float, now: Optional[pd.Timestamp] = None) -> pa.Table:
+    """
+    JSON da Open-Meteo -> tabela Arrow no RAW_ARROW_SCHEMA (com o fuso do payload), pronta
+    para o DuckDB (con.register) ou para o buffer de ingestão. 'now' (UTC): só para testes.
+    """
+    hourly = payload.get("hourly", {})
+    tz = payload.get("timezone", "UTC")
+    times = hourly.get("time", [])
+    ts = hourly_ts(times, tz)
+    n = len(ts)
+
+    # horas FUTURAS: ts é crescente, então basta achar o corte (hora cheia corrente no fuso)
+    now = pd.Timestamp.now("UTC") if now is None else pd.Timestamp(now).tz_localize("UTC")
+    cutoff = now.tz_convert(tz).floor("h").tz_convert("UTC").tz_localize(None).to_datetime64()
+    end = int(np.searchsorted(ts, cutoff, side="right"))
+    table = pa.table(
+        [
+            pa.array(ts),
+            pa.array(np.full(n, lat)),
+            pa.array(np.full(n, lon)),
+            *(_column(hourly, name, n) for name in VAR_KEYS),
+            pa.repeat(pa.scalar(tz, pa.string()), n),
+        ],
+        schema=RAW_ARROW_SCHEMA,
+    ).slice(0, end)  # fatia: sem cópia
+    temp = table.column("temperature_2m")
+    if temp.null_count:
+        table = table.filter(pc.is_valid(temp))
+    return table
+
+
+def ts_range(table: pa.Table) -> tuple:
+    """(primeira, última) hora da tabela em ISO (None, None se vazia)."""
+    if table.num_rows == 0:
+        return None, None
+    ts = table.column("ts")
+    return ts[0].as_py().isoformat(), ts[-1].as_py().isoformat()
+
+
+def to_df_hourly(payload: dict, lat: float, lon: float) -> pd.DataFrame:
+    """
+    Converte o JSON da Open-Meteo em DataFrame horário.
+    - 'time' vem no fuso indicado em 'timezone' (quando usamos timezone=auto)
+    - localiza no fuso, CORTA FUTURO e converte 'ts' para UTC (naive) antes de gravar
+    """
+    hourly = payload.get("hourly", {})
+    tz_name = payload.get("timezone", "UTC")  # ex.: "America/Sao_Paulo"
+
+    # Normaliza chaves que mudam entre endpoints antigos/novos
+    rh = hourly.get("relative_humidity_2m", hourly.get("relativehumidity_2m", []))
+    ws = hourly.get("wind_speed_10m", hourly.get("windspeed_10m", []))
+
+    df = pd.DataFrame(
+        {
+            "ts": hourly.get("time", []),
+            "latitude": lat,
+            "longitude": lon,
+            "temperature_2m": hourly.get("temperature_2m", []),
+            "relative_humidity_2m": rh,
+            "precipitation": hourly.get("precipitation", []),
+            "wind_speed_10m": ws,
+        }
+    )
+    if df.empty:
+        return df
+
+    # 1) timestamps no fuso local retornado pela API
+    df["ts"] = pd.to_datetime(df["ts"])
+    df["ts"] = df["ts"].dt.tz_localize(tz_name, ambiguous="infer")
+
+    # 2) remove FUTURO (compara no mesmo fuso)
+    now_local = pd.Timestamp.now(tz_name).floor("h")
+    df = df[df["ts"] <= now_local]
+
+    # 3) converte para UTC e remove tz (naive) para armazenar
+    df["ts"] = df["ts"].dt.tz_convert("UTC").dt.tz_localize(None)
+
+    # remove linhas sem temperatura
+    df = df.dropna(subset=["temperature_2m"]).reset_index(drop=True)
+    return df
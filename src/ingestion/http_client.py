@@ -0,0 +1,120 @@
+# src/ingestion/http_client.py
+# Cliente HTTP assíncrono da Open-Meteo, compartilhado pela API.
+# - Um único httpx.AsyncClient por processo: pool de conexões + keep-alive
+# - Concorrência limitada (semáforo) para não estourar o rate limit
+# - Retry com backoff exponencial + jitter em 429/5xx e erros de rede (respeita Retry-After)
+# - URLs configuráveis por env var (OPEN_METEO_FORECAST_URL / OPEN_METEO_ARCHIVE_URL),
+#   o que permite apontar para um servidor stub local nos testes
+# - Cache em disco das respostas (response_cache.py, TTL curto p/ horas recentes e longo p/
+#   archive fechado): chamada repetida não sai para a rede; OPEN_METEO_CACHE=0 desliga
+import asyncio
+import os
+import random
+from typing import Optional
+
+import httpx
+
+from src.ingestion.response_cache import ResponseCache
+
+FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+ARCHIVE_URL = os.getenv("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+
+MAX_CONCURRENCY = int(os.getenv("OPEN_METEO_MAX_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.getenv("OPEN_METEO_MAX_RETRIES", "4"))
+CACHE_ENABLED = os.getenv("OPEN_METEO_CACHE", "1") != "0"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 20.0
+
+
+class OpenMeteoClient:
+    """Wrapper fino sobre httpx.AsyncClient com limite de concorrência, retry e cache opcional."""
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        timeout: float = 20.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.max_retries = max_retries
+        self.cache = cache
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+                keepalive_expiry=30.0,
+            ),
+            transport=transport,
+        )
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full jitter: uniforme em [0, min(max, base * 2^tentativa)]; Retry-After tem prioridade."""
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX_S)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt))
+
+    async def get_json(self, url: str, params: dict, timeout: Optional[float] = None) -> dict:
+        """GET com retry; levanta httpx.HTTPStatusError/TransportError após esgotar as tentativas."""
+        kwargs = {"params": params}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                async with self._sem:
+                    r = await self._client.get(url, **kwargs)
+            except httpx.TransportError:
+                if last:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            if r.status_code in RETRY_STATUS and not last:
+                await asyncio.sleep(self._backoff(attempt, r.headers.get("Retry-After")))
+                continue
+            r.raise_for_status()
+            return r.json()
+
+    async def _cached(self, kind: str, url: str, params: dict, timeout: float):
+        """get_json passando pelo cache em disco (leitura/gravação fora do event loop)."""
+        if self.cache is None:
+            return await self.get_json(url, params, timeout=timeout)
+        payload = await asyncio.to_thread(self.cache.get, kind, params)
+        if payload is None:
+            payload = await self.get_json(url, params, timeout=timeout)
+            await asyncio.to_thread(self.cache.put, kind, params, payload)
+        return payload
+
+    async def forecast(self, params: dict) -> dict:
+        return await self._cached("forecast", FORECAST_URL, params, 20.0)
+
+    async def archive(self, params: dict) -> dict:
+        return await self._cached("archive", ARCHIVE_URL, params, 60.0)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_client: Optional[OpenMeteoClient] = None
+
+
+def get_client() -> OpenMeteoClient:
+    """Cliente compartilhado do processo (criado sob demanda, dentro do event loop)."""
+    global _client
+    if _client is None:
+        _client = OpenMeteoClient(cache=ResponseCache() if CACHE_ENABLED else None)
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,215 @@
+# src/ingestion/ingest_buffer.py
+# Buffer de ingestão write-behind: os handlers entregam as linhas e respondem na hora;
+# um thread descarrega tudo no DuckDB em micro-lotes (um único INSERT Arrow por flush).
+# - Flush quando o buffer passa de max_rows OU a linha mais antiga espera max_delay_s
+# - Flush final no shutdown da API (close): sem o thread para tentar depois, o close tenta
+#   de novo na hora (até max_attempts, com backoff curto) e o que ainda falhar vai para o
+#   dead-letter — nada fica esquecido no buffer
+# - Falha no flush: cada lote volta ao buffer com a contagem de tentativas; se o lote
+#   concatenado falha, os lotes são tentados um a um (um lote ruim não trava os outros).
+#   Depois de max_attempts falhas o lote vai para um Parquet de dead-letter (ou é
+#   descartado, se nem isso der) e conta em dropped_rows/dropped_batches
+# - Métricas: profundidade do buffer, latência dos flushes e lotes descartados
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MAX_ROWS = 50_000
+MAX_DELAY_S = 2.0
+MAX_ATTEMPTS = 5
+CLOSE_BACKOFF_S = 0.2
+DEAD_LETTER_DIR = Path("data") / "dead_letter" / "ingest"
+
+
+class IngestBuffer:
+    """Acumula tabelas Arrow e chama flush_fn(tabela) com tudo concatenado."""
+
+    def __init__(
+        self,
+        flush_fn: Callable[[pa.Table], object],
+        max_rows: int = MAX_ROWS,
+        max_delay_s: float = MAX_DELAY_S,
+        schema: Optional[pa.Schema] = None,
+        max_attempts: int = MAX_ATTEMPTS,
+        dead_letter_dir: Optional[Path] = DEAD_LETTER_DIR,
+    ):
+        self.flush_fn = flush_fn
+        self.schema = schema
+        self.max_rows = max_rows
+        self.max_delay_s = max_delay_s
+        self.max_attempts = max_attempts
+        self.dead_letter_dir = None if dead_letter_dir is None else Path(dead_letter_dir)
+        self._cond = threading.Condition()
+        self._tables: list = []  # [(tabela, falhas até agora)]
+        self._rows = 0
+        self._oldest: Optional[float] = None
+        self._closed = False
+        self._flush_lock = threading.Lock()
+        self.stats = {
+            "flushes": 0,
+            "rows_flushed": 0,
+            "last_flush_rows": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": None,
+            "total_flush_ms": 0.0,
+            "errors": 0,
+            "last_error": None,
+            "dropped_batches": 0,
+            "dropped_rows": 0,
+            "dead_letter_files": 0,
+        }
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="ingest-buffer")
+        self._thread.start()
+
+    def add(self, df) -> int:
+        """
+        Enfileira as linhas (DataFrame ou tabela Arrow; não bloqueia no banco).
+        Devolve quantas entraram no buffer.
+        """
+        # schema fixo: todos os lotes concatenam sem promoção de tipos no flush
+        if isinstance(df, pa.Table):
+            table = df if self.schema is None or df.schema.equals(self.schema) else df.cast(self.schema)
+        else:
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        if table.num_rows == 0:
+            return 0
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("buffer de ingestão fechado")
+            self._tables.append((table, 0))
+            self._rows += table.num_rows
+            # primeiro lote (arma o timer do flush) ou buffer cheio: acorda o thread
+            if self._oldest is None or self._rows >= self.max_rows:
+                self._oldest = self._oldest or time.monotonic()
+                self._cond.notify()
+        return table.num_rows
+
+    def _due(self) -> bool:
+        if not self._tables:
+            return False
+        return self._rows >= self.max_rows or time.monotonic() - self._oldest >= self.max_delay_s
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and not self._due():
+                    timeout = None
+                    if self._oldest is not None:
+                        timeout = max(self.max_delay_s - (time.monotonic() - self._oldest), 0.01)
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self) -> int:
+        """Descarrega o que estiver no buffer agora. Devolve as linhas enviadas ao banco."""
+        with self._flush_lock:
+            with self._cond:
+                tables, self._tables = self._tables, []
+                rows, self._rows = self._rows, 0
+                self._oldest = None
+            if not tables:
+                return 0
+            t0 = time.perf_counter()
+            try:
+                self.flush_fn(pa.concat_tables([t for t, _ in tables]))
+            except Exception as e:
+                self.stats["errors"] += 1
+                self.stats["last_error"] = str(e)
+                if len(tables) == 1:
+                    self._failed(tables)
+                    return 0
+                rows = self._retry(tables)
+                if not rows:
+                    return 0
+            ms = (time.perf_counter() - t0) * 1000
+            st = self.stats
+            st["flushes"] += 1
+            st["rows_flushed"] += rows
+            st["last_flush_rows"] = rows
+            st["last_flush_ms"] = round(ms, 2)
+            st["max_flush_ms"] = round(max(ms, st["max_flush_ms"] or 0.0), 2)
+            st["total_flush_ms"] += ms
+            return rows
+
+    def _retry(self, tables: list) -> int:
+        """Lote concatenado falhou: tenta cada lote sozinho. Devolve as linhas gravadas."""
+        ok, failed = 0, []
+        for table, attempts in tables:
+            try:
+                self.flush_fn(table)
+                ok += table.num_rows
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+                failed.append((table, attempts))
+        self._failed(failed)
+        return ok
+
+    def _failed(self, tables: list) -> None:
+        """Conta mais uma falha de cada lote: volta ao buffer ou, no limite, vai para o dead-letter."""
+        requeue = []
+        for table, attempts in tables:
+            if attempts + 1 >= self.max_attempts:
+                self._drop(table, attempts + 1)
+            else:
+                requeue.append((table, attempts + 1))
+        if requeue:
+            with self._cond:
+                self._tables = requeue + self._tables
+                self._rows += sum(t.num_rows for t, _ in requeue)
+                self._oldest = self._oldest or time.monotonic()
+
+    def _drop(self, table: pa.Table, attempts: int) -> None:
+        where = "descartado"
+        if self.dead_letter_dir is not None:
+            path = self.dead_letter_dir / f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                pq.write_table(table, path)
+                self.stats["dead_letter_files"] += 1
+                where = f"salvo em {path.as_posix()}"
+            except Exception as e:
+                where = f"descartado (dead-letter falhou: {e})"
+        self.stats["dropped_batches"] += 1
+        self.stats["dropped_rows"] += table.num_rows
+        print(f"[WARN] buffer de ingestão: lote de {table.num_rows} linhas falhou "
+              f"{attempts}x ({self.stats['last_error']}); {where}")
+
+    def metrics(self) -> dict:
+        with self._cond:
+            depth = {"rows_pending": self._rows, "batches_pending": len(self._tables)}
+            age = time.monotonic() - self._oldest if self._oldest is not None else 0.0
+        st = dict(self.stats)
+        total = st.pop("total_flush_ms")
+        st["avg_flush_ms"] = round(total / st["flushes"], 2) if st["flushes"] else None
+        return {
+            **depth,
+            "oldest_pending_s": round(age, 3),
+            "max_rows": self.max_rows,
+            "max_delay_s": self.max_delay_s,
+            **st,
+        }
+
+    def close(self) -> None:
+        """Para o thread e faz o flush final (chamado no shutdown)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        # cada flush que falha conta uma tentativa por lote; no limite o lote vai para o dead-letter
+        for attempt in range(self.max_attempts):
+            self.flush()
+            with self._cond:
+                if not self._tables:
+                    return
+            time.sleep(min(CLOSE_BACKOFF_S * 2 ** attempt, 2.0))
+        with self._cond:
+            left, self._tables = self._tables, []
+            self._rows, self._oldest = 0, None
+        for table, attempts in left:
+            self._drop(table, attempts)
@@ -11,10 +11,13 @@ print(con.sql("SELECT table_schema, table_name FROM information_schema.tables OR
 print("\n-- Esquema raw.weather_hourly --")
 print(con.sql("DESCRIBE raw.weather_hourly").df())
 
+print("\n-- Locais (raw.locations) --")
+print(con.sql("SELECT * FROM raw.locations ORDER BY location_id").df())
+
 print("\n-- Estatísticas --")
 print(con.sql("SELECT COUNT(*) AS n, MIN(ts) AS first, MAX(ts) AS last FROM raw.weather_hourly").df())
 
 print("\n-- Amostra (últimas 10) --")
-print(con.sql("SELECT * FROM raw.weather_hourly ORDER BY ts DESC LIMIT 10").df())
+print(con.sql("SELECT * FROM raw.weather_hourly_geo ORDER BY ts DESC LIMIT 10").df())
 
 con.close()
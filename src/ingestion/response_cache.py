@@ -0,0 +1,125 @@
+# src/ingestion/response_cache.py
+# Cache em disco das respostas da Open-Meteo (JSON gzip), usado pelo http_client.py.
+# - Chave: endpoint + parâmetros da chamada (coordenadas, intervalo, variáveis, fuso);
+#   no forecast entra também a hora UTC corrente ("últimas N horas" muda a cada hora)
+# - TTL por tipo de resposta:
+#     archive de dias fechados (fim há mais de ARCHIVE_FINAL_DAYS) -> TTL_ARCHIVE_S (longo)
+#     archive recente e forecast (horas que ainda mudam)             -> TTL_RECENT_S (curto)
+# - Arquivo gravado em .tmp + os.replace (leitor nunca vê resposta pela metade);
+#   final/ (TTL longo) e recent/ (TTL curto) separados: o prune() (subida da API e a cada
+#   PRUNE_EVERY gravações) apaga os expirados de cada um sem reabrir os arquivos
+# - OPEN_METEO_CACHE=0 desliga; OPEN_METEO_CACHE_DIR muda o diretório
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("OPEN_METEO_CACHE_DIR", str(Path("data") / "cache" / "open_meteo")))
+# o archive da Open-Meteo completa/revisa os últimos dias (atraso do ERA5); antes disso é imutável
+ARCHIVE_FINAL_DAYS = 7
+TTL_ARCHIVE_S = int(os.getenv("OPEN_METEO_CACHE_TTL_ARCHIVE_S", str(30 * 24 * 3600)))
+TTL_RECENT_S = int(os.getenv("OPEN_METEO_CACHE_TTL_RECENT_S", "900"))
+PRUNE_EVERY = 500
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ResponseCache:
+    """get/put de payloads por (tipo, parâmetros); tipo = 'forecast' | 'archive'."""
+
+    def __init__(self, root: Path = CACHE_DIR, ttl_archive_s: int = TTL_ARCHIVE_S,
+                 ttl_recent_s: int = TTL_RECENT_S):
+        self.root = Path(root)
+        self.ttl_archive_s = ttl_archive_s
+        self.ttl_recent_s = ttl_recent_s
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.pruned = 0
+
+    def key(self, kind: str, params: dict) -> str:
+        items = {k: str(v) for k, v in params.items()}
+        if kind == "forecast":
+            items["_hour"] = _utc_now().strftime("%Y-%m-%dT%H")
+        raw = json.dumps([kind, sorted(items.items())], separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def tier(kind: str, params: dict) -> str:
+        """'final': archive que termina antes dos últimos ARCHIVE_FINAL_DAYS (não muda mais)."""
+        if kind == "archive" and params.get("end_date"):
+            final = _utc_now().date() - timedelta(days=ARCHIVE_FINAL_DAYS)
+            if date.fromisoformat(str(params["end_date"])) < final:
+                return "final"
+        return "recent"
+
+    def ttl(self, kind: str, params: dict) -> int:
+        return self.ttl_archive_s if self.tier(kind, params) == "final" else self.ttl_recent_s
+
+    def _path(self, kind: str, params: dict):
+        """(arquivo, TTL) da resposta."""
+        key = self.key(kind, params)
+        return self.root / self.tier(kind, params) / key[:2] / f"{key}.json.gz", self.ttl(kind, params)
+
+    def get(self, kind: str, params: dict):
+        """Payload guardado e ainda válido, ou None."""
+        path, ttl = self._path(kind, params)
+        try:
+            fresh = time.time() - path.stat().st_mtime < ttl
+            payload = json.loads(gzip.decompress(path.read_bytes())) if fresh else None
+        except (OSError, ValueError):
+            payload = None  # ausente, apagado pelo prune ou corrompido: vale como miss
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return payload
+
+    def put(self, kind: str, params: dict, payload) -> None:
+        path, _ = self._path(kind, params)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(gzip.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 5))
+        os.replace(tmp, path)
+        with self._lock:
+            self.stores += 1
+            prune = self.stores % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """Apaga as respostas expiradas (e .tmp órfãos). Devolve quantas."""
+        removed = 0
+        for tier, ttl in (("final", self.ttl_archive_s), ("recent", self.ttl_recent_s)):
+            cutoff = time.time() - ttl
+            for path in (self.root / tier).glob("*/*"):
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                        removed += 1
+                except OSError:
+                    continue
+        with self._lock:
+            self.pruned += removed
+        return removed
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "dir": self.root.as_posix(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "stores": self.stores,
+            "pruned": self.pruned,
+            "ttl_archive_s": self.ttl_archive_s,
+            "ttl_recent_s": self.ttl_recent_s,
+        }
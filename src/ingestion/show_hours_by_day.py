@@ -1,15 +1,17 @@
+from pathlib import Path
+import sys
 import duckdb
 
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.storage import coverage
+from src.storage.locations import location_id
+
 lat, lon = -23.55, -46.63
-con = duckdb.connect("data/rt_weather.duckdb")
-df = con.execute(
-    """
-    SELECT date_trunc('day', ts) AS day, COUNT(*) AS hours
-    FROM raw.weather_hourly
-    WHERE round(latitude,4)=round(?,4) AND round(longitude,4)=round(?,4)
-    GROUP BY 1 ORDER BY 1
-    """,
-    [lat, lon]
-).df()
+con = duckdb.connect("data/rt_weather.duckdb", read_only=True)
+# horas por dia já contadas na ingestão (raw.coverage_daily), sem agregar raw.weather_hourly
+df = coverage.daily(con, location_id(con, lat, lon))
 con.close()
 print(df)
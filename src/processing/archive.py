@@ -0,0 +1,147 @@
+# src/processing/archive.py
+# Arquivo de raw.weather_hourly no lago Parquet (storage/lake.py) + manutenção do lago.
+# - Exporta os meses FECHADOS (antes de --before, padrão: mês atual) de cada local para
+#   data/raw/weather_hourly/latitude=/longitude=/month=/ — só as horas que ainda não estão lá
+#   (um arquivo novo por partição tocada; o banco e os arquivos já gravados não são reescritos)
+# - --delete: depois do export, apaga do DuckDB as horas antigas que JÁ estão no arquivo
+#   (prepare_data.py --full relê o arquivo; o resto do sistema só usa as últimas horas);
+#   a cobertura (storage/coverage.py) continua contando essas horas: /backfill de um mês
+#   arquivado não baixa nada de novo. O script confere isso (horas faltantes de cada local
+#   no período arquivado antes x depois do delete)
+# - --compact: junta arquivos pequenos de cada partição (raw e features) num só, ordenado por ts
+# Uso: python src/processing/archive.py [--before 2025-01] [--delete] [--compact]
+# Banco pelo get_db (storage/db.py): com a API no ar, espera ela soltar o arquivo (retry com
+# backoff até DUCKDB_LOCK_TIMEOUT_S) e o delete passa pela fila do escritor único
+from pathlib import Path
+import argparse
+import sys
+
+import duckdb
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.storage import coverage, lake
+from src.storage.db import get_db
+
+DB_PATH = Path("data") / "rt_weather.duckdb"
+RAW_COLS = ", ".join(f"r.{c}" for c in lake.RAW_COLS)
+
+# horas antes do corte que ainda não estão no arquivo
+EXPORT_SQL = f"""
+    (SELECT {RAW_COLS}
+     FROM raw.weather_hourly_geo AS r
+     {{anti}}
+     WHERE r.ts < CAST(? AS TIMESTAMP))
+"""
+# apaga só o que o arquivo já tem (mesmo local e ts)
+DELETE_SQL = """
+    DELETE FROM raw.weather_hourly AS w
+    USING (
+        SELECT l.location_id, a.ts
+        FROM {archive} AS a
+        JOIN raw.locations AS l USING (latitude, longitude)
+        WHERE a.month < ? AND a.ts < CAST(? AS TIMESTAMP)
+    ) AS a
+    WHERE w.location_id = a.location_id AND w.ts = a.ts
+"""
+
+
+def month_start(month: str = None) -> pd.Timestamp:
+    """'YYYY-MM' (ou o mês atual, em UTC) -> 1º instante do mês."""
+    if month is None:
+        return pd.Timestamp.utcnow().tz_localize(None).to_period("M").to_timestamp()
+    return pd.Period(month, freq="M").to_timestamp()
+
+
+def export_raw(con: duckdb.DuckDBPyConnection, before: pd.Timestamp) -> int:
+    """Grava no arquivo as horas anteriores a 'before' que ele ainda não tem. Devolve quantas."""
+    anti = ""
+    if lake.has_data("raw"):
+        anti = (
+            f"ANTI JOIN (SELECT latitude, longitude, ts FROM {lake.relation('raw')} "
+            f"WHERE month < '{before:%Y-%m}') AS a USING (latitude, longitude, ts)"
+        )
+    return lake.write(con, "raw", EXPORT_SQL.format(anti=anti), [str(before)])
+
+
+def delete_archived(con: duckdb.DuckDBPyConnection, before: pd.Timestamp) -> int:
+    if not lake.has_data("raw"):
+        return 0
+    return con.execute(
+        DELETE_SQL.format(archive=lake.relation("raw")), [f"{before:%Y-%m}", str(before)]
+    ).fetchone()[0]
+
+
+def archived_missing(con: duckdb.DuckDBPyConnection, before: pd.Timestamp) -> dict:
+    """
+    {location_id: coverage.missing_span no período arquivado do local} — o que um /backfill
+    desse período ainda pediria à Open-Meteo.
+    """
+    if not lake.has_data("raw"):
+        return {}
+    rows = con.execute(
+        f"""
+        SELECT l.location_id, MIN(a.ts), MAX(a.ts)
+        FROM {lake.relation("raw")} AS a
+        JOIN raw.locations AS l USING (latitude, longitude)
+        WHERE a.month < ? AND a.ts < CAST(? AS TIMESTAMP)
+        GROUP BY 1
+        """,
+        [f"{before:%Y-%m}", str(before)],
+    ).fetchall()
+    return {loc_id: coverage.missing_span(con, loc_id, start, end) for loc_id, start, end in rows}
+
+
+def _delete(con: duckdb.DuckDBPyConnection, before: pd.Timestamp) -> tuple:
+    """(linhas apagadas, locais cujo período arquivado passou a ter horas faltantes)."""
+    coverage.ensure_coverage(con)
+    missing = archived_missing(con, before)
+    n = delete_archived(con, before)
+    return n, {k: v for k, v in archived_missing(con, before).items() if missing.get(k) != v}
+
+
+def main(before: str = None, delete: bool = False, compact: bool = False):
+    cut = month_start(before)
+    if cut > month_start():
+        raise SystemExit(f"--before {before}: só meses fechados (até o mês atual).")
+    db = get_db(DB_PATH)
+    try:
+        with db.cursor() as con:
+            n = export_raw(con, cut)
+        print(f"[OK] +{n} linhas antes de {cut:%Y-%m} em {lake.dataset_dir('raw')}")
+        if delete:
+            n, changed = db.write(_delete, cut)
+            print(f"[OK] {n} linhas arquivadas apagadas de raw.weather_hourly")
+            if changed:
+                print(f"[WARN] cobertura do período arquivado mudou em {len(changed)} locais "
+                      "(um /backfill baixaria de novo):", changed)
+            else:
+                print("[OK] cobertura mantida: /backfill dos meses arquivados não baixa nada de novo")
+        # compactação e contagem só leem/escrevem Parquet; o cursor é só o motor do DuckDB
+        with db.cursor() as con:
+            if compact:
+                for dataset in lake.DATASETS:
+                    done = lake.compact(con, dataset)
+                    print(
+                        f"[OK] {dataset}: {done['partitions']} partições compactadas "
+                        f"({done['files_before']} arquivos -> {done['partitions']})"
+                    )
+            counts = lake.partition_counts(con, "raw")
+        print(f"[OK] arquivo: {len(lake.files('raw'))} arquivos, {len(counts)} partições, "
+              f"{int(counts['rows'].sum())} linhas")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--before", help="arquiva os meses anteriores a YYYY-MM (padrão: mês atual)")
+    ap.add_argument("--delete", action="store_true",
+                    help="apaga do DuckDB as horas que já estão no arquivo")
+    ap.add_argument("--compact", action="store_true",
+                    help="junta os arquivos pequenos de cada partição (raw e features)")
+    args = ap.parse_args()
+    main(args.before, args.delete, args.compact)
@@ -0,0 +1,230 @@
+# src/processing/features.py
+# Motor de features vetorizado para vários locais de uma vez.
+# - Lags/médias móveis calculados POR LOCAL (latitude, longitude)
+# - Lags por TEMPO (ts - k horas), não por linha: hora faltante => NaN (não vira lag de 25h)
+# - Dois backends com o mesmo resultado:
+#     * "numpy":  arrays contíguos ordenados por (local, hora) + searchsorted (sem loop por grupo)
+#     * "duckdb": window functions com frames RANGE em INTERVAL
+# - Se a entrada tem a coluna 'imputed' (ver hourly_grid.py), cada linha ganha o bitmask
+#   'imputed_mask' indicando quais entradas (hora atual, cada lag, cada alvo) foram imputadas
+# - Alvos diretos para vários horizontes (temp_t_plus_{h}h, h em HORIZONS): um único modelo
+#   multi-saída prevê o vetor inteiro numa chamada, sem previsão recursiva
+import re
+from typing import Optional
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+LOC_COLS = ["latitude", "longitude"]
+LAGS = [1, 2, 3, 4, 5, 6, 24]
+MA_WINDOWS = [3, 6]
+EXOG_COLS = ["relative_humidity_2m", "precipitation", "wind_speed_10m"]
+HORIZONS = [1, 6, 12, 24]
+TARGETS = [f"temp_t_plus_{h}h" for h in HORIZONS]
+TARGET = TARGETS[0]  # t+1h (modelos antigos, baseline)
+
+# bitmask de imputação: bit 0 = hora atual (e exógenas), 1..len(LAGS) = lags, depois um bit
+# por alvo (t+1h continua no bit len(LAGS)+1). As médias móveis usam só a hora atual e os
+# lags 1..5, já cobertos por esses bits.
+MASK_COL = "imputed_mask"
+MASK_BITS = {
+    "current": 0,
+    **{f"temp_lag_{k}h": i + 1 for i, k in enumerate(LAGS)},
+    **{t: len(LAGS) + 1 + i for i, t in enumerate(TARGETS)},
+}
+_MASK_SHIFTS = {"current": 0, **{f"temp_lag_{k}h": k for k in LAGS}, **{t: -h for t, h in zip(TARGETS, HORIZONS)}}
+
+# mesma ordem gravada em models/feature_cols.json
+FEATURE_COLS = (
+    [f"temp_lag_{k}h" for k in LAGS]
+    + [f"temp_ma_{w}h" for w in MA_WINDOWS]
+    + EXOG_COLS
+    + ["hour_sin", "hour_cos"]
+)
+
+
+def history_hours(feature_cols: Optional[list] = None) -> int:
+    """
+    Horas ANTES da hora atual necessárias para calcular 'feature_cols' (maior lag ou
+    janela de média - 1). Inferência só precisa ler essa janela final de cada local.
+    """
+    need = 0
+    for c in feature_cols or FEATURE_COLS:
+        m = re.fullmatch(r"temp_(lag|ma)_(\d+)h", c)
+        if m:
+            k = int(m.group(2))
+            need = max(need, k if m.group(1) == "lag" else k - 1)
+    return need
+
+
+def target_horizons(targets: list) -> list:
+    """Horizontes (em horas) das colunas alvo temp_t_plus_{h}h, na mesma ordem."""
+    return [int(re.fullmatch(r"temp_t_plus_(\d+)h", t).group(1)) for t in targets]
+
+
+def _output(df: pd.DataFrame, keys: list, require_target: bool) -> pd.DataFrame:
+    """Ordena colunas como o treino espera e remove linhas incompletas (todos os alvos)."""
+    cols = ["ts"] + keys + FEATURE_COLS + TARGETS
+    df = df[cols + [MASK_COL]]
+    subset = cols if require_target else cols[: -len(TARGETS)]
+    df = df.dropna(subset=subset).reset_index(drop=True)
+    df[MASK_COL] = df[MASK_COL].astype(np.uint16)
+    return df
+
+
+def compute_features_numpy(df: pd.DataFrame, require_target: bool = True) -> pd.DataFrame:
+    """
+    Backend NumPy. Ordena uma única vez por (local, ts) e resolve cada lag com
+    searchsorted sobre a chave composta (grupo, hora) — O(n log n) para todos os locais.
+    """
+    keys = [c for c in LOC_COLS if c in df.columns]
+    if df.empty:
+        return pd.DataFrame(columns=["ts"] + keys + FEATURE_COLS + TARGETS + [MASK_COL])
+    ts = pd.to_datetime(df["ts"]).to_numpy(dtype="datetime64[ns]")
+    hours = ts.astype("datetime64[h]").astype(np.int64)
+
+    if keys:
+        gid = df.groupby(keys).ngroup().to_numpy(dtype=np.int64)
+    else:
+        gid = np.zeros(len(df), dtype=np.int64)
+
+    order = np.lexsort((hours, gid))
+    gid, hours = gid[order], hours[order]
+    # chave única e ordenada: grupo * span + hora relativa
+    h0 = hours.min()
+    span = hours.max() - h0 + max(LAGS + HORIZONS) + 2
+    key = gid * span + (hours - h0)
+    # duplicatas (mesmo local/hora): fica a última ocorrência
+    keep = np.ones(len(key), dtype=bool)
+    keep[:-1] = key[1:] != key[:-1]
+    order, key, hours = order[keep], key[keep], hours[keep]
+
+    out = df.iloc[order].reset_index(drop=True)
+    out["ts"] = ts[order]
+    temp = out["temperature_2m"].to_numpy(dtype=np.float64)
+    if "imputed" in out.columns:
+        imputed = out["imputed"].to_numpy(dtype=bool)
+    else:
+        imputed = np.zeros(len(out), dtype=bool)
+
+    lookup = {}
+
+    def locate(k: int):
+        """Índice da linha (mesmo local, hora - k) e se ela existe."""
+        if k not in lookup:
+            target = key - k
+            idx = np.searchsorted(key, target)
+            idx_c = np.minimum(idx, len(key) - 1)
+            lookup[k] = (idx_c, (idx < len(key)) & (key[idx_c] == target))
+        return lookup[k]
+
+    def shifted(k: int) -> np.ndarray:
+        """Temperatura em (mesmo local, hora - k); NaN se a hora não existe."""
+        if k == 0:
+            return temp
+        idx, found = locate(k)
+        return np.where(found, temp[idx], np.nan)
+
+    for k in LAGS:
+        out[f"temp_lag_{k}h"] = shifted(k)
+    for w in MA_WINDOWS:
+        # média só quando as w horas da janela existem (como rolling(w) sem min_periods)
+        out[f"temp_ma_{w}h"] = np.sum([shifted(j) for j in range(w)], axis=0) / w
+    for t, h in zip(TARGETS, HORIZONS):
+        out[t] = shifted(-h)
+
+    mask = np.zeros(len(out), dtype=np.uint16)
+    for name, k in _MASK_SHIFTS.items():
+        flag = imputed if k == 0 else imputed[locate(k)[0]] & locate(k)[1]
+        mask |= flag.astype(np.uint16) << MASK_BITS[name]
+    out[MASK_COL] = mask
+
+    hod = hours % 24
+    out["hour_sin"] = np.sin(2 * np.pi * hod / 24)
+    out["hour_cos"] = np.cos(2 * np.pi * hod / 24)
+    return _output(out, keys, require_target)
+
+
+def features_sql(source: str, keys: Optional[list] = None, with_imputed: bool = False) -> str:
+    """
+    SQL das features (backend DuckDB) sobre 'source' (tabela, view ou subquery entre parênteses).
+    Frames RANGE em INTERVAL garantem lag por tempo: sem a hora exata, o valor é NULL.
+    with_imputed=True: 'source' tem a coluna booleana 'imputed' e o bitmask é calculado.
+    """
+    keys = LOC_COLS if keys is None else keys
+    part = f"PARTITION BY {', '.join(keys)} " if keys else ""
+    win = f"{part}ORDER BY ts"
+
+    def at(k: int, col: str = "temperature_2m") -> str:
+        if k == 0:
+            return col
+        if k > 0:
+            frame = f"INTERVAL {k} HOUR PRECEDING AND INTERVAL {k} HOUR PRECEDING"
+        else:
+            frame = f"INTERVAL {-k} HOUR FOLLOWING AND INTERVAL {-k} HOUR FOLLOWING"
+        return f"max({col}) OVER ({win} RANGE BETWEEN {frame})"
+
+    exprs = [f"{at(k)} AS temp_lag_{k}h" for k in LAGS]
+    for w in MA_WINDOWS:
+        frame = f"({win} RANGE BETWEEN INTERVAL {w - 1} HOUR PRECEDING AND CURRENT ROW)"
+        exprs.append(
+            f"CASE WHEN count(temperature_2m) OVER {frame} = {w} "
+            f"THEN avg(temperature_2m) OVER {frame} END AS temp_ma_{w}h"
+        )
+    exprs += [
+        "sin(2 * pi() * hour(ts) / 24) AS hour_sin",
+        "cos(2 * pi() * hour(ts) / 24) AS hour_cos",
+    ]
+    exprs += [f"{at(-h)} AS {t}" for t, h in zip(TARGETS, HORIZONS)]
+    if with_imputed:
+        bits = [
+            f"(coalesce({at(k, 'CAST(imputed AS USMALLINT)')}, 0) << {MASK_BITS[name]})"
+            for name, k in _MASK_SHIFTS.items()
+        ]
+        exprs.append(f"CAST({' | '.join(bits)} AS USMALLINT) AS {MASK_COL}")
+    else:
+        exprs.append(f"CAST(0 AS USMALLINT) AS {MASK_COL}")
+    cols = ["ts"] + keys + FEATURE_COLS + TARGETS + [MASK_COL]
+    return (
+        f"SELECT {', '.join(cols)} FROM ("
+        f"SELECT ts, {', '.join(keys + EXOG_COLS)}, {', '.join(exprs)} FROM {source}"
+        f") ORDER BY {', '.join(keys + ['ts'])}"
+    )
+
+
+def compute_features_duckdb(
+    con: duckdb.DuckDBPyConnection, source: str, require_target: bool = True
+) -> pd.DataFrame:
+    """Backend DuckDB: executa features_sql(source) na conexão informada (sem imputação)."""
+    df = con.execute(features_sql(source)).df()
+    return _output(df, LOC_COLS, require_target)
+
+
+def compute_features(
+    df: pd.DataFrame, engine: str = "numpy", require_target: bool = True
+) -> pd.DataFrame:
+    """
+    Features de um DataFrame bruto (um ou vários locais).
+    - engine="numpy" (padrão) ou "duckdb" (registra o DataFrame numa conexão em memória)
+    - require_target=False mantém as últimas horas (sem alvo) para inferência
+    - se df vier de to_hourly_grid (coluna 'imputed'), preenche o bitmask 'imputed_mask'
+    """
+    if engine == "numpy":
+        return compute_features_numpy(df, require_target=require_target)
+    if engine == "duckdb":
+        keys = [c for c in LOC_COLS if c in df.columns]
+        con = duckdb.connect()
+        try:
+            con.register("raw_df", df)
+            out = con.execute(
+                features_sql(
+                    "(SELECT * REPLACE (CAST(ts AS TIMESTAMP) AS ts) FROM raw_df)",
+                    keys,
+                    with_imputed="imputed" in df.columns,
+                )
+            ).df()
+        finally:
+            con.close()
+        return _output(out, keys, require_target)
+    raise ValueError(f"engine inválido: {engine!r} (use 'numpy' ou 'duckdb')")
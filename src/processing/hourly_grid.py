@@ -0,0 +1,83 @@
+# src/processing/hourly_grid.py
+# Reindexa cada local para uma grade horária contínua e trata as lacunas em lote (colunar).
+# Políticas de lacuna:
+#   - "drop":        não imputa nada; horas faltantes ficam fora e os lags que caem nelas viram NaN
+#   - "ffill":       repete o último valor observado por até max_fill horas
+#   - "interpolate": interpolação linear entre as observações vizinhas, se a lacuna tem <= max_fill horas
+# Lacunas maiores que max_fill continuam faltando (a linha não é criada).
+# A coluna booleana 'imputed' marca as horas criadas pela grade.
+import numpy as np
+import pandas as pd
+
+from src.processing.features import EXOG_COLS, LOC_COLS
+
+GAP_POLICIES = ("drop", "ffill", "interpolate")
+FILL_COLS = ["temperature_2m"] + EXOG_COLS
+
+
+def to_hourly_grid(df: pd.DataFrame, policy: str = "drop", max_fill: int = 3) -> pd.DataFrame:
+    """
+    Devolve df ordenado por (local, ts) com a coluna 'imputed'.
+    Sem loops por local: a grade de todos os locais é montada com repeat/cumsum.
+    """
+    if policy not in GAP_POLICIES:
+        raise ValueError(f"política inválida: {policy!r} (use {', '.join(GAP_POLICIES)})")
+    keys = [c for c in LOC_COLS if c in df.columns]
+    df = df.copy()
+    df["ts"] = pd.to_datetime(df["ts"])
+    if policy == "drop" or df.empty:
+        return df.assign(imputed=False)
+
+    hours = df["ts"].to_numpy(dtype="datetime64[h]").astype(np.int64)
+    gid = df.groupby(keys).ngroup().to_numpy(dtype=np.int64) if keys else np.zeros(len(df), np.int64)
+    order = np.lexsort((hours, gid))
+    gid, hours = gid[order], hours[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = (gid[1:] != gid[:-1]) | (hours[1:] != hours[:-1])
+    order, gid, hours = order[keep], gid[keep], hours[keep]
+    obs = df.iloc[order].reset_index(drop=True)
+
+    # limites de cada local e tamanho da grade
+    first = np.r_[True, gid[1:] != gid[:-1]]
+    last = np.r_[gid[1:] != gid[:-1], True]
+    h_start, h_end = hours[first], hours[last]
+    counts = h_end - h_start + 1
+    g_off = np.cumsum(counts) - counts           # 1ª posição do local na grade
+    obs_first_row = np.flatnonzero(first)        # 1ª linha observada do local
+
+    n = int(counts.sum())
+    grid_gid = np.repeat(np.arange(len(counts)), counts)
+    pos = np.arange(n)
+    grid_h = h_start[grid_gid] + (pos - g_off[grid_gid])
+
+    # posição na grade de cada linha observada
+    obs_pos = g_off[gid] + (hours - h_start[gid])
+    src_row = obs_first_row[grid_gid].copy()
+    src_row[obs_pos] = np.arange(len(obs))
+    observed = np.zeros(n, dtype=bool)
+    observed[obs_pos] = True
+
+    # última/próxima posição observada (as fronteiras do local também são observadas)
+    prev_obs = np.maximum.accumulate(np.where(observed, pos, -1))
+    next_obs = np.minimum.accumulate(np.where(observed, pos, n)[::-1])[::-1]
+    if policy == "ffill":
+        fillable = ~observed & (pos - prev_obs <= max_fill)
+    else:
+        fillable = ~observed & (next_obs - prev_obs - 1 <= max_fill)
+
+    out = obs.iloc[src_row].reset_index(drop=True)
+    out["ts"] = grid_h.astype("datetime64[h]").astype("datetime64[ns]")
+    frac = (pos - prev_obs) / np.maximum(next_obs - prev_obs, 1)
+    for c in [c for c in FILL_COLS if c in out.columns]:
+        v = out[c].to_numpy(dtype=np.float64, copy=True)
+        v_prev = v[prev_obs]
+        if policy == "ffill":
+            filled = v_prev
+        else:
+            filled = v_prev + (v[np.minimum(next_obs, n - 1)] - v_prev) * frac
+        v[~observed] = np.nan
+        v[fillable] = filled[fillable]
+        out[c] = v
+    out["imputed"] = fillable
+    # horas que nem a política cobre ficam fora da grade
+    return out[observed | fillable].reset_index(drop=True)
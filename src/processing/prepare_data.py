@@ -1,58 +1,175 @@
 from pathlib import Path
-import numpy as np
+import argparse
+import shutil
+import sys
 import duckdb
 import pandas as pd
 
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.processing.features import LOC_COLS, TARGETS, compute_features, compute_features_duckdb
+from src.processing.hourly_grid import GAP_POLICIES, to_hourly_grid
+from src.storage import lake
+
 DB_PATH = Path("data") / "rt_weather.duckdb"
-REF_DIR = Path("data") / "refined"
-REF_DIR.mkdir(parents=True, exist_ok=True)
-
-def make_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.sort_values("ts").reset_index(drop=True)
-    df["ts"] = pd.to_datetime(df["ts"])
-    df["hour"] = df["ts"].dt.hour
-    # codificação cíclica da hora (período 24h)
-    df["hour_sin"] = np.sin(2*np.pi*df["hour"]/24)
-    df["hour_cos"] = np.cos(2*np.pi*df["hour"]/24)
-
-    for k in [1,2,3,4,5,6,24]:
-        df[f"temp_lag_{k}h"] = df["temperature_2m"].shift(k)
-    df["temp_ma_3h"] = df["temperature_2m"].rolling(3).mean()
-    df["temp_ma_6h"] = df["temperature_2m"].rolling(6).mean()
-    df["temp_t_plus_1h"] = df["temperature_2m"].shift(-1)
-
-    df = df.dropna().reset_index(drop=True)
-
-    feat_cols = [c for c in df.columns if c.startswith("temp_lag_")]
-    feat_cols += ["temp_ma_3h","temp_ma_6h","relative_humidity_2m","precipitation","wind_speed_10m","hour_sin","hour_cos"]
-    feat_cols = [c for c in feat_cols if c in df.columns]
-    cols = ["ts"] + feat_cols + ["temp_t_plus_1h"]
-    return df[cols]
-
-def main():
-    con = duckdb.connect(DB_PATH.as_posix())
-    df = con.execute("SELECT * FROM raw.weather_hourly ORDER BY ts").df()
-    con.close()
+# Parquet particionado por local e mês (hive: latitude=.../longitude=.../month=YYYY-MM/, ver storage/lake.py)
+FEAT_DIR = lake.dataset_dir("features")
 
-    if df.empty or len(df) < 30:
-        print("[WARN] Poucos dados: rode /backfill e /collect na API antes.")
-        return
+# horas de histórico necessárias para calcular os lags/médias da 1ª hora nova
+CONTEXT_HOURS = 24
 
-    feat = make_features(df)
-    # salva parquet
-    out_pq = REF_DIR / "weather_features.parquet"
-    feat.to_parquet(out_pq, index=False)
-    print(f"[OK] salvo {out_pq} (linhas={len(feat)}, colunas={len(feat.columns)})")
+def make_features(
+    df: pd.DataFrame,
+    engine: str = "numpy",
+    gap_policy: str = "drop",
+    max_fill: int = 3,
+    require_target: bool = True,
+) -> pd.DataFrame:
+    """
+    Features por local (lags por tempo, médias móveis, hora cíclica) + alvos t+h
+    (um por horizonte em features.HORIZONS; a linha só sai com todos eles conhecidos).
+    Antes passa pela grade horária (hourly_grid.py) com a política de lacunas escolhida;
+    'imputed_mask' indica quais entradas de cada linha foram imputadas.
+    require_target=False mantém a última hora observada (sem alvos) para prever as seguintes.
+    """
+    grid = to_hourly_grid(df, policy=gap_policy, max_fill=max_fill)
+    return compute_features(grid, engine=engine, require_target=require_target)
 
-    # (opcional) salvar no DuckDB
-    con = duckdb.connect(DB_PATH.as_posix())
+def ensure_refined(con: duckdb.DuckDBPyConnection) -> None:
+    """Cria o schema refined e a tabela de high-water mark por local."""
     con.execute("CREATE SCHEMA IF NOT EXISTS refined;")
-    con.register("feat_tmp", feat)
-    con.execute("DROP TABLE IF EXISTS refined.weather_features;")
-    con.execute("CREATE TABLE refined.weather_features AS SELECT * FROM feat_tmp;")
-    con.unregister("feat_tmp")
-    con.close()
-    print("[OK] tabela refined.weather_features criada")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS refined.feature_watermarks (
+            latitude DOUBLE,
+            longitude DOUBLE,
+            last_ts TIMESTAMP,
+            PRIMARY KEY (latitude, longitude)
+        );
+        """
+    )
+
+# Só o que interessa ao modo incremental:
+# - horas posteriores ao high-water mark de cada local (ou tudo, se o local é novo);
+# - + as CONTEXT_HOURS anteriores ao mark, para os lags/médias da 1ª hora nova.
+# {raw}: raw.weather_hourly_geo, ou ela + o arquivo Parquet no rebuild completo
+NEW_RAW_SQL = f"""
+    SELECT r.*
+    FROM {{raw}} AS r
+    LEFT JOIN refined.feature_watermarks AS w
+      ON r.latitude = w.latitude AND r.longitude = w.longitude
+    WHERE w.last_ts IS NULL
+       OR r.ts > w.last_ts - INTERVAL {CONTEXT_HOURS} HOUR
+"""
+
+def build_new_features(
+    con: duckdb.DuckDBPyConnection,
+    engine: str = "numpy",
+    gap_policy: str = "drop",
+    max_fill: int = 3,
+    raw: str = "raw.weather_hourly_geo",
+) -> pd.DataFrame:
+    """
+    Features das horas novas de cada local (contexto já descartado), lendo de 'raw'.
+    - engine="numpy": lê as linhas novas e calcula em memória
+    - engine="duckdb": calcula via window functions dentro do próprio banco
+      (com imputação de lacunas, a grade é montada antes, em memória)
+    """
+    sql = NEW_RAW_SQL.format(raw=raw)
+    if engine == "duckdb" and gap_policy == "drop":
+        feat = compute_features_duckdb(con, f"({sql})")
+    else:
+        feat = make_features(
+            con.execute(sql).df(), engine=engine, gap_policy=gap_policy, max_fill=max_fill
+        )
+    marks = con.execute("SELECT * FROM refined.feature_watermarks").df()
+    # mantém só as horas posteriores ao mark de cada local (o resto era contexto)
+    feat = feat.merge(marks, on=LOC_COLS, how="left")
+    feat = feat[feat["last_ts"].isna() | (feat["ts"] > feat["last_ts"])]
+    return feat.drop(columns=["last_ts"]).reset_index(drop=True)
+
+def missing_targets(con: duckdb.DuckDBPyConnection) -> list:
+    """Alvos que a refined.weather_features existente ainda não tem (gerada antes dos horizontes)."""
+    cols = {
+        r[0]
+        for r in con.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = 'refined' AND table_name = 'weather_features'"
+        ).fetchall()
+    }
+    return [t for t in TARGETS if cols and t not in cols]
+
+def main(full: bool = False, engine: str = "numpy", gap_policy: str = "drop", max_fill: int = 3):
+    con = duckdb.connect(DB_PATH.as_posix())
+    try:
+        ensure_refined(con)
+        if not full and missing_targets(con):
+            print(f"[WARN] features sem os alvos {missing_targets(con)}: reconstruindo tudo (--full)")
+            full = True
+        if not full and lake.legacy_layout("features"):
+            print(f"[WARN] {FEAT_DIR} no layout antigo (sem mês): reconstruindo tudo (--full)")
+            full = True
+        if full:
+            # rebuild completo: zera tabela, marks e Parquet
+            con.execute("DROP TABLE IF EXISTS refined.weather_features;")
+            con.execute("DELETE FROM refined.feature_watermarks;")
+            shutil.rmtree(FEAT_DIR, ignore_errors=True)
+
+        n_marks = con.execute("SELECT COUNT(*) FROM refined.feature_watermarks").fetchone()[0]
+        n_raw = con.execute("SELECT COUNT(*) FROM raw.weather_hourly").fetchone()[0]
+        if n_marks == 0 and n_raw < 30:
+            print("[WARN] Poucos dados: rode /backfill e /collect na API antes.")
+            return
+
+        # rebuild completo também relê os meses já arquivados (e apagados do banco)
+        raw = lake.raw_with_archive() if full else "raw.weather_hourly_geo"
+        feat = build_new_features(con, engine=engine, gap_policy=gap_policy, max_fill=max_fill, raw=raw)
+        if feat.empty:
+            print("[OK] sem horas novas com features completas")
+            return
+
+        con.register("feat_tmp", feat)
+        # upsert: se a transação abaixo falhar, o watermark não anda e a próxima execução
+        # regrava as mesmas horas -> substituem as do Parquet em vez de duplicar
+        lake.upsert(con, "features", "feat_tmp")
+        done = lake.compact(con, "features", min_files=lake.COMPACT_MIN_FILES)
+        print(
+            f"[OK] +{len(feat)} linhas em {FEAT_DIR} (colunas={len(feat.columns)}"
+            + (f", {done['partitions']} partições compactadas)" if done["partitions"] else ")")
+        )
+
+        con.execute("BEGIN TRANSACTION;")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS refined.weather_features AS "
+            "SELECT * FROM feat_tmp LIMIT 0;"
+        )
+        con.execute("INSERT INTO refined.weather_features SELECT * FROM feat_tmp;")
+        # novo high-water mark = última hora com features emitidas por local
+        con.execute(
+            """
+            INSERT INTO refined.feature_watermarks
+            SELECT latitude, longitude, MAX(ts) FROM feat_tmp GROUP BY 1, 2
+            ON CONFLICT (latitude, longitude) DO UPDATE SET last_ts = excluded.last_ts;
+            """
+        )
+        con.execute("COMMIT;")
+        con.unregister("feat_tmp")
+        n_loc = feat[LOC_COLS].drop_duplicates().shape[0]
+        print(f"[OK] refined.weather_features +{len(feat)} linhas ({n_loc} locais)")
+    finally:
+        con.close()
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--full", action="store_true",
+                    help="reconstrói todas as features (padrão: incremental por local)")
+    ap.add_argument("--engine", choices=["numpy", "duckdb"], default="numpy",
+                    help="backend do motor de features")
+    ap.add_argument("--gaps", choices=GAP_POLICIES, default="drop",
+                    help="política para horas faltantes em raw.weather_hourly")
+    ap.add_argument("--max-fill", type=int, default=3,
+                    help="máximo de horas imputadas por lacuna (ffill/interpolate)")
+    args = ap.parse_args()
+    main(full=args.full, engine=args.engine, gap_policy=args.gaps, max_fill=args.max_fill)
@@ -0,0 +1,318 @@
+# src/storage/coverage.py
+# Cobertura horária de raw.weather_hourly mantida na ingestão (sem varrer o histórico).
+# - raw.coverage_daily: horas gravadas por (local, dia UTC) + primeira/última hora do dia
+# - raw.coverage_gaps: intervalos de horas faltantes entre duas horas gravadas do local
+# - "Gravada" = no banco OU no arquivo Parquet (processing/archive.py): o --delete do arquivo
+#   não mexe na cobertura, o forget() (DELETE /raw) mantém as horas arquivadas, e o
+#   rebuild()/update() leem também as horas que só estão no
+#   arquivo (update: só os meses do lote, e só se o arquivo tem esses meses). Assim o
+#   missing_span() não trata meses arquivados como faltantes (nada de baixar de novo)
+# - update(): roda na mesma transação do INSERT (api.py, _upsert_rows) só sobre os dias do
+#   lote e as lacunas vizinhas: custo proporcional ao lote, não ao histórico
+# - missing_span(): horas ainda sem dado num período -> a API só pede à Open-Meteo o que falta
+# - summary(): cobertura e lacunas de vários locais (janela opcional dos últimos N dias)
+#   só com as duas tabelas pequenas -> /coverage da API, audit_backfill.py, app
+from typing import Optional
+
+import duckdb
+import pandas as pd
+
+from src.storage import lake
+
+COVERAGE_DDL = """
+    CREATE TABLE IF NOT EXISTS raw.coverage_daily (
+        location_id INTEGER,
+        day DATE,                 -- dia UTC
+        hours SMALLINT,           -- horas gravadas no dia (0..24)
+        first_ts TIMESTAMP,
+        last_ts TIMESTAMP,
+        PRIMARY KEY (location_id, day)
+    );
+    CREATE TABLE IF NOT EXISTS raw.coverage_gaps (
+        location_id INTEGER,
+        gap_start TIMESTAMP,      -- 1ª hora faltante
+        gap_end TIMESTAMP,        -- última hora faltante
+        hours INTEGER,
+        PRIMARY KEY (location_id, gap_start)
+    );
+"""
+
+# {hours}: (location_id, ts) gravados (banco, ou banco + arquivo); ver _hours()
+# dias tocados pelo lote (cov_tmp: location_id, ts), recontados na tabela
+DAILY_SQL = """
+    INSERT OR REPLACE INTO raw.coverage_daily
+    SELECT w.location_id, CAST(w.ts AS DATE), COUNT(*), MIN(w.ts), MAX(w.ts)
+    FROM {hours} AS w
+    JOIN (
+        SELECT location_id, CAST(MIN(ts) AS DATE) AS d0, CAST(MAX(ts) AS DATE) + 1 AS d1
+        FROM cov_tmp GROUP BY 1
+    ) AS r
+      ON w.location_id = r.location_id AND w.ts >= r.d0 AND w.ts < r.d1
+    GROUP BY 1, 2
+"""
+
+# horas gravadas vizinhas do lote (pelo coverage_daily): lo = última antes do 1º dia do lote,
+# hi = primeira depois do último dia; as lacunas entre lo e hi são as únicas que podem mudar
+BOUNDS_SQL = """
+    SELECT r.location_id,
+           COALESCE(MAX(d.last_ts) FILTER (WHERE d.day < r.d0), '-infinity'::TIMESTAMP) AS lo,
+           COALESCE(MIN(d.first_ts) FILTER (WHERE d.day > r.d1), 'infinity'::TIMESTAMP) AS hi
+    FROM (
+        SELECT location_id, CAST(MIN(ts) AS DATE) AS d0, CAST(MAX(ts) AS DATE) AS d1
+        FROM cov_tmp GROUP BY 1
+    ) AS r
+    JOIN raw.coverage_daily AS d USING (location_id)
+    GROUP BY 1
+"""
+
+# horas gravadas entre lo e hi, incluindo lo/hi (que podem estar só no arquivo, fora dos meses
+# lidos): entre lo e o 1º dia do lote e entre o último dia e hi não há hora gravada, então
+# basta {hours} cobrir os dias do lote
+UPDATE_SRC_SQL = f"""(
+    SELECT w.location_id, w.ts
+    FROM {{hours}} AS w JOIN ({BOUNDS_SQL}) AS b
+      ON w.location_id = b.location_id AND w.ts >= b.lo AND w.ts <= b.hi
+    UNION
+    SELECT location_id, lo FROM ({BOUNDS_SQL}) WHERE isfinite(lo)
+    UNION
+    SELECT location_id, hi FROM ({BOUNDS_SQL}) WHERE isfinite(hi)
+) AS w"""
+
+# {src}: linhas (location_id, ts) a varrer; lacuna = duas horas gravadas seguidas com > 1h entre elas
+GAPS_SQL = """
+    INSERT INTO raw.coverage_gaps
+    SELECT location_id, prev_ts + INTERVAL 1 HOUR, ts - INTERVAL 1 HOUR,
+           CAST(date_diff('hour', prev_ts, ts) AS INTEGER) - 1
+    FROM (
+        SELECT w.location_id, w.ts, lag(w.ts) OVER (PARTITION BY w.location_id ORDER BY w.ts) AS prev_ts
+        FROM {src}
+    )
+    WHERE ts - prev_ts > INTERVAL 1 HOUR
+"""
+
+
+def ensure_coverage(con: duckdb.DuckDBPyConnection) -> None:
+    """Cria as tabelas; banco com dados e cobertura vazia (versão anterior) é montado uma vez."""
+    con.execute("CREATE SCHEMA IF NOT EXISTS raw;")
+    con.execute(COVERAGE_DDL)
+    empty = con.execute("SELECT COUNT(*) = 0 FROM raw.coverage_daily").fetchone()[0]
+    if empty and con.execute("SELECT COUNT(*) > 0 FROM raw.weather_hourly").fetchone()[0]:
+        rebuild(con)
+
+
+def _hours(start=None, end=None) -> str:
+    """
+    (location_id, ts) gravados: raw.weather_hourly + as horas do arquivo Parquet nos meses de
+    [start, end) (None = todos). Sem arquivo nesses meses (só listagem de diretórios), só o banco.
+    """
+    months = lake.months("raw")
+    if start is not None:
+        months = {m for m in months if f"{pd.Timestamp(start):%Y-%m}" <= m <= f"{pd.Timestamp(end):%Y-%m}"}
+    if not months:
+        return "raw.weather_hourly"
+    return f"""(
+        SELECT location_id, ts FROM raw.weather_hourly
+        UNION
+        SELECT l.location_id, a.ts
+        FROM {lake.relation("raw")} AS a
+        JOIN raw.locations AS l USING (latitude, longitude)
+        WHERE {lake.month_filter(start, end)}
+    )"""
+
+
+def rebuild(con: duckdb.DuckDBPyConnection) -> None:
+    """Recalcula tudo a partir do banco + arquivo (varredura completa; só na migração)."""
+    hours = _hours()
+    con.execute("DELETE FROM raw.coverage_daily;")
+    con.execute("DELETE FROM raw.coverage_gaps;")
+    con.execute(
+        f"""
+        INSERT INTO raw.coverage_daily
+        SELECT location_id, CAST(ts AS DATE), COUNT(*), MIN(ts), MAX(ts)
+        FROM {hours} GROUP BY 1, 2
+        """
+    )
+    con.execute(GAPS_SQL.format(src=f"{hours} AS w"))
+
+
+def update(con: duckdb.DuckDBPyConnection, written: pd.DataFrame) -> None:
+    """Atualiza a cobertura com as linhas gravadas (location_id, ts), na transação do chamador."""
+    if written.empty:
+        return
+    # dias UTC do lote: [1º dia, dia seguinte ao último)
+    hours = _hours(written["ts"].min().floor("D"), written["ts"].max().floor("D") + pd.Timedelta(days=1))
+    con.register("cov_tmp", written[["location_id", "ts"]])
+    try:
+        con.execute(DAILY_SQL.format(hours=hours))
+        con.execute(
+            f"""
+            DELETE FROM raw.coverage_gaps AS g
+            USING ({BOUNDS_SQL}) AS b
+            WHERE g.location_id = b.location_id AND g.gap_start > b.lo AND g.gap_start <= b.hi
+            """
+        )
+        con.execute(GAPS_SQL.format(src=UPDATE_SRC_SQL.format(hours=hours)))
+    finally:
+        con.unregister("cov_tmp")
+
+
+def forget(con: duckdb.DuckDBPyConnection, loc_id: Optional[int] = None) -> None:
+    """
+    Cobertura de um local (ou de todos) depois do DELETE das linhas dele no banco (DELETE /raw):
+    só as horas que continuam no arquivo Parquet seguem cobertas (o /backfill não as baixa de
+    novo); as que existiam só no banco viram faltantes.
+    """
+    where, params = ("WHERE location_id = ?", [loc_id]) if loc_id is not None else ("", [])
+    con.execute(f"DELETE FROM raw.coverage_daily {where}", params)
+    con.execute(f"DELETE FROM raw.coverage_gaps {where}", params)
+    if not lake.has_data("raw"):
+        return
+    archived = f"""(
+        SELECT DISTINCT l.location_id, a.ts
+        FROM {lake.relation("raw")} AS a
+        JOIN raw.locations AS l USING (latitude, longitude)
+        {where.replace("location_id", "l.location_id")}
+    )"""
+    con.execute(
+        f"""
+        INSERT INTO raw.coverage_daily
+        SELECT location_id, CAST(ts AS DATE), COUNT(*), MIN(ts), MAX(ts)
+        FROM {archived} GROUP BY 1, 2
+        """,
+        params,
+    )
+    con.execute(GAPS_SQL.format(src=f"{archived} AS w"), params)
+
+
+def _window(days: Optional[int]) -> str:
+    return "s.first_ts" if days is None else f"greatest(s.first_ts, s.last_ts - to_days({int(days)}))"
+
+
+def summary(
+    con: duckdb.DuckDBPyConnection,
+    coords: Optional[list] = None,
+    days: Optional[int] = None,
+    max_gaps: int = 100,
+) -> list:
+    """
+    Cobertura de cada (lat, lon) normalizado de 'coords' (None = todos os locais com dados):
+    janela = últimos 'days' dias até a última hora gravada (None = todo o histórico).
+    Cada item: fuso do local (None se ainda desconhecido), horas esperadas/gravadas/faltantes,
+    % e as 'max_gaps' lacunas mais recentes.
+    """
+    loc_filter = ""
+    if coords is not None:
+        con.register("cov_req", pd.DataFrame(coords, columns=["latitude", "longitude"]))
+        loc_filter = "SEMI JOIN cov_req USING (latitude, longitude)"
+    # janela de cada local (mesma CTE nas duas consultas; sem tabela temporária: vale em read_only)
+    win = f"""
+        WITH cov_win AS (
+            SELECT l.location_id, l.latitude, l.longitude, l.timezone, s.first_ts, s.last_ts,
+                   {_window(days)} AS win_start
+            FROM (SELECT * FROM raw.locations {loc_filter}) AS l
+            JOIN (
+                SELECT location_id, MIN(first_ts) AS first_ts, MAX(last_ts) AS last_ts
+                FROM raw.coverage_daily GROUP BY 1
+            ) AS s USING (location_id)
+        )
+    """
+    try:
+        rows = con.execute(
+            win + """
+            SELECT w.latitude, w.longitude, w.timezone, w.first_ts, w.last_ts, w.win_start,
+                   date_diff('hour', w.win_start, w.last_ts) + 1 AS expected,
+                   COALESCE(SUM(date_diff('hour', greatest(g.gap_start, w.win_start), g.gap_end) + 1), 0)
+                       AS missing,
+                   COUNT(g.gap_start) AS n_gaps
+            FROM cov_win AS w
+            LEFT JOIN raw.coverage_gaps AS g
+              ON g.location_id = w.location_id AND g.gap_end >= w.win_start
+            GROUP BY ALL
+            ORDER BY w.latitude, w.longitude
+            """
+        ).fetchall()
+        gaps = con.execute(
+            win + """
+            SELECT w.latitude, w.longitude, greatest(g.gap_start, w.win_start) AS gap_start, g.gap_end,
+                   date_diff('hour', greatest(g.gap_start, w.win_start), g.gap_end) + 1 AS hours
+            FROM raw.coverage_gaps AS g
+            JOIN cov_win AS w ON g.location_id = w.location_id AND g.gap_end >= w.win_start
+            QUALIFY row_number() OVER (PARTITION BY g.location_id ORDER BY g.gap_start DESC) <= ?
+            ORDER BY 1, 2, 3
+            """,
+            [max_gaps],
+        ).fetchall()
+    finally:
+        if coords is not None:
+            con.unregister("cov_req")
+
+    by_loc: dict = {}
+    for lat, lon, start, end, hours in gaps:
+        by_loc.setdefault((lat, lon), []).append(
+            {"start_utc": start.isoformat(), "end_utc": end.isoformat(), "hours": int(hours)}
+        )
+    out = []
+    for lat, lon, tz, first, last, start, expected, missing, n_gaps in rows:
+        observed = int(expected - missing)
+        out.append({
+            "lat": lat,
+            "lon": lon,
+            "timezone": tz,
+            "first_ts_utc": first.isoformat(),
+            "last_ts_utc": last.isoformat(),
+            "window_start_utc": start.isoformat(),
+            "hours_expected": int(expected),
+            "hours_observed": observed,
+            "missing_hours": int(missing),
+            "coverage_pct": round(100 * observed / expected, 2) if expected else None,
+            "n_gaps": int(n_gaps),
+            "gaps": by_loc.get((lat, lon), []),
+        })
+    return out
+
+
+def daily(con: duckdb.DuckDBPyConnection, loc_id: int, start=None) -> pd.DataFrame:
+    """Horas gravadas por dia UTC de um local (desde 'start', se informado)."""
+    return con.execute(
+        """
+        SELECT day, hours FROM raw.coverage_daily
+        WHERE location_id = ? AND day >= CAST(COALESCE(?, '-infinity'::TIMESTAMP) AS DATE)
+        ORDER BY day
+        """,
+        [loc_id, None if start is None else str(start)],
+    ).df()
+
+
+def missing_span(con: duckdb.DuckDBPyConnection, loc_id: Optional[int], start, end) -> Optional[tuple]:
+    """
+    (1ª, última) hora UTC sem dado do local em [start, end] (naive UTC), ou None se todas
+    estão gravadas. Só pelas tabelas de cobertura: antes da 1ª hora, depois da última e lacunas.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if start > end:
+        return None
+    first, last = (None, None) if loc_id is None else con.execute(
+        "SELECT MIN(first_ts), MAX(last_ts) FROM raw.coverage_daily WHERE location_id = ?", [loc_id]
+    ).fetchone()
+    if first is None:
+        return start, end
+    first, last = pd.Timestamp(first), pd.Timestamp(last)
+    spans = []
+    if start < first:
+        spans.append((start, min(first - pd.Timedelta(hours=1), end)))
+    if end > last:
+        spans.append((max(last + pd.Timedelta(hours=1), start), end))
+    lo, hi = con.execute(
+        """
+        SELECT MIN(greatest(gap_start, ?::TIMESTAMP)), MAX(least(gap_end, ?::TIMESTAMP))
+        FROM raw.coverage_gaps
+        WHERE location_id = ? AND gap_end >= ?::TIMESTAMP AND gap_start <= ?::TIMESTAMP
+        """,
+        [start, end, loc_id, start, end],
+    ).fetchone()
+    if lo is not None:
+        spans.append((pd.Timestamp(lo), pd.Timestamp(hi)))
+    spans = [(a, b) for a, b in spans if a <= b]
+    if not spans:
+        return None
+    return min(a for a, _ in spans), max(b for _, b in spans)
@@ -0,0 +1,182 @@
+# src/storage/db.py
+# Gerenciador de conexão DuckDB compartilhado pelo processo (API, app, scripts).
+# - UMA conexão de longa duração por arquivo; cada thread usa o seu cursor (conn.cursor())
+# - Escritas (insert/delete/DDL) passam por uma fila com um único thread escritor
+# - Modo read_only para dashboards/leitores
+# - Locks entre PROCESSOS: o DuckDB só permite um processo escrevendo no arquivo. Por isso a
+#   conexão é liberada após IDLE_RELEASE_S sem uso (outro processo pode entrar) e a abertura
+#   tenta de novo, com backoff, enquanto o arquivo estiver travado por outro processo.
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+import duckdb
+import pandas as pd
+
+DB_PATH = Path("data") / "rt_weather.duckdb"
+IDLE_RELEASE_S = float(os.getenv("DUCKDB_IDLE_RELEASE_S", "2.0"))  # 0 = nunca libera
+LOCK_TIMEOUT_S = float(os.getenv("DUCKDB_LOCK_TIMEOUT_S", "15.0"))
+
+
+def _is_lock_error(exc: Exception) -> bool:
+    return isinstance(exc, duckdb.IOException) and "lock" in str(exc).lower()
+
+
+class DuckDBManager:
+    """Conexão persistente + cursores por thread + escritor único."""
+
+    def __init__(self, path: Path, read_only: bool = False, idle_release_s: float = IDLE_RELEASE_S):
+        self.path = Path(path)
+        self.read_only = read_only
+        self.idle_release_s = idle_release_s
+        self._lock = threading.Lock()
+        self._con: Optional[duckdb.DuckDBPyConnection] = None
+        self._cursors: list = []
+        self._generation = 0
+        self._active = 0
+        self._last_used = time.monotonic()
+        self._local = threading.local()
+        self._writer = None if read_only else ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="duckdb-writer"
+        )
+        if idle_release_s > 0:
+            threading.Thread(target=self._idle_loop, daemon=True, name="duckdb-idle").start()
+
+    # -- conexão -----------------------------------------------------------
+    def _open(self) -> duckdb.DuckDBPyConnection:
+        """Abre o arquivo; se outro processo segura o lock, tenta de novo até LOCK_TIMEOUT_S."""
+        if not self.read_only:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        deadline = time.monotonic() + LOCK_TIMEOUT_S
+        attempt = 0
+        while True:
+            try:
+                return duckdb.connect(self.path.as_posix(), read_only=self.read_only)
+            except duckdb.IOException as e:
+                if not _is_lock_error(e) or time.monotonic() >= deadline:
+                    raise
+                time.sleep(random.uniform(0, min(1.0, 0.05 * 2 ** attempt)))
+                attempt += 1
+
+    def _acquire(self) -> duckdb.DuckDBPyConnection:
+        """Cursor da thread atual (recriado se a conexão foi liberada nesse meio tempo)."""
+        while True:
+            with self._lock:
+                if self._con is not None:
+                    self._active += 1
+                    if getattr(self._local, "generation", None) != self._generation:
+                        self._local.cursor = self._con.cursor()
+                        self._local.generation = self._generation
+                        self._cursors.append(self._local.cursor)
+                    return self._local.cursor
+            # abertura (com as tentativas de até LOCK_TIMEOUT_S) FORA do lock: enquanto outro
+            # processo segura o arquivo, as demais threads e o _idle_loop não ficam presos aqui
+            con = self._open()
+            with self._lock:
+                if self._con is None:
+                    self._con, con = con, None
+                    self._generation += 1
+                    self._last_used = time.monotonic()  # o _idle_loop não fecha antes do uso
+            if con is not None:
+                con.close()  # outra thread publicou a conexão primeiro
+
+    def _release(self) -> None:
+        with self._lock:
+            self._active -= 1
+            self._last_used = time.monotonic()
+
+    def _idle_loop(self) -> None:
+        while True:
+            time.sleep(max(self.idle_release_s / 2, 0.1))
+            with self._lock:
+                idle = time.monotonic() - self._last_used >= self.idle_release_s
+                if self._con is not None and self._active == 0 and idle:
+                    self._close_locked()
+
+    def _close_locked(self) -> None:
+        for cur in self._cursors:
+            cur.close()
+        self._cursors.clear()
+        self._con.close()
+        self._con = None
+
+    @contextmanager
+    def cursor(self):
+        """with db.cursor() as cur: ... — cursor da thread, válido só dentro do bloco."""
+        cur = self._acquire()
+        try:
+            yield cur
+        finally:
+            self._finish(cur)
+            self._release()
+
+    @staticmethod
+    def _finish(cur: duckdb.DuckDBPyConnection) -> None:
+        """
+        Esgota o resultado pendente do cursor: lido só em parte (ex.: fetchone), ele mantém a
+        transação de leitura aberta, e esse snapshot antigo faz o escritor falhar ao atualizar
+        de novo as mesmas linhas (write-write conflict no COMMIT do upsert).
+        """
+        try:
+            cur.fetchall()
+        except duckdb.Error:
+            pass  # nenhum resultado aberto
+
+    # -- leitura -----------------------------------------------------------
+    def df(self, sql: str, params: Optional[list] = None) -> pd.DataFrame:
+        with self.cursor() as cur:
+            return cur.execute(sql, params or []).df()
+
+    def fetchone(self, sql: str, params: Optional[list] = None):
+        with self.cursor() as cur:
+            return cur.execute(sql, params or []).fetchone()
+
+    def fetchall(self, sql: str, params: Optional[list] = None) -> list:
+        with self.cursor() as cur:
+            return cur.execute(sql, params or []).fetchall()
+
+    # -- escrita -----------------------------------------------------------
+    def write(self, fn: Callable, *args, **kwargs):
+        """
+        Executa fn(cur, *args, **kwargs) no thread escritor e devolve o resultado.
+        Todas as escritas do processo ficam numa fila: sem conflito de transação entre elas.
+        """
+        if self._writer is None:
+            raise PermissionError(f"{self.path} aberto em modo read_only")
+
+        def run():
+            with self.cursor() as cur:
+                return fn(cur, *args, **kwargs)
+
+        return self._writer.submit(run).result()
+
+    def execute_write(self, sql: str, params: Optional[list] = None) -> None:
+        self.write(lambda cur: cur.execute(sql, params or []))
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+        with self._lock:
+            if self._con is not None:
+                self._close_locked()
+
+
+_managers: dict = {}
+_managers_lock = threading.Lock()
+
+
+def get_db(path: Optional[Path] = None, read_only: bool = False) -> DuckDBManager:
+    """
+    Gerenciador do processo para 'path' (padrão: data/rt_weather.duckdb).
+    Obs.: o DuckDB não aceita o mesmo arquivo aberto em read_only e read-write no mesmo processo.
+    """
+    key = (Path(path or DB_PATH).resolve(), read_only)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = DuckDBManager(key[0], read_only=read_only)
+        return _managers[key]
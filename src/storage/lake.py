@@ -0,0 +1,196 @@
+# src/storage/lake.py
+# Lago Parquet particionado (hive) por local e mês, para dados brutos e features.
+# - Layout: <raiz>/latitude=<lat>/longitude=<lon>/month=YYYY-MM/part-<uuid>.parquet
+#     raw      -> data/raw/weather_hourly        (arquivo de raw.weather_hourly, archive.py)
+#     features -> data/refined/weather_features  (prepare_data.py, a cada execução)
+# - Escrita: COPY do DuckDB com PARTITION_BY + APPEND (um arquivo novo por partição tocada),
+#   linhas ordenadas por ts dentro de cada arquivo: as estatísticas min/max de ts de cada
+#   row group deixam o leitor pular blocos fora do período; compressão zstd
+# - Compactação: partições com vários arquivos pequenos viram UM arquivo ordenado por ts
+#   (sem duplicar ts: vale a linha do arquivo mais novo)
+# - upsert(): write() idempotente — partições que já tinham algum ts do lote são compactadas
+#   logo após o append (o lote, mais novo, substitui as linhas antigas); sem sobreposição,
+#   é só o append. Reexecutar o mesmo lote (ex.: falha antes de avançar o watermark) não duplica
+# - Leitura: read_parquet(hive_partitioning) -> filtros em latitude/longitude/month podem
+#   descartar arquivos pelo caminho (sem abrir); month_filter() traduz um período em meses
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import duckdb
+import pandas as pd
+
+DATASETS = {
+    "raw": Path("data") / "raw" / "weather_hourly",
+    "features": Path("data") / "refined" / "weather_features",
+}
+PARTITION_COLS = ["latitude", "longitude", "month"]
+HIVE_TYPES = "{'latitude': DOUBLE, 'longitude': DOUBLE, 'month': VARCHAR}"
+ROW_GROUP_ROWS = 122_880
+# prepare_data.py compacta sozinho as partições que já acumularam esta quantidade de arquivos
+COMPACT_MIN_FILES = 24
+# colunas de raw.weather_hourly_geo que vão para o arquivo (sem o fuso, que fica em raw.locations)
+RAW_COLS = ["ts", "latitude", "longitude", "temperature_2m", "relative_humidity_2m",
+            "precipitation", "wind_speed_10m"]
+
+
+def dataset_dir(dataset: str) -> Path:
+    if dataset not in DATASETS:
+        raise ValueError(f"dataset inválido: {dataset!r} (use {', '.join(DATASETS)})")
+    return DATASETS[dataset]
+
+
+def files(dataset: str) -> list:
+    """Arquivos .parquet do dataset (no layout por local/mês)."""
+    return sorted(dataset_dir(dataset).glob("latitude=*/longitude=*/month=*/*.parquet"))
+
+
+def has_data(dataset: str) -> bool:
+    return next(iter(dataset_dir(dataset).glob("latitude=*/longitude=*/month=*/*.parquet")), None) is not None
+
+
+def months(dataset: str) -> set:
+    """Meses ('YYYY-MM') com alguma partição no dataset (só pelos nomes dos diretórios)."""
+    return {p.name[len("month="):] for p in dataset_dir(dataset).glob("latitude=*/longitude=*/month=*")}
+
+
+def legacy_layout(dataset: str) -> bool:
+    """Arquivos do layout antigo (só latitude=/longitude=, sem mês), que o glob do lago não lê."""
+    return next(iter(dataset_dir(dataset).glob("latitude=*/longitude=*/*.parquet")), None) is not None
+
+
+def relation(dataset: str, filename: bool = False) -> str:
+    """
+    Expressão FROM do dataset inteiro; filtre por latitude/longitude/month para podar arquivos.
+    filename=True acrescenta a coluna 'filename' (arquivo de origem de cada linha).
+    """
+    glob = (dataset_dir(dataset) / "**" / "*.parquet").as_posix()
+    extra = "filename = true, " if filename else ""
+    return f"read_parquet('{glob}', {extra}hive_partitioning = true, hive_types = {HIVE_TYPES})"
+
+
+def month_filter(start=None, end=None) -> str:
+    """
+    Condição sobre a coluna month (partição) para o período [start, end) de ts.
+    Vai como literal (YYYY-MM gerado aqui), para a poda de arquivos valer já no plano.
+    """
+    conds = []
+    if start is not None:
+        conds.append(f"month >= '{pd.Timestamp(start):%Y-%m}'")
+    if end is not None:
+        # end exclusivo: o mês que contém o último instante antes de 'end'
+        conds.append(f"month <= '{pd.Timestamp(end) - pd.Timedelta(microseconds=1):%Y-%m}'")
+    return " AND ".join(conds) or "TRUE"
+
+
+def raw_with_archive() -> str:
+    """
+    raw.weather_hourly_geo + linhas arquivadas que já saíram do banco (archive.py --delete),
+    como subconsulta; sem arquivo, só a view. Para rebuilds completos (prepare_data.py --full).
+    """
+    if not has_data("raw"):
+        return "raw.weather_hourly_geo"
+    cols = ", ".join(RAW_COLS)
+    return f"""(
+        SELECT {cols} FROM raw.weather_hourly_geo
+        UNION ALL
+        SELECT {cols} FROM {relation("raw")} AS a
+        ANTI JOIN raw.weather_hourly_geo AS g USING (latitude, longitude, ts)
+    )"""
+
+
+def write(con: duckdb.DuckDBPyConnection, dataset: str, source: str, params: Optional[list] = None) -> int:
+    """
+    Anexa 'source' (tabela/view/relação registrada ou subconsulta entre parênteses, com ts,
+    latitude, longitude) ao dataset: um arquivo novo em cada partição (local, mês) tocada.
+    Devolve o nº de linhas gravadas.
+    """
+    root = dataset_dir(dataset)
+    root.mkdir(parents=True, exist_ok=True)
+    return con.execute(
+        f"""
+        COPY (
+            SELECT *, strftime(ts, '%Y-%m') AS month
+            FROM {source}
+            ORDER BY latitude, longitude, ts
+        ) TO '{root.as_posix()}' (
+            FORMAT parquet, PARTITION_BY ({', '.join(PARTITION_COLS)}), APPEND,
+            FILENAME_PATTERN 'part-{{uuid}}', COMPRESSION zstd, ROW_GROUP_SIZE {ROW_GROUP_ROWS}
+        );
+        """,
+        params or [],
+    ).fetchone()[0]
+
+
+def upsert(con: duckdb.DuckDBPyConnection, dataset: str, source: str) -> int:
+    """
+    Como write() ('source': tabela/view registrada), mas um ts que já estava na partição
+    é substituído pela linha do lote em vez de duplicado. Devolve o nº de linhas gravadas.
+    """
+    overlap = []
+    if has_data(dataset):
+        start, end = con.execute(f"SELECT MIN(ts), MAX(ts) FROM {source}").fetchone()
+        if start is not None:
+            # só as partições do período do lote (poda pelo mês, sem abrir os outros arquivos)
+            overlap = [
+                Path(f).parent
+                for (f,) in con.execute(
+                    f"""
+                    SELECT DISTINCT a.filename
+                    FROM {relation(dataset, filename=True)} AS a
+                    SEMI JOIN {source} AS s USING (latitude, longitude, ts)
+                    WHERE {month_filter(start, pd.Timestamp(end) + pd.Timedelta(microseconds=1))}
+                    """
+                ).fetchall()
+            ]
+    n = write(con, dataset, source)
+    for part in sorted(set(overlap)):
+        _compact_partition(con, part)
+    return n
+
+
+def _compact_partition(con: duckdb.DuckDBPyConnection, part: Path) -> int:
+    """Reescreve a partição num só arquivo (ts únicos, vale o arquivo mais novo). Devolve quantos havia."""
+    old = sorted(part.glob("*.parquet"), key=lambda p: p.stat().st_mtime_ns)
+    names = [p.as_posix() for p in old]
+    tmp = part / f".compact-{uuid.uuid4().hex}.tmp"
+    con.execute(
+        f"""
+        COPY (
+            SELECT * EXCLUDE (filename)
+            FROM read_parquet(?, filename = true, hive_partitioning = false)
+            QUALIFY row_number() OVER (PARTITION BY ts ORDER BY list_position(?, filename) DESC) = 1
+            ORDER BY ts
+        ) TO '{tmp.as_posix()}' (FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {ROW_GROUP_ROWS});
+        """,
+        [names, names],
+    )
+    os.replace(tmp, part / f"part-{uuid.uuid4()}.parquet")
+    for p in old:
+        p.unlink()
+    return len(old)
+
+
+def compact(con: duckdb.DuckDBPyConnection, dataset: str, min_files: int = 2) -> dict:
+    """
+    Junta os arquivos de cada partição com >= min_files num só, ordenado por ts e sem ts
+    repetido (vale o arquivo mais recente). Devolve {"partitions": n, "files_before": m}.
+    Rode com as escritas do dataset paradas (prepare_data.py / archive.py).
+    """
+    parts, before = 0, 0
+    for part in sorted(dataset_dir(dataset).glob("latitude=*/longitude=*/month=*")):
+        if len(list(part.glob("*.parquet"))) < min_files:
+            continue
+        before += _compact_partition(con, part)
+        parts += 1
+    return {"partitions": parts, "files_before": before}
+
+
+def partition_counts(con: duckdb.DuckDBPyConnection, dataset: str) -> pd.DataFrame:
+    """Linhas por partição (latitude, longitude, month), só pelos metadados dos arquivos."""
+    if not has_data(dataset):
+        return pd.DataFrame(columns=PARTITION_COLS + ["rows"])
+    return con.execute(
+        f"SELECT latitude, longitude, month, COUNT(*) AS rows FROM {relation(dataset)} GROUP BY ALL"
+    ).df()
@@ -0,0 +1,78 @@
+# src/storage/locations.py
+# Dimensão de locais: raw.locations (location_id INTEGER <-> lat/lon normalizados, fuso, nome)
+# - raw.weather_hourly guarda só o location_id (4 bytes) no lugar de dois DOUBLE
+# - Filtro por cidade vira "location_id = ?" sobre a tabela ordenada por (location_id, ts):
+#   o DuckDB pula os row groups de outros locais (zone maps), sem round() linha a linha
+# - raw.weather_hourly_geo: view com latitude/longitude para quem ainda lê por coordenada
+from typing import Optional
+
+import duckdb
+
+LOCATIONS_DDL = """
+    CREATE SEQUENCE IF NOT EXISTS raw.location_id_seq START 1;
+    CREATE TABLE IF NOT EXISTS raw.locations (
+        location_id INTEGER PRIMARY KEY DEFAULT nextval('raw.location_id_seq'),
+        latitude DOUBLE NOT NULL,
+        longitude DOUBLE NOT NULL,
+        timezone VARCHAR,
+        name VARCHAR,
+        UNIQUE (latitude, longitude)
+    );
+"""
+
+# mesmas colunas (e ordem) da antiga raw.weather_hourly com lat/lon
+GEO_VIEW_SQL = """
+    CREATE OR REPLACE VIEW raw.weather_hourly_geo AS
+    SELECT w.ts, l.latitude, l.longitude, w.temperature_2m, w.relative_humidity_2m,
+           w.precipitation, w.wind_speed_10m
+    FROM raw.weather_hourly AS w
+    JOIN raw.locations AS l USING (location_id);
+"""
+
+def norm_latlon(lat: float, lon: float, nd: int = 4):
+    """Arredonda lat/lon para nd casas (evita 'quase duplicatas')."""
+    return round(lat, nd), round(lon, nd)
+
+def ensure_locations(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute("CREATE SCHEMA IF NOT EXISTS raw;")
+    con.execute(LOCATIONS_DDL)
+
+def register_locations(con: duckdb.DuckDBPyConnection, source: str, with_timezone: bool = False) -> int:
+    """
+    Cadastra os locais novos de 'source' (tabela/view/relação registrada com latitude, longitude
+    e, se with_timezone, timezone) e preenche o fuso dos que ainda não têm. Devolve os novos.
+    """
+    tz = "max(timezone)" if with_timezone else "NULL::VARCHAR"
+    coords = f"""
+        SELECT round(latitude, 4) AS latitude, round(longitude, 4) AS longitude, {tz} AS timezone
+        FROM {source}
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        GROUP BY 1, 2
+    """
+    n = con.execute(
+        f"""
+        INSERT INTO raw.locations (latitude, longitude, timezone)
+        SELECT s.latitude, s.longitude, s.timezone
+        FROM ({coords}) AS s
+        ANTI JOIN raw.locations AS l USING (latitude, longitude)
+        ORDER BY s.latitude, s.longitude;
+        """
+    ).fetchone()[0]
+    if with_timezone:
+        con.execute(
+            f"""
+            UPDATE raw.locations AS l SET timezone = s.timezone
+            FROM ({coords}) AS s
+            WHERE l.latitude = s.latitude AND l.longitude = s.longitude
+              AND l.timezone IS NULL AND s.timezone IS NOT NULL;
+            """
+        )
+    return int(n)
+
+def location_id(con: duckdb.DuckDBPyConnection, lat: float, lon: float) -> Optional[int]:
+    """location_id das coordenadas (normalizadas aqui) ou None se o local não foi cadastrado."""
+    lat, lon = norm_latlon(lat, lon)
+    row = con.execute(
+        "SELECT location_id FROM raw.locations WHERE latitude = ? AND longitude = ?", [lat, lon]
+    ).fetchone()
+    return None if row is None else int(row[0])
@@ -0,0 +1,125 @@
+# src/storage/timezones.py
+# Fuso horário por local, em camadas (da mais barata para a mais cara):
+# 1) LRU em memória do processo (só fusos vindos do banco ou da rede)
+# 2) raw.locations (a ingestão grava o 'timezone' que vem em cada payload da Open-Meteo)
+# 3) estimativa OFFLINE: cidade de referência mais próxima do zone1970.tab (pacote tzdata),
+#    só se estiver a até OFFLINE_MAX_KM (fronteiras de fuso longe das cidades são ambíguas)
+# 4) rede (Open-Meteo, timezone=auto) como último recurso
+# Se nada responder, devolve "UTC" com source="fallback" (não entra no cache)
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from importlib import resources
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import requests
+
+from src.storage.db import DB_PATH, get_db
+from src.storage.locations import location_id, norm_latlon
+
+FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+TZ_CACHE_SIZE = 4096
+OFFLINE_MAX_KM = 500.0
+NETWORK_TIMEOUT_S = 3.0
+
+_COORD = re.compile(r"([+-])(\d{2})(\d{2})(\d{2})?([+-])(\d{3})(\d{2})(\d{2})?")
+
+def _dms(sign: str, deg: str, minutes: str, seconds: Optional[str]) -> float:
+    v = int(deg) + int(minutes) / 60 + int(seconds or 0) / 3600
+    return -v if sign == "-" else v
+
+@lru_cache(maxsize=1)
+def _zone_table() -> Tuple[np.ndarray, np.ndarray, list]:
+    """(lat_rad, lon_rad, nomes) das cidades de referência de cada fuso (zone1970.tab)."""
+    text = (resources.files("tzdata") / "zoneinfo" / "zone1970.tab").read_text(encoding="utf-8")
+    lats, lons, names = [], [], []
+    for line in text.splitlines():
+        if line.startswith("#") or not line.strip():
+            continue
+        _, coords, name = line.split("\t")[:3]
+        m = _COORD.fullmatch(coords)
+        lats.append(_dms(*m.group(1, 2, 3, 4)))
+        lons.append(_dms(*m.group(5, 6, 7, 8)))
+        names.append(name)
+    return np.radians(lats), np.radians(lons), names
+
+def offline_timezone(lat: float, lon: float, max_km: float = OFFLINE_MAX_KM) -> Optional[str]:
+    """Fuso da cidade de referência mais próxima (haversine), ou None se longe demais."""
+    lat_r, lon_r, names = _zone_table()
+    p, l = np.radians(lat), np.radians(lon)
+    a = np.sin((lat_r - p) / 2) ** 2 + np.cos(p) * np.cos(lat_r) * np.sin((lon_r - l) / 2) ** 2
+    km = 2 * 6371.0 * np.arcsin(np.sqrt(a))
+    i = int(np.argmin(km))
+    return names[i] if km[i] <= max_km else None
+
+def db_timezone(lat: float, lon: float, db_path: Optional[Path] = None, read_only: bool = True) -> Optional[str]:
+    """Fuso gravado em raw.locations (None se o local/tabela ainda não existe)."""
+    path = Path(db_path or DB_PATH)
+    if not path.exists():
+        return None
+    try:
+        with get_db(path, read_only=read_only).cursor() as cur:
+            loc_id = location_id(cur, lat, lon)
+            if loc_id is None:
+                return None
+            return cur.execute(
+                "SELECT timezone FROM raw.locations WHERE location_id = ?", [loc_id]
+            ).fetchone()[0]
+    except Exception:
+        return None
+
+def network_timezone(lat: float, lon: float, timeout: float = NETWORK_TIMEOUT_S) -> Optional[str]:
+    """Pergunta à Open-Meteo (não grava nada)."""
+    try:
+        r = requests.get(
+            FORECAST_URL,
+            params={"latitude": lat, "longitude": lon, "current_weather": "true", "timezone": "auto"},
+            timeout=timeout,
+        )
+        r.raise_for_status()
+        return r.json().get("timezone")
+    except Exception:
+        return None
+
+_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _remember(key: tuple, tz: str) -> None:
+    with _cache_lock:
+        _cache[key] = tz
+        _cache.move_to_end(key)
+        if len(_cache) > TZ_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def timezone_for(
+    lat: float, lon: float, db_path: Optional[Path] = None, read_only: bool = True
+) -> Tuple[str, str]:
+    """
+    (timezone, source) do local; source: "memory" | "db" | "offline" | "network" | "fallback" (UTC).
+    Só respostas do banco/rede entram no LRU: estimativa offline e UTC são refeitas, para que o
+    fuso gravado pela próxima coleta passe a valer.
+    read_only=False quando chamado de dentro da API (mesmo processo que escreve no banco).
+    """
+    lat, lon = norm_latlon(lat, lon)
+    key = (lat, lon)
+    with _cache_lock:
+        tz = _cache.get(key)
+        if tz is not None:
+            _cache.move_to_end(key)
+            return tz, "memory"
+    tz = db_timezone(lat, lon, db_path, read_only)
+    if tz:
+        _remember(key, tz)
+        return tz, "db"
+    tz = offline_timezone(lat, lon)
+    if tz:
+        return tz, "offline"
+    tz = network_timezone(lat, lon)
+    if tz:
+        _remember(key, tz)
+        return tz, "network"
+    return "UTC", "fallback"
@@ -0,0 +1,287 @@
+# src/training/backtest.py
+# Backtest walk-forward do modelo sobre refined.weather_features.
+# - Folds por TEMPO (todas as cidades juntas): janela de teste de --test-days, andando até
+#   o fim dos dados; treino expanding (tudo antes do teste) ou sliding (--train-days antes)
+# - Purga: o treino termina max(horizonte) horas antes do teste (alvo do treino não cai no teste)
+# - Folds em paralelo (ProcessPoolExecutor): as matrizes vão UMA vez para .npy temporários e
+#   cada worker abre com mmap (sem copiar/picklar os dados por fold); linhas ordenadas por ts,
+#   então treino e teste de cada fold são fatias contíguas
+# - MAE/RMSE por fold, horizonte e local (+ total do fold), com o baseline de persistência,
+#   gravados em eval.backtest_runs / eval.backtest_results
+# Uso: python src/training/backtest.py --folds 6 --test-days 30 [--mode sliding --train-days 365]
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from src.processing.features import FEATURE_COLS, TARGETS, target_horizons
+from src.storage.db import get_db
+from src.training.dataset import load_training_data
+from src.training.engines import DEFAULT_ENGINE, ENGINES, engine_params, fit_model, make_model
+
+DB_PATH = Path("data") / "rt_weather.duckdb"
+MODES = ("expanding", "sliding")
+# rf: floresta mais leve que a do train.py por padrão (cada fold treina um modelo inteiro):
+# 100 árvores com até 20k linhas cada (bootstrap) ~ 75s por fold por núcleo no nosso teste,
+# com anos de dados de muitas cidades. --n-estimators 300 --max-samples 0 = train.py.
+# Os demais motores (--engine hgb | linear) usam os parâmetros do train.py
+BACKTEST_TREES = 100
+MAX_SAMPLES = 20_000
+MIN_TRAIN_ROWS = 500
+RESULT_COLS = [
+    "run_id", "fold", "latitude", "longitude", "horizon_h", "train_start", "train_end",
+    "test_start", "test_end", "n_train", "n_test", "mae", "rmse", "mae_naive", "rmse_naive",
+]
+
+
+def _ensure_tables(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute("CREATE SCHEMA IF NOT EXISTS eval;")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS eval.backtest_runs (
+            run_id VARCHAR PRIMARY KEY,
+            created_at TIMESTAMP,
+            mode VARCHAR,            -- expanding | sliding
+            folds INTEGER,
+            test_hours INTEGER,
+            train_hours INTEGER,     -- NULL no modo expanding
+            params VARCHAR,          -- JSON (modelo + max_samples)
+            rows BIGINT,
+            locations INTEGER,
+            elapsed_s DOUBLE
+        );
+        """
+    )
+    # motor do modelo (rf | hgb | linear, training/engines.py); runs antigas = rf
+    con.execute("ALTER TABLE eval.backtest_runs ADD COLUMN IF NOT EXISTS engine VARCHAR DEFAULT 'rf';")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS eval.backtest_results (
+            run_id VARCHAR,
+            fold INTEGER,
+            latitude DOUBLE,         -- NULL = todos os locais do fold
+            longitude DOUBLE,
+            horizon_h INTEGER,
+            train_start TIMESTAMP,
+            train_end TIMESTAMP,
+            test_start TIMESTAMP,
+            test_end TIMESTAMP,
+            n_train BIGINT,
+            n_test BIGINT,
+            mae DOUBLE,
+            rmse DOUBLE,
+            mae_naive DOUBLE,
+            rmse_naive DOUBLE
+        );
+        """
+    )
+
+
+def load_matrix(db_path: Path = DB_PATH) -> dict:
+    """refined.weather_features ordenada por ts, já como arrays (X em float32)."""
+    data = load_training_data(db_path)
+    return {
+        "hours": data.ts.astype("datetime64[h]").astype(np.int64),
+        "loc": data.loc,
+        "X": data.X,
+        "Y": data.Y,
+        "w": data.w,
+        "locs": data.locations,
+    }
+
+
+def fold_bounds(hours: np.ndarray, folds: int, test_hours: int, mode: str,
+                train_hours: int, purge_hours: int) -> list:
+    """
+    Limites [início, fim) em horas de cada fold, do mais antigo ao mais recente, e as fatias
+    de linhas correspondentes (hours ordenado). Folds sem treino suficiente ficam de fora.
+    """
+    end = int(hours[-1]) + 1
+    out = []
+    for k in range(folds):
+        test_end = end - (folds - 1 - k) * test_hours
+        test_start = test_end - test_hours
+        train_end = test_start - purge_hours
+        train_start = int(hours[0]) if mode == "expanding" else train_end - train_hours
+        tr = np.searchsorted(hours, [train_start, train_end])
+        te = np.searchsorted(hours, [test_start, test_end])
+        if tr[1] - tr[0] < MIN_TRAIN_ROWS or te[1] == te[0]:
+            continue
+        out.append({
+            "fold": k,
+            "train": (int(tr[0]), int(tr[1])),
+            "test": (int(te[0]), int(te[1])),
+            "hours": (train_start, train_end, test_start, test_end),
+        })
+    return out
+
+
+# --- worker ---------------------------------------------------------------
+_ARR: dict = {}
+
+
+def _init_worker(paths: dict) -> None:
+    for name, path in paths.items():
+        _ARR[name] = np.load(path, mmap_mode="r")
+
+
+def _errors(y_true: np.ndarray, y_pred: np.ndarray, loc: np.ndarray, n_locs: int):
+    """Somas de erro absoluto/quadrático por (local, horizonte) via bincount."""
+    err = y_pred - y_true
+    abs_sum = np.stack([np.bincount(loc, np.abs(err[:, j]), n_locs) for j in range(err.shape[1])], 1)
+    sq_sum = np.stack([np.bincount(loc, err[:, j] ** 2, n_locs) for j in range(err.shape[1])], 1)
+    return abs_sum, sq_sum
+
+
+def run_fold(fold: dict, engine: str, params: dict, n_locs: int) -> dict:
+    """Treina e avalia um fold (no worker, sobre as fatias mmap)."""
+    (a, b), (c, d) = fold["train"], fold["test"]
+    X, Y, w, loc = _ARR["X"], _ARR["Y"], _ARR["w"], _ARR["loc"]
+    params = dict(params)
+    if params.get("max_samples") and params["max_samples"] >= b - a:
+        params["max_samples"] = None
+    model = make_model(engine, n_outputs=Y.shape[1], n_jobs=1, **params)
+    fit_model(model, X[a:b], np.asarray(Y[a:b]), sample_weight=w[a:b])
+    y_true = np.asarray(Y[c:d])
+    y_pred = model.predict(X[c:d]).reshape(d - c, -1)
+    # persistência: y_hat = temp_lag_1h para todos os horizontes (mesmo baseline do train.py)
+    naive = np.repeat(np.asarray(X[c:d, FEATURE_COLS.index("temp_lag_1h")], np.float64)[:, None], Y.shape[1], 1)
+    loc_te = np.asarray(loc[c:d])
+    abs_m, sq_m = _errors(y_true, y_pred, loc_te, n_locs)
+    abs_n, sq_n = _errors(y_true, naive, loc_te, n_locs)
+    return {
+        **fold,
+        "n_train": b - a,
+        "n_test_loc": np.bincount(loc_te, minlength=n_locs),
+        "n_train_loc": np.bincount(np.asarray(loc[a:b]), minlength=n_locs),
+        "abs": abs_m, "sq": sq_m, "abs_naive": abs_n, "sq_naive": sq_n,
+    }
+
+
+# --- agregação / gravação -------------------------------------------------
+def fold_rows(run_id: str, res: dict, locs: list, horizons: list) -> list:
+    """Linhas de eval.backtest_results (RESULT_COLS): por local e o total do fold (lat/lon NULL)."""
+    ts = [pd.Timestamp(np.datetime64(h, "h")) for h in res["hours"]]
+    n_te = res["n_test_loc"]
+    groups = [(float(lat), float(lon), np.array([i])) for i, (lat, lon) in enumerate(locs) if n_te[i] > 0]
+    groups.append((None, None, np.flatnonzero(n_te > 0)))
+    rows = []
+    for lat, lon, idx in groups:
+        n = int(n_te[idx].sum())
+        n_train = int(res["n_train_loc"][idx].sum()) if lat is not None else res["n_train"]
+        for j, h in enumerate(horizons):
+            rows.append((
+                run_id, res["fold"], lat, lon, h, *ts, n_train, n,
+                res["abs"][idx, j].sum() / n, np.sqrt(res["sq"][idx, j].sum() / n),
+                res["abs_naive"][idx, j].sum() / n, np.sqrt(res["sq_naive"][idx, j].sum() / n),
+            ))
+    return rows
+
+
+def _save(con: duckdb.DuckDBPyConnection, run: tuple, res: pd.DataFrame) -> None:
+    _ensure_tables(con)
+    con.register("res_tmp", res)
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        con.execute(
+            "INSERT INTO eval.backtest_runs (run_id, created_at, mode, folds, test_hours, train_hours, "
+            "params, rows, locations, elapsed_s, engine) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            run,
+        )
+        con.execute(f"INSERT INTO eval.backtest_results SELECT {', '.join(RESULT_COLS)} FROM res_tmp")
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        raise
+    finally:
+        con.unregister("res_tmp")
+
+
+def main(mode: str = "expanding", folds: int = 6, test_days: int = 30, train_days: int = 365,
+         n_estimators: int = BACKTEST_TREES, max_samples: int = MAX_SAMPLES,
+         workers: int = 0, engine: str = DEFAULT_ENGINE):
+    t0 = time.perf_counter()
+    data = load_matrix()
+    if len(data["hours"]) < MIN_TRAIN_ROWS:
+        print("[WARN] poucas linhas em refined.weather_features: rode prepare_data.py antes.")
+        return
+    horizons = target_horizons(TARGETS)
+    test_hours, train_hours = test_days * 24, train_days * 24
+    bounds = fold_bounds(data["hours"], folds, test_hours, mode, train_hours, max(horizons))
+    if not bounds:
+        print("[WARN] nenhum fold com treino suficiente: reduza --folds/--test-days.")
+        return
+    if engine == "rf":
+        params = engine_params(engine, n_estimators=n_estimators, max_samples=max_samples or None)
+    else:
+        params = engine_params(engine)
+    locs = data.pop("locs")
+    n_rows = len(data["hours"])
+    workers = min(len(bounds), workers or os.cpu_count() or 1)
+    print(f"[OK] {n_rows} linhas, {len(locs)} locais, {len(bounds)} folds ({mode}, {engine}), {workers} workers")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="backtest-") as tmp:
+        paths = {}
+        for name, arr in data.items():
+            paths[name] = os.path.join(tmp, f"{name}.npy")
+            np.save(paths[name], arr)
+        del data
+        if workers == 1:
+            _init_worker(paths)
+            results = [run_fold(f, engine, params, len(locs)) for f in bounds]
+        else:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(paths,)) as pool:
+                futures = [pool.submit(run_fold, f, engine, params, len(locs)) for f in bounds]
+                results = [f.result() for f in futures]
+
+    run_id = uuid.uuid4().hex[:12]
+    res = pd.DataFrame(
+        [r for out in results for r in fold_rows(run_id, out, locs, horizons)], columns=RESULT_COLS
+    )
+    elapsed = time.perf_counter() - t0
+    run = (
+        run_id, pd.Timestamp.utcnow().tz_localize(None), mode, len(bounds), test_hours,
+        train_hours if mode == "sliding" else None, json.dumps(params), n_rows, len(locs), elapsed,
+        engine,
+    )
+    get_db(DB_PATH).write(_save, run, res)
+
+    # resumo: total de cada fold por horizonte + média/desvio entre folds
+    total = res[res["latitude"].isna()]
+    print(total.pivot(index="fold", columns="horizon_h", values="mae").round(3).to_string())
+    summary = total.groupby("horizon_h")[["mae", "rmse", "mae_naive", "rmse_naive"]].agg(["mean", "std"])
+    print(summary.round(3).to_string())
+    print(f"[OK] backtest {run_id}: {len(res)} linhas em eval.backtest_results ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=MODES, default="expanding",
+                    help="expanding: treino desde o início; sliding: só --train-days antes do teste")
+    ap.add_argument("--folds", type=int, default=6)
+    ap.add_argument("--test-days", type=int, default=30, help="tamanho da janela de teste de cada fold")
+    ap.add_argument("--train-days", type=int, default=365, help="janela de treino (modo sliding)")
+    ap.add_argument("--engine", choices=ENGINES, default=DEFAULT_ENGINE,
+                    help="motor do modelo (ver training/engines.py)")
+    ap.add_argument("--n-estimators", type=int, default=BACKTEST_TREES, help="só rf")
+    ap.add_argument("--max-samples", type=int, default=MAX_SAMPLES,
+                    help="só rf: linhas por árvore (bootstrap); 0 = todas")
+    ap.add_argument("--workers", type=int, default=0, help="processos (padrão: nº de CPUs)")
+    args = ap.parse_args()
+    main(args.mode, args.folds, args.test_days, args.train_days, args.n_estimators,
+         args.max_samples, args.workers, args.engine)
@@ -0,0 +1,140 @@
+# src/training/benchmark_engines.py
+# Compara os motores de training/engines.py no MESMO split temporal do train.py (80/20 por ts).
+# - Por motor: tempo de fit, latência de predict (1 linha e lote de --batch-size linhas,
+#   p50/p99 sobre --repeats chamadas), tamanho do modelo serializado (joblib, sem compressão)
+#   e MAE por horizonte (+ média)
+# - Não grava nada no registro: só imprime a tabela (e, com --json, salva o resultado)
+# Uso: python src/training/benchmark_engines.py [--engines rf hgb linear] [--start 2024-01-01]
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import duckdb
+import joblib
+import numpy as np
+
+from src.processing.features import target_horizons
+from src.training.dataset import load_training_data
+from src.training.engines import ENGINES, fit_model, make_model
+from src.training.train import time_split
+
+DB_PATH = Path("data") / "rt_weather.duckdb"
+REPEATS = 200
+BATCH_SIZE = 256
+
+
+def _latency_ms(model, X: np.ndarray, repeats: int) -> tuple:
+    """p50/p99 (ms) de model.predict(X) em 'repeats' chamadas (após uma de aquecimento)."""
+    model.predict(X)
+    t = np.empty(repeats)
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        model.predict(X)
+        t[i] = time.perf_counter() - t0
+    p50, p99 = np.percentile(t * 1000, [50, 99])
+    return float(p50), float(p99)
+
+
+def _size_mb(model) -> float:
+    fd, path = tempfile.mkstemp(suffix=".pkl")
+    os.close(fd)
+    try:
+        joblib.dump(model, path)
+        return os.path.getsize(path) / 1e6
+    finally:
+        os.remove(path)
+
+
+def bench_engine(engine: str, data, cut: int, repeats: int = REPEATS, batch_size: int = BATCH_SIZE) -> dict:
+    Xtr, Ytr, wtr = data.X[:cut], data.Y[:cut], data.w[:cut]
+    Xte, Yte = data.X[cut:], data.Y[cut:]
+
+    t0 = time.perf_counter()
+    model = fit_model(make_model(engine, n_outputs=len(data.targets)), Xtr, Ytr, sample_weight=wtr)
+    fit_s = time.perf_counter() - t0
+
+    Y_pred = model.predict(Xte).reshape(len(Xte), -1)
+    mae = np.abs(Y_pred - Yte).mean(axis=0)
+
+    # latência: 1 linha (caso /predict) e um lote (caso /predict/batch), linhas do teste
+    row = Xte[-1:]
+    batch = Xte[-min(batch_size, len(Xte)):]
+    p50_1, p99_1 = _latency_ms(model, row, repeats)
+    p50_b, p99_b = _latency_ms(model, batch, max(1, repeats // 4))
+    return {
+        "engine": engine,
+        "fit_s": round(fit_s, 2),
+        "predict_1_p50_ms": round(p50_1, 3),
+        "predict_1_p99_ms": round(p99_1, 3),
+        "batch_rows": len(batch),
+        "predict_batch_p50_ms": round(p50_b, 3),
+        "predict_batch_p99_ms": round(p99_b, 3),
+        "size_mb": round(_size_mb(model), 3),
+        "mae": {f"{h}h": round(float(m), 3) for h, m in zip(target_horizons(data.targets), mae)},
+        "mae_mean": round(float(mae.mean()), 3),
+    }
+
+
+def print_table(results: list) -> None:
+    horizons = list(results[0]["mae"])
+    head = (
+        f"{'motor':<8}{'fit s':>9}{'1 p50 ms':>10}{'1 p99 ms':>10}{'lote p50':>10}{'lote p99':>10}"
+        f"{'MB':>9}" + "".join(f"{'MAE ' + h:>10}" for h in horizons) + f"{'MAE méd':>10}"
+    )
+    print(head)
+    print("-" * len(head))
+    for r in results:
+        print(
+            f"{r['engine']:<8}{r['fit_s']:>9.2f}{r['predict_1_p50_ms']:>10.3f}{r['predict_1_p99_ms']:>10.3f}"
+            f"{r['predict_batch_p50_ms']:>10.3f}{r['predict_batch_p99_ms']:>10.3f}{r['size_mb']:>9.3f}"
+            + "".join(f"{r['mae'][h]:>10.3f}" for h in horizons)
+            + f"{r['mae_mean']:>10.3f}"
+        )
+
+
+def main(engines=ENGINES, start=None, end=None, locations=None, repeats: int = REPEATS,
+         batch_size: int = BATCH_SIZE, json_path=None):
+    try:
+        data = load_training_data(DB_PATH, start, end, locations)
+    except duckdb.CatalogException:
+        raise SystemExit("refined.weather_features não existe: rode src/processing/prepare_data.py")
+    if len(data) < 100:
+        raise SystemExit(f"poucos dados para o benchmark ({len(data)} linhas).")
+    cut = time_split(len(data))
+    print(f"[OK] {len(data)} linhas (treino {cut}, teste {len(data) - cut}), alvos={data.targets}")
+
+    results = []
+    for engine in engines:
+        results.append(bench_engine(engine, data, cut, repeats, batch_size))
+        print(f"[OK] {engine}: fit {results[-1]['fit_s']}s, MAE médio {results[-1]['mae_mean']}°C")
+    print()
+    print_table(results)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[OK] resultado salvo em {json_path}")
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark dos motores de modelo")
+    ap.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    ap.add_argument("--start", help="início do período (UTC, ex.: 2024-01-01)")
+    ap.add_argument("--end", help="fim do período (exclusivo)")
+    ap.add_argument("--location", action="append", metavar="LAT,LON",
+                    help="só estes locais (repetível)")
+    ap.add_argument("--repeats", type=int, default=REPEATS, help="chamadas de predict por medida")
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="linhas do lote")
+    ap.add_argument("--json", dest="json_path", help="salva o resultado neste arquivo")
+    args = ap.parse_args()
+    locs = [tuple(float(v) for v in loc.split(",")) for loc in args.location or []]
+    main(args.engines, args.start, args.end, locs or None, args.repeats, args.batch_size, args.json_path)
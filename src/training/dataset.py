@@ -0,0 +1,158 @@
+# src/training/dataset.py
+# Carregador de dados de treino direto do DuckDB para matrizes NumPy (sem DataFrame).
+# - Projeção: só ts, local, feature_cols e alvos saem da tabela
+# - Filtros de período (ts) e de locais vão no WHERE (o DuckDB pula blocos pelos zonemaps)
+# - Máscara de imputação resolvida no SQL: linha com alvo imputado não sai do banco e o
+#   peso (1.0 / IMPUTED_WEIGHT) já vem calculado
+# - Ordem por ts sem ORDER BY no banco: 1ª passada lê só ts e calcula a posição final de
+#   cada linha; na 2ª, X (float32, C-contígua) é alocada UMA vez e cada lote Arrow
+#   (RecordBatch) é escrito direto nas suas linhas: pico ~ X + Y + índices + um lote
+#   (o cache de blocos do DuckDB fica à parte, limitado pelo memory_limit do banco)
+# - As duas passadas precisam varrer na mesma ordem (preserve_insertion_order; no lake, a
+#   ordem do glob): a 2ª relê ts e confere nº de linhas e ts de cada posição final — se
+#   divergir, levanta erro em vez de espalhar X/Y nas linhas erradas
+# - lake=True: lê o Parquet particionado por local/mês (storage/lake.py) no lugar da tabela;
+#   local e período viram filtros de partição (só os arquivos do local/meses são abertos)
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from src.processing.features import FEATURE_COLS, MASK_BITS, MASK_COL, TARGETS
+from src.storage import lake as parquet_lake
+from src.storage.db import get_db
+
+DB_PATH = Path("data") / "rt_weather.duckdb"
+SOURCE = "refined.weather_features"
+BATCH_ROWS = 256_000
+# peso no fit das linhas com alguma entrada imputada (prepare_data.py --gaps ffill/interpolate)
+IMPUTED_WEIGHT = 0.5
+_SCAN_MISMATCH = "load_training_data: as duas leituras divergiram ({}); ordem de varredura diferente entre elas"
+
+
+class TrainingData:
+    """Matrizes de treino ordenadas por ts: X (float32), Y (float64), pesos, hora e local."""
+
+    def __init__(self, X, Y, w, ts, loc, locations: list, feature_cols: list, targets: list):
+        self.X = X
+        self.Y = Y
+        self.w = w
+        self.ts = ts
+        self.loc = loc
+        self.locations = locations
+        self.feature_cols = feature_cols
+        self.targets = targets
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __repr__(self) -> str:
+        return f"TrainingData(rows={len(self)}, features={self.X.shape[1]}, targets={self.targets})"
+
+
+def _where(start, end, locations) -> tuple:
+    """Cláusula WHERE + parâmetros (período [start, end) e lista de (lat, lon))."""
+    conds, params = [], []
+    if start is not None:
+        conds.append("ts >= CAST(? AS TIMESTAMP)")
+        params.append(str(start))
+    if end is not None:
+        conds.append("ts < CAST(? AS TIMESTAMP)")
+        params.append(str(end))
+    if locations:
+        conds.append("(" + " OR ".join("(latitude = ? AND longitude = ?)" for _ in locations) + ")")
+        params += [float(v) for lat_lon in locations for v in lat_lon]
+    return (" AND ".join(conds) or "TRUE"), params
+
+
+def load_training_data(
+    db_path: Path = DB_PATH,
+    start=None,
+    end=None,
+    locations: Optional[list] = None,
+    feature_cols: Optional[list] = None,
+    targets: Optional[list] = None,
+    source: str = SOURCE,
+    lake: bool = False,
+) -> TrainingData:
+    """
+    Lê 'source' (padrão refined.weather_features) ordenado por ts.
+    start/end: período [start, end) em UTC (str/date/Timestamp); locations: [(lat, lon), ...].
+    lake=True: lê data/refined/weather_features (Parquet por local/mês) em vez de 'source'.
+    """
+    feature_cols = list(feature_cols or FEATURE_COLS)
+    targets = list(targets or TARGETS)
+    where, params = _where(start, end, locations)
+    if lake:
+        source = parquet_lake.relation("features")
+        where += " AND " + parquet_lake.month_filter(start, end)
+    target_bits = sum(1 << MASK_BITS[t] for t in targets)
+    where += f" AND ({MASK_COL} & {target_bits}) = 0"
+    cols = (
+        ["ts", "latitude", "longitude"]
+        + feature_cols
+        + targets
+        + [f"CASE WHEN {MASK_COL} = 0 THEN 1.0 ELSE {IMPUTED_WEIGHT} END AS w"]
+    )
+    with get_db(db_path).cursor() as cur:
+        # mesma transação nas duas leituras: a ordem de varredura (ordem de inserção,
+        # preserve_insertion_order) é a mesma nas duas
+        cur.execute("BEGIN TRANSACTION;")
+        try:
+            # 1ª passada, só ts: posição final de cada linha na ordem por ts (sem ORDER BY no
+            # banco, que materializaria a tabela inteira para ordenar)
+            ts_scan = np.concatenate(
+                [np.zeros(0, dtype="datetime64[us]")]
+                + [
+                    b.column(0).to_numpy(zero_copy_only=False)
+                    for b in cur.execute(
+                        f"SELECT ts FROM {source} WHERE {where}", params
+                    ).fetch_record_batch(BATCH_ROWS)
+                ]
+            ).astype("datetime64[us]")
+            n = len(ts_scan)
+            order = np.argsort(ts_scan, kind="stable")
+            ts = ts_scan[order]
+            dest = np.empty(n, dtype=np.int64)
+            dest[order] = np.arange(n)
+            del ts_scan, order
+
+            # 2ª passada: cada lote vai direto para as suas linhas finais
+            X = np.empty((n, len(feature_cols)), dtype=np.float32)
+            Y = np.empty((n, len(targets)), dtype=np.float64)
+            w = np.empty(n, dtype=np.float64)
+            geo = np.empty(n, dtype=np.complex128)  # lat + i*lon: chave do local num só array
+            ts_check = np.empty(n, dtype="datetime64[us]")
+            reader = cur.execute(
+                f"SELECT {', '.join(cols)} FROM {source} WHERE {where}", params
+            ).fetch_record_batch(BATCH_ROWS)
+            i = 0
+            for batch in reader:
+                m = batch.num_rows
+                if i + m > n:
+                    raise RuntimeError(_SCAN_MISMATCH.format(f"2ª passada com mais de {n} linhas"))
+                rows = dest[i : i + m]
+                arrays = [c.to_numpy(zero_copy_only=False) for c in batch.columns]
+                ts_check[rows] = arrays[0]
+                geo[rows] = arrays[1] + 1j * arrays[2]
+                k = 3
+                for j in range(len(feature_cols)):
+                    X[rows, j] = arrays[k + j]
+                k += len(feature_cols)
+                for j in range(len(targets)):
+                    Y[rows, j] = arrays[k + j]
+                w[rows] = arrays[-1]
+                i += m
+            if i != n:
+                raise RuntimeError(_SCAN_MISMATCH.format(f"{i} linhas na 2ª passada, {n} na 1ª"))
+            # cada coluna de uma linha vai para a mesma posição: basta o ts de cada posição
+            # bater com o ts ordenado (empates de ts entre locais podem trocar de lugar sem erro)
+            if not np.array_equal(ts_check, ts):
+                raise RuntimeError(_SCAN_MISMATCH.format("ts fora de ordem nas posições finais"))
+            del ts_check
+        finally:
+            cur.execute("COMMIT;")
+    # ids de local (0..L-1) por linha + lista (lat, lon) na ordem dos ids
+    uniq, loc = np.unique(geo, return_inverse=True)
+    locs = [(float(g.real), float(g.imag)) for g in uniq]
+    return TrainingData(X, Y, w, ts, loc.astype(np.int32), locs, feature_cols, targets)
@@ -0,0 +1,48 @@
+# src/training/engines.py
+# Motores de modelo intercambiáveis (todos com a interface fit/predict do scikit-learn).
+# - "rf":     RandomForestRegressor, multi-saída nativo (padrão, igual às versões anteriores)
+# - "hgb":    HistGradientBoostingRegressor (histogramas, rápido em poucas features densas);
+#             um modelo por horizonte via MultiOutputRegressor, ainda UM predict por chamada
+# - "linear": Ridge multi-saída (baseline linear)
+# O registro de modelos guarda o motor no meta.json; a inferência só chama model.predict.
+from typing import Optional
+
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.multioutput import MultiOutputRegressor
+
+DEFAULT_ENGINE = "rf"
+
+ENGINE_PARAMS = {
+    "rf": {"n_estimators": 300, "random_state": 42},
+    "hgb": {"max_iter": 300, "learning_rate": 0.1, "random_state": 42},
+    "linear": {"alpha": 1.0},
+}
+ENGINES = tuple(ENGINE_PARAMS)
+
+
+def make_model(engine: str = DEFAULT_ENGINE, n_outputs: int = 1, n_jobs: Optional[int] = -1, **overrides):
+    """
+    Estimador não treinado do motor 'engine' para 'n_outputs' alvos.
+    overrides substituem ENGINE_PARAMS[engine]; n_jobs só vale para o RandomForest.
+    """
+    if engine not in ENGINE_PARAMS:
+        raise ValueError(f"motor inválido: {engine!r} (use {', '.join(ENGINES)})")
+    params = {**ENGINE_PARAMS[engine], **overrides}
+    if engine == "rf":
+        return RandomForestRegressor(**params, n_jobs=n_jobs)
+    if engine == "hgb":
+        model = HistGradientBoostingRegressor(**params)
+        return MultiOutputRegressor(model) if n_outputs > 1 else model
+    return Ridge(**params)
+
+
+def engine_params(engine: str, **overrides) -> dict:
+    """Parâmetros efetivos (gravados no meta.json da versão)."""
+    return {**ENGINE_PARAMS[engine], **overrides}
+
+
+def fit_model(model, X, Y, sample_weight=None):
+    """fit com Y (n, k); com k == 1 passa o vetor (os estimadores esperam y 1-D)."""
+    y = Y if Y.ndim == 1 or Y.shape[1] > 1 else Y[:, 0]
+    return model.fit(X, y, sample_weight=sample_weight)
@@ -1,80 +1,114 @@
 # src/training/train.py
-# Treina RandomForestRegressor para prever temperatura da PRÓXIMA hora (t+1h)
-# Salva: modelo (.pkl), lista de colunas usadas no fit (feature_cols.json)
+# Treina o modelo multi-saída: temperatura em t+1h, t+6h, t+12h e t+24h
+# (alvos diretos de prepare_data.py; um único predict devolve o vetor de horizontes)
+# Motor: --engine rf (RandomForest, padrão) | hgb (HistGradientBoosting) | linear (Ridge),
+# ver training/engines.py; comparação de custo/erro em training/benchmark_engines.py
+# Dados: refined.weather_features lida direto para NumPy (training/dataset.py), com filtros
+# opcionais de período (--start/--end) e de locais (--location lat,lon); --lake lê o Parquet
+# por local/mês (data/refined/weather_features) e abre só os arquivos do filtro
+# Salva: nova versão no registro (models/registry/<versão>: modelo, colunas, métricas,
+# intervalo de dados) + modelo (.pkl) e feature_cols.json nos caminhos antigos
+import argparse
+import sys
 from pathlib import Path
 import json
 
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import duckdb
 import joblib
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import matplotlib.pyplot as plt
 
-REF_PQ = Path("data/refined/weather_features.parquet")
+from src.inference.model_registry import save_model
+from src.processing.features import target_horizons
+from src.training.dataset import load_training_data
+from src.training.engines import DEFAULT_ENGINE, ENGINES, engine_params, fit_model, make_model
+
 MODEL_DIR = Path("models")
 DOCS_DIR = Path("docs")
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 DOCS_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def time_split(df: pd.DataFrame, test_size: float = 0.2):
-    """Split temporal: primeiras linhas = treino, últimas = teste."""
-    n = len(df)
-    cut = int(n * (1 - test_size))
-    return df.iloc[:cut], df.iloc[cut:]
+def time_split(n: int, test_size: float = 0.2) -> int:
+    """Split temporal (linhas ordenadas por ts): índice do corte treino | teste."""
+    return int(n * (1 - test_size))
 
 
-def main():
-    if not REF_PQ.exists():
+def main(start=None, end=None, locations=None, engine: str = DEFAULT_ENGINE, lake: bool = False):
+    # refined.weather_features (prepare_data.py) direto para NumPy: X float32 contígua,
+    # ordenada por ts, só com as colunas/período/locais pedidos
+    try:
+        data = load_training_data(start=start, end=end, locations=locations, lake=lake)
+    except (duckdb.CatalogException, duckdb.IOException):
         raise FileNotFoundError(
-            f"Arquivo de features não encontrado: {REF_PQ}. "
+            "Tabela refined.weather_features não encontrada. "
             "Rode: python src/processing/prepare_data.py"
         )
-
-    df = pd.read_parquet(REF_PQ)
-
-    # X (features) e y (alvo)
-    y = df["temp_t_plus_1h"]
-    X = df.drop(columns=["temp_t_plus_1h", "ts"], errors="ignore")
-
-    # Guarda as colunas usadas no fit
-    feature_cols = X.columns.tolist()
-
-    # Split temporal
-    df_xy = pd.concat([X, y], axis=1)
-    train, test = time_split(df_xy, test_size=0.2)
-    Xtr, ytr = train.iloc[:, :-1], train.iloc[:, -1]
-    Xte, yte = test.iloc[:, :-1], test.iloc[:, -1]
-
-    # Baseline: persistência (y_hat = temp_lag_1h)
-    if "temp_lag_1h" in Xte.columns:
-        y_pred_naive = Xte["temp_lag_1h"].values
-        mae_n = mean_absolute_error(yte, y_pred_naive)
-        rmse_n = np.sqrt(mean_squared_error(yte, y_pred_naive))
-        print(f"Baseline (persistência) -> MAE={mae_n:.2f}°C | RMSE={rmse_n:.2f}°C")
-    else:
-        mae_n = rmse_n = np.nan
+    if len(data) == 0:
+        print("[WARN] nenhuma linha de features no filtro informado.")
+        return
+    feature_cols, targets = data.feature_cols, data.targets
+    horizons = target_horizons(targets)
+
+    data_range = {
+        "ts_min": data.ts[0],
+        "ts_max": data.ts[-1],
+        "rows": len(data),
+        "locations": len(data.locations),
+        "filter": {"start": start, "end": end, "locations": locations},
+        "source": "lake" if lake else "duckdb",
+    }
+
+    # Split temporal: fatias (views) da mesma matriz, sem cópia
+    cut = time_split(len(data), test_size=0.2)
+    Xtr, Ytr, wtr = data.X[:cut], data.Y[:cut], data.w[:cut]
+    Xte, Yte = data.X[cut:], data.Y[cut:]
+
+    # Modelo multi-saída (rf: cada folha guarda o vetor de horizontes)
+    params = engine_params(engine)
+    model = fit_model(make_model(engine, n_outputs=len(targets)), Xtr, Ytr, sample_weight=wtr)
+    Y_pred = model.predict(Xte).reshape(len(Xte), -1)
+
+    # Métricas por horizonte; baseline: persistência (y_hat = temp_lag_1h)
+    has_naive = "temp_lag_1h" in feature_cols
+    if not has_naive:
         print("Baseline indisponível (faltou coluna temp_lag_1h).")
-
-    # Modelo
-    rf = RandomForestRegressor(n_estimators=300, random_state=42, n_jobs=-1)
-    rf.fit(Xtr, ytr)
-
-    y_pred = rf.predict(Xte)
-    mae = mean_absolute_error(yte, y_pred)
-    rmse = np.sqrt(mean_squared_error(yte, y_pred))
-    print(f"RandomForest -> MAE={mae:.2f}°C | RMSE={rmse:.2f}°C")
+    by_horizon = {}
+    for i, (t, h) in enumerate(zip(targets, horizons)):
+        yte = Yte[:, i]
+        m = {
+            "mae": float(mean_absolute_error(yte, Y_pred[:, i])),
+            "rmse": float(np.sqrt(mean_squared_error(yte, Y_pred[:, i]))),
+            "mae_naive": np.nan,
+            "rmse_naive": np.nan,
+        }
+        if has_naive:
+            y_naive = Xte[:, feature_cols.index("temp_lag_1h")]
+            m["mae_naive"] = float(mean_absolute_error(yte, y_naive))
+            m["rmse_naive"] = float(np.sqrt(mean_squared_error(yte, y_naive)))
+        by_horizon[f"{h}h"] = m
+        print(
+            f"t+{h}h -> {engine} MAE={m['mae']:.2f}°C RMSE={m['rmse']:.2f}°C | "
+            f"persistência MAE={m['mae_naive']:.2f}°C RMSE={m['rmse_naive']:.2f}°C"
+        )
+    yte, y_pred = Yte[:, 0], Y_pred[:, 0]
+    if has_naive:
+        y_pred_naive = Xte[:, feature_cols.index("temp_lag_1h")]
 
     # Gráfico comparando real vs previsões (janela final)
     last = min(120, len(yte))
     plt.figure(figsize=(9, 4))
-    plt.plot(range(last), yte.values[-last:], label="Real")
-    plt.plot(range(last), y_pred[-last:], label="RF")
-    if not np.isnan(mae_n):
+    plt.plot(range(last), yte[-last:], label="Real")
+    plt.plot(range(last), y_pred[-last:], label=engine)
+    if has_naive:
         plt.plot(range(last), y_pred_naive[-last:], label="Persistência")
     plt.legend()
-    plt.title("Real vs Previsões (janela final)")
+    plt.title(f"Real vs Previsões t+{horizons[0]}h (janela final)")
     out_img = DOCS_DIR / "forecast_compare.png"
     plt.savefig(out_img, bbox_inches="tight")
     plt.close()
@@ -82,15 +116,40 @@ def main():
 
     # Salva modelo + colunas
     model_path = MODEL_DIR / "model_rf_temp_next_hour.pkl"
-    joblib.dump(rf, model_path)
+    joblib.dump(model, model_path)
     with open(MODEL_DIR / "feature_cols.json", "w", encoding="utf-8") as f:
         json.dump(feature_cols, f, ensure_ascii=False, indent=2)
 
+    # mae/rmse no topo = primeiro horizonte (t+1h), como nas versões anteriores
+    metrics = {
+        **by_horizon[f"{horizons[0]}h"],
+        "by_horizon": by_horizon,
+        "n_train": int(len(Xtr)),
+        "n_test": int(len(Xte)),
+    }
+    data_range["test_start"] = data.ts[cut] if len(Xte) else None
+    version = save_model(
+        model, feature_cols, metrics, data_range, params=params, models_dir=MODEL_DIR,
+        targets=targets, engine=engine,
+    )
+
     print(
         f"[OK] modelo salvo em {model_path}\n"
-        f"[OK] {len(feature_cols)} features salvas em models/feature_cols.json"
+        f"[OK] {len(feature_cols)} features salvas em models/feature_cols.json\n"
+        f"[OK] versão {version} registrada em {MODEL_DIR / 'registry'} (ativa)"
     )
 
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--start", help="início do período de treino (UTC, YYYY-MM-DD)")
+    ap.add_argument("--end", help="fim do período (exclusivo)")
+    ap.add_argument("--location", action="append", metavar="LAT,LON",
+                    help="treina só com estes locais (repetível)")
+    ap.add_argument("--engine", choices=ENGINES, default=DEFAULT_ENGINE,
+                    help="motor do modelo (ver training/engines.py)")
+    ap.add_argument("--lake", action="store_true",
+                    help="lê o Parquet particionado (data/refined/weather_features) em vez da tabela")
+    args = ap.parse_args()
+    locs = [tuple(float(v) for v in loc.split(",")) for loc in args.location or []]
+    main(args.start, args.end, locs or None, args.engine, args.lake)
@@ -0,0 +1,164 @@
+# src/training/train_locations.py
+# Treina UM modelo por local (climas distintos, ex.: São Paulo x Berlim, não dividem a floresta).
+# - Lê refined.weather_features uma vez (training/dataset.py) e separa as linhas por local
+#   (ordem por ts mantida dentro de cada local)
+# - Locais em paralelo (ProcessPoolExecutor): matrizes em .npy temporários abertos com mmap
+#   por cada worker (mesmo esquema do backtest.py); cada worker copia só as linhas do seu local
+# - Split temporal 80/20 por local, métricas por horizonte x persistência, como no train.py
+# - Cada local vira uma versão em models/locations/<lat>_<lon>/registry/ (mesmo formato do
+#   registro global, com LATEST próprio); locais com menos de --min-rows linhas ficam sem
+#   modelo próprio e a inferência usa o global (inference/model_registry.py, LocationModels)
+# Uso: python src/training/train_locations.py [--engine rf] [--workers 4] [--location lat,lon]
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import duckdb
+import numpy as np
+
+from src.inference.model_registry import location_dir, save_model
+from src.processing.features import target_horizons
+from src.training.dataset import load_training_data
+from src.training.engines import DEFAULT_ENGINE, ENGINES, engine_params, fit_model, make_model
+from src.training.train import MODEL_DIR, time_split
+
+DB_PATH = Path("data") / "rt_weather.duckdb"
+# ~1 mês de horas: abaixo disso o modelo global (todos os locais) tende a ser melhor
+MIN_ROWS = 24 * 30
+
+# --- worker ---------------------------------------------------------------
+_ARR: dict = {}
+
+
+def _init_worker(paths: dict) -> None:
+    for name, path in paths.items():
+        _ARR[name] = np.load(path, mmap_mode="r")
+
+
+def train_location(task: dict) -> dict:
+    """Treina, avalia e registra o modelo de um local (linhas rows[a:b] do índice por local)."""
+    idx = np.asarray(_ARR["rows"][task["a"]:task["b"]])
+    X, Y, w = _ARR["X"][idx], _ARR["Y"][idx], _ARR["w"][idx]
+    feature_cols, targets, engine = task["feature_cols"], task["targets"], task["engine"]
+    cut = time_split(len(idx))
+    t0 = time.perf_counter()
+    model = fit_model(
+        make_model(engine, n_outputs=len(targets), n_jobs=1), X[:cut], Y[:cut], sample_weight=w[:cut]
+    )
+    fit_s = time.perf_counter() - t0
+
+    Y_pred = model.predict(X[cut:]).reshape(len(idx) - cut, -1)
+    by_horizon = {}
+    naive = X[cut:, feature_cols.index("temp_lag_1h")] if "temp_lag_1h" in feature_cols else None
+    for j, h in enumerate(target_horizons(targets)):
+        err = Y_pred[:, j] - Y[cut:, j]
+        m = {"mae": float(np.abs(err).mean()), "rmse": float(np.sqrt((err ** 2).mean()))}
+        if naive is not None:
+            err_n = naive - Y[cut:, j]
+            m["mae_naive"] = float(np.abs(err_n).mean())
+            m["rmse_naive"] = float(np.sqrt((err_n ** 2).mean()))
+        by_horizon[f"{h}h"] = m
+    first = by_horizon[f"{target_horizons(targets)[0]}h"]
+    metrics = {"mae": first["mae"], "rmse": first["rmse"], "by_horizon": by_horizon, "fit_s": round(fit_s, 2)}
+
+    ts = task["ts"]
+    data_range = {
+        "rows": len(idx),
+        "train_rows": cut,
+        "test_rows": len(idx) - cut,
+        "ts_min": ts[0],
+        "ts_max": ts[1],
+        "test_start": ts[2],
+    }
+    lat, lon = task["location"]
+    version = save_model(
+        model, feature_cols, metrics, data_range, params=engine_params(engine),
+        models_dir=location_dir(lat, lon, task["models_dir"]), targets=targets, engine=engine,
+        location=(lat, lon),
+    )
+    return {"location": (lat, lon), "version": version, "rows": len(idx), **metrics}
+
+
+# --------------------------------------------------------------------------
+def main(start=None, end=None, locations=None, engine: str = DEFAULT_ENGINE,
+         min_rows: int = MIN_ROWS, workers: int = 0, lake: bool = False):
+    t0 = time.perf_counter()
+    try:
+        data = load_training_data(DB_PATH, start, end, locations, lake=lake)
+    except (duckdb.CatalogException, duckdb.IOException):
+        raise SystemExit("refined.weather_features não existe: rode src/processing/prepare_data.py")
+
+    # índice das linhas agrupado por local (argsort estável: cada grupo segue ordenado por ts)
+    rows = np.argsort(data.loc, kind="stable")
+    counts = np.bincount(data.loc, minlength=len(data.locations))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    tasks, skipped = [], []
+    for i, loc in enumerate(data.locations):
+        a, b = int(offsets[i]), int(offsets[i + 1])
+        if b - a < min_rows:
+            skipped.append((loc, b - a))
+            continue
+        cut = a + time_split(b - a)
+        tasks.append({
+            "location": loc, "a": a, "b": b, "engine": engine,
+            "feature_cols": data.feature_cols, "targets": data.targets, "models_dir": MODEL_DIR,
+            "ts": (data.ts[rows[a]], data.ts[rows[b - 1]], data.ts[rows[cut]]),
+        })
+    for loc, n in skipped:
+        print(f"[WARN] {loc}: {n} linhas (< {min_rows}), sem modelo próprio (usa o global)")
+    if not tasks:
+        print("[WARN] nenhum local com dados suficientes: rode mais backfill ou reduza --min-rows.")
+        return []
+    workers = min(len(tasks), workers or os.cpu_count() or 1)
+    print(f"[OK] {len(data)} linhas, {len(tasks)} locais a treinar ({engine}), {workers} workers")
+
+    arrays = {"X": data.X, "Y": data.Y, "w": data.w, "rows": rows}
+    with tempfile.TemporaryDirectory(prefix="train-locations-") as tmp:
+        paths = {}
+        for name, arr in arrays.items():
+            paths[name] = os.path.join(tmp, f"{name}.npy")
+            np.save(paths[name], arr)
+        del data, arrays
+        if workers == 1:
+            _init_worker(paths)
+            results = [train_location(t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(paths,)) as pool:
+                results = list(pool.map(train_location, tasks))
+
+    for r in results:
+        m = r["by_horizon"]
+        detail = " | ".join(
+            f"t+{h}: {v['mae']:.2f}°C" + (f" (persistência {v['mae_naive']:.2f})" if "mae_naive" in v else "")
+            for h, v in m.items()
+        )
+        print(f"[OK] {r['location']} {r['version']} ({r['rows']} linhas, fit {r['fit_s']}s) MAE {detail}")
+    print(f"[OK] {len(results)} modelos por local em {MODEL_DIR / 'locations'} ({time.perf_counter() - t0:.1f}s)")
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Treina um modelo por local")
+    ap.add_argument("--start", help="início do período (UTC, ex.: 2024-01-01)")
+    ap.add_argument("--end", help="fim do período (exclusivo)")
+    ap.add_argument("--location", action="append", metavar="LAT,LON",
+                    help="treina só estes locais (repetível)")
+    ap.add_argument("--engine", choices=ENGINES, default=DEFAULT_ENGINE,
+                    help="motor do modelo (ver training/engines.py)")
+    ap.add_argument("--min-rows", type=int, default=MIN_ROWS,
+                    help="linhas mínimas para o local ganhar modelo próprio")
+    ap.add_argument("--workers", type=int, default=0, help="processos (padrão: nº de CPUs)")
+    ap.add_argument("--lake", action="store_true",
+                    help="lê o Parquet particionado (data/refined/weather_features) em vez da tabela")
+    args = ap.parse_args()
+    locs = [tuple(float(v) for v in loc.split(",")) for loc in args.location or []]
+    main(args.start, args.end, locs or None, args.engine, args.min_rows, args.workers, args.lake)
@@ -0,0 +1,9 @@
+# tests/conftest.py
+# Testes com pytest (python -m pytest -q, na raiz do repositório): sem rede nem banco em
+# disco — a Open-Meteo é simulada com httpx.MockTransport e os arquivos vão para tmp_path
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
@@ -0,0 +1,55 @@
+# tests/test_dataset.py
+# load_training_data: linhas chegam ordenadas por ts com X/Y/peso/local da mesma linha, e
+# leituras que voltam em ordens diferentes levantam erro (sem embaralhar X/Y em silêncio).
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.processing.features import MASK_COL, TARGETS
+from src.training.dataset import IMPUTED_WEIGHT, load_training_data
+
+FEATURES = ["f_a", "f_b"]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 500
+    ts = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.permutation(n) % 250, unit="h")
+    lat = np.where(np.arange(n) % 2, -23.55, 52.52)
+    # cada valor codifica a própria linha: (ts em horas, local) -> dá para conferir o alinhamento
+    hours = ((ts - pd.Timestamp("2024-01-01")) / pd.Timedelta(hours=1)).to_numpy()
+    df = pd.DataFrame({
+        "ts": ts,
+        "latitude": lat,
+        "longitude": np.where(lat < 0, -46.63, 13.40),
+        "f_a": hours,
+        "f_b": lat,
+        MASK_COL: np.where(np.arange(n) % 7 == 0, 1 << 30, 0).astype(np.int64),
+        **{t: hours * 10 + k for k, t in enumerate(TARGETS)},
+    })
+    path = tmp_path / "t.duckdb"
+    con = duckdb.connect(path.as_posix())
+    con.execute("CREATE SCHEMA refined; CREATE TABLE refined.weather_features AS SELECT * FROM df")
+    con.close()
+    return path
+
+
+def test_rows_sorted_and_aligned(db_path):
+    data = load_training_data(db_path, feature_cols=FEATURES, targets=TARGETS)
+    assert len(data) == 500
+    assert np.all(np.diff(data.ts.astype(np.int64)) >= 0)
+    hours = (data.ts - np.datetime64("2024-01-01T00:00", "us")) / np.timedelta64(1, "h")
+    np.testing.assert_array_equal(data.X[:, 0], hours.astype(np.float32))
+    np.testing.assert_array_equal(data.Y[:, 0], hours * 10)
+    lats = np.array([data.locations[i][0] for i in data.loc])
+    np.testing.assert_array_equal(data.X[:, 1], lats.astype(np.float32))
+    assert set(np.unique(data.w)) == {1.0, IMPUTED_WEIGHT}
+
+
+def test_scans_in_different_order_raise(db_path):
+    # ordem aleatória a cada leitura: as duas passadas divergem
+    source = "(SELECT * FROM refined.weather_features ORDER BY random())"
+    with pytest.raises(RuntimeError, match="divergiram"):
+        load_training_data(db_path, feature_cols=FEATURES, targets=TARGETS, source=source)
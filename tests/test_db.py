@@ -0,0 +1,70 @@
+# tests/test_db.py
+# DuckDBManager: a abertura do arquivo (com retry enquanto outro processo segura o lock)
+# não segura o lock do gerenciador; aberturas simultâneas publicam uma conexão só.
+import threading
+import time
+
+import duckdb
+
+from src.storage.db import DuckDBManager
+
+
+def test_open_retry_does_not_hold_manager_lock(tmp_path, monkeypatch):
+    db = DuckDBManager(tmp_path / "t.duckdb", idle_release_s=0)
+    opening, release = threading.Event(), threading.Event()
+    real_open = db._open
+
+    def slow_open():
+        opening.set()
+        release.wait(5)  # como o retry esperando outro processo soltar o arquivo
+        return real_open()
+
+    monkeypatch.setattr(db, "_open", slow_open)
+    t = threading.Thread(target=lambda: db.fetchone("SELECT 1"))
+    t.start()
+    assert opening.wait(5)
+    # durante a abertura o lock do gerenciador está livre
+    assert db._lock.acquire(timeout=0.5)
+    db._lock.release()
+    release.set()
+    t.join(5)
+    assert db.fetchone("SELECT 42")[0] == 42
+    db.close()
+
+
+def test_concurrent_opens_publish_one_connection(tmp_path, monkeypatch):
+    db = DuckDBManager(tmp_path / "t.duckdb", idle_release_s=0)
+    opened, closed = [], []
+    barrier = threading.Barrier(4)
+    real_open = db._open
+
+    class Con:
+        """Conexão real, registrando quem foi fechado."""
+
+        def __init__(self, con):
+            self._con = con
+            opened.append(self)
+
+        def cursor(self):
+            return self._con.cursor()
+
+        def close(self):
+            closed.append(self)
+            self._con.close()
+
+    def racing_open():
+        barrier.wait(5)  # as 4 threads abrem ao mesmo tempo
+        return Con(real_open())
+
+    monkeypatch.setattr(db, "_open", racing_open)
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(db.fetchone("SELECT 1")[0])) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert out == [1, 1, 1, 1]
+    assert len(opened) == 4 and len(closed) == 3
+    assert db._con is not None and db._con not in closed
+    assert db._generation == 1
+    db.close()
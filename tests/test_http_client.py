@@ -0,0 +1,114 @@
+# tests/test_http_client.py
+# OpenMeteoClient contra um stub (httpx.MockTransport): retry em 429/5xx e erro de rede,
+# desistência após max_retries, Retry-After/jitter do backoff e limite de concorrência.
+import asyncio
+
+import httpx
+import pytest
+
+from src.ingestion import http_client
+from src.ingestion.http_client import OpenMeteoClient
+
+URL = "http://stub/v1/forecast"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # jitter uniforme em [0, base * 2^tentativa]: com base 0 o retry não dorme
+    monkeypatch.setattr(http_client, "BACKOFF_BASE_S", 0.0)
+
+
+def run(client: OpenMeteoClient, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+def scripted(statuses: list, calls: list):
+    """Responde os status em ordem (o último se repete); 'net' simula erro de conexão."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = statuses[min(len(calls), len(statuses) - 1)]
+        calls.append(request)
+        if status == "net":
+            raise httpx.ConnectError("stub fora do ar", request=request)
+        return httpx.Response(status, json={"ok": status == 200, "n": len(calls)})
+
+    return httpx.MockTransport(handler)
+
+
+def test_retry_429_5xx_then_200():
+    calls = []
+    client = OpenMeteoClient(max_retries=4, transport=scripted([429, 503, 500, 200], calls))
+    assert run(client, client.get_json(URL, {"latitude": 1})) == {"ok": True, "n": 4}
+    assert len(calls) == 4
+    assert all(c.url.params["latitude"] == "1" for c in calls)
+
+
+def test_retry_transport_error_then_200():
+    calls = []
+    client = OpenMeteoClient(max_retries=2, transport=scripted(["net", 200], calls))
+    assert run(client, client.get_json(URL, {}))["ok"] is True
+    assert len(calls) == 2
+
+
+def test_gives_up_after_max_retries():
+    calls = []
+    client = OpenMeteoClient(max_retries=2, transport=scripted([503], calls))
+    with pytest.raises(httpx.HTTPStatusError):
+        run(client, client.get_json(URL, {}))
+    assert len(calls) == 3  # 1 + max_retries
+
+
+def test_gives_up_on_transport_error():
+    calls = []
+    client = OpenMeteoClient(max_retries=1, transport=scripted(["net"], calls))
+    with pytest.raises(httpx.ConnectError):
+        run(client, client.get_json(URL, {}))
+    assert len(calls) == 2
+
+
+def test_no_retry_on_4xx():
+    calls = []
+    client = OpenMeteoClient(max_retries=4, transport=scripted([400], calls))
+    with pytest.raises(httpx.HTTPStatusError):
+        run(client, client.get_json(URL, {}))
+    assert len(calls) == 1
+
+
+def test_concurrency_limit():
+    in_flight, peak, calls = 0, 0, []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        # a 1ª resposta de cada 4 é 503: o retry também passa pelo semáforo
+        return httpx.Response(503 if len(calls) % 4 == 1 else 200, json={})
+
+    client = OpenMeteoClient(max_concurrency=3, transport=httpx.MockTransport(handler))
+
+    async def many():
+        return await asyncio.gather(*(client.get_json(URL, {"i": i}) for i in range(20)))
+
+    assert len(run(client, many())) == 20
+    assert peak == 3
+    assert len(calls) > 20
+
+
+def test_backoff_retry_after_and_jitter(monkeypatch):
+    monkeypatch.setattr(http_client, "BACKOFF_BASE_S", 0.5)
+    assert OpenMeteoClient._backoff(0, "2") == 2.0
+    assert OpenMeteoClient._backoff(0, "3600") == http_client.BACKOFF_MAX_S
+    for attempt in range(8):
+        for _ in range(50):
+            # sem Retry-After (ou inválido): jitter em [0, min(max, base * 2^tentativa)]
+            wait = OpenMeteoClient._backoff(attempt, "depois")
+            assert 0 <= wait <= min(http_client.BACKOFF_MAX_S, 0.5 * 2 ** attempt)
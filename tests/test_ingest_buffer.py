@@ -0,0 +1,75 @@
+# tests/test_ingest_buffer.py
+# IngestBuffer: lote que sempre falha vai para o dead-letter (inclusive no flush final do
+# close, quando não há mais thread para tentar de novo) e um lote ruim não trava os bons.
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.ingestion import ingest_buffer
+from src.ingestion.ingest_buffer import IngestBuffer
+
+
+@pytest.fixture(autouse=True)
+def fast_close(monkeypatch):
+    monkeypatch.setattr(ingest_buffer, "CLOSE_BACKOFF_S", 0.0)
+
+
+def dead_letter_rows(path) -> list:
+    return sorted(v for f in path.glob("*.parquet") for v in pq.read_table(f).column("v").to_pylist())
+
+
+def test_close_sends_failing_rows_to_dead_letter(tmp_path):
+    calls = []
+
+    def always_fails(table):
+        calls.append(table.num_rows)
+        raise RuntimeError("constraint")
+
+    # max_delay_s alto: nada é descarregado antes do close
+    buf = IngestBuffer(always_fails, max_delay_s=60, max_attempts=3, dead_letter_dir=tmp_path)
+    buf.add(pa.table({"v": [1, 2]}))
+    buf.add(pa.table({"v": [3]}))
+    buf.close()
+
+    assert dead_letter_rows(tmp_path) == [1, 2, 3]
+    m = buf.metrics()
+    assert m["rows_pending"] == 0 and m["batches_pending"] == 0
+    assert m["dropped_rows"] == 3 and m["dropped_batches"] == 2 and m["dead_letter_files"] == 2
+    assert m["rows_flushed"] == 0
+    assert len(calls) > 0
+
+
+def test_close_retries_transient_failure(tmp_path):
+    got, fails = [], [2]
+
+    def flaky(table):
+        if fails[0]:
+            fails[0] -= 1
+            raise RuntimeError("database is locked")
+        got.extend(table.column("v").to_pylist())
+
+    buf = IngestBuffer(flaky, max_delay_s=60, max_attempts=5, dead_letter_dir=tmp_path)
+    buf.add(pa.table({"v": [1, 2, 3]}))
+    buf.close()
+
+    assert got == [1, 2, 3]
+    assert not list(tmp_path.glob("*.parquet"))
+    assert buf.metrics()["dropped_rows"] == 0
+
+
+def test_bad_batch_does_not_block_good_ones(tmp_path):
+    got = []
+
+    def fn(table):
+        if -1 in table.column("v").to_pylist():
+            raise ValueError("constraint")
+        got.extend(table.column("v").to_pylist())
+
+    buf = IngestBuffer(fn, max_delay_s=60, max_attempts=2, dead_letter_dir=tmp_path)
+    for v in ([1, 2], [-1], [3]):
+        buf.add(pa.table({"v": v}))
+    assert buf.flush() == 3  # lote junto falha; um a um, os bons passam
+    assert sorted(got) == [1, 2, 3]
+    buf.close()
+    assert dead_letter_rows(tmp_path) == [-1]
+    assert buf.metrics()["dropped_rows"] == 1